@@ -2,6 +2,10 @@
 Handling the AI moves.
 """
 import random
+import time
+
+import ChessEngine
+import bitbases
 
 piece_score = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
 
@@ -61,22 +65,144 @@ piece_position_scores = {"wN": knight_scores,
                          "wp": pawn_scores,
                          "bp": pawn_scores[::-1]}
 
-CHECKMATE = 1000
+# pawn structure terms, in pawns
+doubled_pawn_penalty = 0.2
+isolated_pawn_penalty = 0.15
+passed_pawn_bonus = [0.0, 0.1, 0.15, 0.25, 0.4, 0.6]  # indexed by ranks advanced from the start row
+
+CHECKMATE = 1000  # score of being mated at the root, a mate n plies away scores CHECKMATE - n
 STALEMATE = 0
 DEPTH = 3
+USE_PAWN_STRUCTURE = True
+USE_MATE_DISTANCE_PRUNING = True
+USE_BITBASES = True  # probe the endgame bitbases generated by bitbases.py, if they are on disk
+BITBASE_WIN = 500  # score of a won bitbase position, below any mate the search finds itself
+PAWN_HASH_SIZE = 2 ** 14  # number of slots in the pawn hash table
+
+
+class PawnHashTable:
+    """
+    Fixed-size cache of pawn structure scores, indexed by GameState.pawn_hash_key.
+    Each slot keeps the most recent entry that hashed to it, so the memory use is bounded.
+    """
+
+    def __init__(self, size=PAWN_HASH_SIZE):
+        self.size = size
+        self.keys = [None] * size
+        self.scores = [0.0] * size
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, key):
+        """
+        Return the cached score for the key, or None if it is not in the table.
+        """
+        index = key % self.size
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        self.misses += 1
+        return None
+
+    def store(self, key, score):
+        index = key % self.size
+        self.keys[index] = key
+        self.scores[index] = score
+
+    def hitRate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def clear(self):
+        self.keys = [None] * self.size
+        self.hits = 0
+        self.misses = 0
+
 
+pawn_hash_table = PawnHashTable()
+nodes_searched = 0  # nodes visited by the last search
+pawn_hash_hits = 0  # pawn hash table hits of the last search
+pawn_hash_probes = 0  # pawn hash table probes of the last search
 
-def findBestMove(game_state, valid_moves, return_queue):
-    global next_move
-    next_move = None
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when its time limit is reached.
+    """
+
+
+def findBestMove(position, return_queue):
+    """
+    Search the position (encoded with GameState.toBytes) and put the moveID of the best move, or None, on the queue.
+    Used as the target of the AI process, so only a few bytes cross the process boundary each way.
+    """
+    game_state = ChessEngine.GameState.fromBytes(position)
+    best_move = searchBestMove(game_state, game_state.getValidMoves())
+    return_queue.put(best_move.moveID if best_move is not None else None)
+
+
+def searchBestMove(game_state, valid_moves, depth=DEPTH, time_limit=None, on_iteration=None):
+    """
+    Return the best move found searching depth plies, or None if no move could be searched.
+    With a time_limit (in seconds) the search deepens one ply at a time, and when the time is up it returns
+    the best move of the last completed iteration.
+    on_iteration(depth, move) is called after every completed iteration, it also turns on iterative deepening.
+    The number of searched nodes is left in nodes_searched, the pawn hash table hits and probes of the search in
+    pawn_hash_hits and pawn_hash_probes.
+    """
+    global next_move, root_depth, deadline, nodes_searched, pawn_hash_hits, pawn_hash_probes
     random.shuffle(valid_moves)
-    findMoveNegaMaxAlphaBeta(game_state, valid_moves, DEPTH, -CHECKMATE, CHECKMATE,
-                             1 if game_state.white_to_move else -1)
-    return_queue.put(next_move)
+    turn_multiplier = 1 if game_state.white_to_move else -1
+    nodes_searched = 0
+    hits, misses = pawn_hash_table.hits, pawn_hash_table.misses
+    deadline = time.time() + time_limit if time_limit is not None else None
+    depths = [depth] if time_limit is None and on_iteration is None else range(1, depth + 1)
+    log_length = len(game_state.move_log)
+    best_move = None
+    for root_depth in depths:
+        next_move = None
+        try:
+            findMoveNegaMaxAlphaBeta(game_state, valid_moves, root_depth, -CHECKMATE, CHECKMATE, turn_multiplier)
+        except SearchTimeout:
+            while len(game_state.move_log) > log_length:  # take back the moves of the interrupted line
+                game_state.undoMove()
+            break
+        best_move = next_move
+        if on_iteration is not None:
+            on_iteration(root_depth, best_move)
+        if best_move is not None:  # search the best move first in the next iteration
+            valid_moves.remove(best_move)
+            valid_moves.insert(0, best_move)
+    pawn_hash_hits = pawn_hash_table.hits - hits
+    pawn_hash_probes = pawn_hash_hits + pawn_hash_table.misses - misses
+    return best_move
 
 
 def findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, alpha, beta, turn_multiplier):
-    global next_move
+    global next_move, nodes_searched
+    nodes_searched += 1
+    if deadline is not None and time.time() > deadline:
+        raise SearchTimeout()
+    ply = root_depth - depth
+    if game_state.checkmate:
+        return -(CHECKMATE - ply)  # shorter mates score higher
+    if game_state.stalemate:
+        return STALEMATE
+    if ply > 0 and game_state.piece_count <= 5 and game_state.hasInsufficientMaterial():
+        return STALEMATE
+    if USE_MATE_DISTANCE_PRUNING and ply > 0:
+        # mate distance pruning: from here nothing is better than mating on the next ply or worse than being mated
+        # now, so when a shorter mate is already known the window closes and the subtree is skipped
+        alpha = max(alpha, -(CHECKMATE - ply))
+        beta = min(beta, CHECKMATE - ply - 1)
+        if alpha >= beta:
+            return alpha
+    # probe at the leaves and where a capture or promotion entered the endgame, inside it the search finds the mates
+    if USE_BITBASES and game_state.piece_count <= 3 and ply > 0 and \
+            (depth == 0 or game_state.move_log[-1].is_capture or game_state.move_log[-1].is_pawn_promotion):
+        result = bitbases.probe(game_state)
+        if result is not None:
+            return scoreBitbaseResult(game_state, result)
     if depth == 0:
         return turn_multiplier * scoreBoard(game_state)
     # move ordering - implement later //TODO
@@ -87,7 +213,7 @@ def findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, alpha, beta, turn_m
         score = -findMoveNegaMaxAlphaBeta(game_state, next_moves, depth - 1, -beta, -alpha, -turn_multiplier)
         if score > max_score:
             max_score = score
-            if depth == DEPTH:
+            if depth == root_depth:
                 next_move = move
         game_state.undoMove()
         if max_score > alpha:
@@ -121,6 +247,82 @@ def scoreBoard(game_state):
                 if piece[0] == "b":
                     score -= piece_score[piece[1]] + piece_position_score
 
+    if USE_PAWN_STRUCTURE:
+        score += scorePawnStructure(game_state)
+    return score
+
+
+def scoreBitbaseResult(game_state, result):
+    """
+    Score a bitbase result for the side to move.
+    A won position scores BITBASE_WIN plus the progress of the win, so the search keeps moving towards the mate:
+    the material of the winner (so it promotes), losing king near the edge, kings close together, pawn advanced.
+    """
+    if result == bitbases.DRAW:
+        return STALEMATE
+    winner_is_white = game_state.white_to_move == (result == bitbases.WIN)
+    winning_king = game_state.white_king_location if winner_is_white else game_state.black_king_location
+    losing_king = game_state.black_king_location if winner_is_white else game_state.white_king_location
+    center_distance = max(3 - losing_king[0], losing_king[0] - 4) + max(3 - losing_king[1], losing_king[1] - 4)
+    king_distance = max(abs(winning_king[0] - losing_king[0]), abs(winning_king[1] - losing_king[1]))
+    progress = 0.1 * center_distance + 0.05 * (7 - king_distance)
+    for row in range(8):
+        for col in range(8):
+            piece = game_state.board[row][col]
+            if piece != "--":
+                progress += piece_score[piece[1]]
+            if piece == "wp":
+                progress += 0.2 * (6 - row)
+            elif piece == "bp":
+                progress += 0.2 * (row - 1)
+    score = BITBASE_WIN + progress
+    return score if result == bitbases.WIN else -score
+
+
+def scorePawnStructure(game_state):
+    """
+    Score doubled, isolated and passed pawns. A positive score is good for white.
+    The pawn structure rarely changes between sibling nodes, so the result is cached by the pawn hash.
+    """
+    pawn_score = pawn_hash_table.probe(game_state.pawn_hash_key)
+    if pawn_score is None:
+        pawn_score = evaluatePawnStructure(game_state.board)
+        pawn_hash_table.store(game_state.pawn_hash_key, pawn_score)
+    return pawn_score
+
+
+def evaluatePawnStructure(board):
+    """
+    Evaluate the pawn structure from scratch.
+    """
+    # rows of the pawns on each file
+    white_pawns = [[] for col in range(8)]
+    black_pawns = [[] for col in range(8)]
+    for row in range(8):
+        for col in range(8):
+            if board[row][col] == "wp":
+                white_pawns[col].append(row)
+            elif board[row][col] == "bp":
+                black_pawns[col].append(row)
+
+    score = 0
+    for col in range(8):
+        neighbour_cols = [c for c in (col - 1, col + 1) if 0 <= c <= 7]
+        if white_pawns[col]:
+            score -= doubled_pawn_penalty * (len(white_pawns[col]) - 1)
+            if not any(white_pawns[c] for c in neighbour_cols):
+                score -= isolated_pawn_penalty * len(white_pawns[col])
+            # a pawn is passed if no enemy pawn in front of it on its own or the neighbouring files
+            for row in white_pawns[col]:
+                if all(enemy_row >= row for c in neighbour_cols + [col] for enemy_row in black_pawns[c]):
+                    score += passed_pawn_bonus[6 - row]
+        if black_pawns[col]:
+            score += doubled_pawn_penalty * (len(black_pawns[col]) - 1)
+            if not any(black_pawns[c] for c in neighbour_cols):
+                score += isolated_pawn_penalty * len(black_pawns[col])
+            for row in black_pawns[col]:
+                if all(enemy_row <= row for c in neighbour_cols + [col] for enemy_row in white_pawns[c]):
+                    score -= passed_pawn_bonus[row - 1]
     return score
 
 
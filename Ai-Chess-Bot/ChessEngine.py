@@ -3,15 +3,64 @@ Storing all the information about the current state of chess game.
 Determining valid moves at current state.
 It will keep move log.
 """
+import random
+import struct
+from collections import OrderedDict
+
+# Zobrist keys for the pawns only, so the pawn structure can be hashed independently of the other pieces.
+# A fixed seed keeps the keys identical in every process (the AI searches in a separate process).
+zobrist_random = random.Random(20230914)
+pawn_zobrist_keys = {piece: [[zobrist_random.getrandbits(64) for col in range(8)] for row in range(8)]
+                     for piece in ("wp", "bp")}
+
+# Legal moves are cached by position key (see GameState.getPositionKey), least recently used entries are evicted first.
+# The key covers everything move generation depends on, so an entry can never go stale, also across undoMove.
+USE_MOVE_CACHE = True
+MOVE_CACHE_SIZE = 2048
+valid_moves_cache = OrderedDict()
+
+
+def clearMoveCache():
+    valid_moves_cache.clear()
+
+
+# Precomputed move tables, indexed by [row][col] of the moving piece, so the generators need no bounds checks.
+# Ray directions are orthogonal first and then diagonal, in the order checkForPinsAndChecks relies on.
+ray_directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+rook_rays = (0, 1, 2, 3)  # up, left, down, right
+bishop_rays = (4, 5, 7, 6)  # diagonals: up/left up/right down/right down/left
+knight_offsets = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+king_offsets = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+knight_targets = [[[(row + d_row, col + d_col) for d_row, d_col in knight_offsets
+                    if 0 <= row + d_row <= 7 and 0 <= col + d_col <= 7] for col in range(8)] for row in range(8)]
+king_targets = [[[(row + d_row, col + d_col) for d_row, d_col in king_offsets
+                  if 0 <= row + d_row <= 7 and 0 <= col + d_col <= 7] for col in range(8)] for row in range(8)]
+square_rays = [[[[(row + d_row * i, col + d_col * i) for i in range(1, 8)
+                  if 0 <= row + d_row * i <= 7 and 0 <= col + d_col * i <= 7] for d_row, d_col in ray_directions]
+                for col in range(8)] for row in range(8)]
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Binary position encoding used to pass positions between processes and to store them on disk, see GameState.toBytes.
+# 32 bytes of 4 bit square codes (bit 3 is set for black pieces), a flags byte, the en-passant file and two clocks.
+piece_codes = {"--": 0, "wp": 1, "wN": 2, "wB": 3, "wR": 4, "wQ": 5, "wK": 6,
+               "bp": 9, "bN": 10, "bB": 11, "bR": 12, "bQ": 13, "bK": 14}
+code_pieces = [None] * 16
+for piece, code in piece_codes.items():
+    code_pieces[code] = piece
+position_struct = struct.Struct("<32sBBHH")
+POSITION_SIZE = position_struct.size
+NO_ENPASSANT_FILE = 0xFF
 
 
 class GameState:
-    def __init__(self):
+    def __init__(self, fen=None):
         """
         Board is an 8x8 2d list, each element in list has 2 characters.
         The first character represents the color of the piece: 'b' or 'w'.
         The second character represents the type of the piece: 'R', 'N', 'B', 'Q', 'K' or 'p'.
         "--" represents an empty space with no piece.
+        If a FEN string is given the game starts from that position instead.
         """
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
@@ -38,6 +87,150 @@ class GameState:
         self.current_castling_rights = CastleRights(True, True, True, True)
         self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                                self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.halfmove_clock = 0  # half moves since the last capture or pawn move, for the fifty-move rule
+        self.halfmove_clock_log = [self.halfmove_clock]
+        self.fullmove_number = 1
+        self.piece_count = 32  # pieces on the board, kings included
+        self.pawn_hash_key = self.computePawnHashKey()
+        if fen is not None:
+            self.loadFen(fen)
+
+    def loadFen(self, fen):
+        """
+        Set up the position of a FEN string: board, side to move, castling rights, en-passant square and clocks.
+        The clocks are optional, so the first four fields of an EPD line are accepted as well.
+        Raises ValueError if the FEN is malformed or a side does not have exactly one king.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("invalid FEN, expected at least 4 fields: " + fen)
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("invalid FEN board, expected 8 ranks: " + fields[0])
+        board = []
+        for fen_row in rows:
+            row = []
+            for char in fen_row:
+                if char in "12345678":
+                    row.extend(["--"] * int(char))
+                elif char in "PNBRQKpnbrqk":
+                    row.append(("w" if char.isupper() else "b") + (char.upper() if char.lower() != "p" else "p"))
+                else:
+                    raise ValueError("invalid FEN board, unknown piece %r: %s" % (char, fields[0]))
+            if len(row) != 8:
+                raise ValueError("invalid FEN board, expected 8 files in %r: %s" % (fen_row, fields[0]))
+            board.append(row)
+        for king, color in (("wK", "white"), ("bK", "black")):
+            kings = sum(row.count(king) for row in board)
+            if kings != 1:
+                raise ValueError("invalid FEN board, %d %s kings: %s" % (kings, color, fields[0]))
+        if fields[1] not in ("w", "b"):
+            raise ValueError("invalid FEN side to move: " + fields[1])
+        if fields[2] != "-" and (not set(fields[2]) <= set("KQkq") or len(set(fields[2])) != len(fields[2])):
+            raise ValueError("invalid FEN castling rights: " + fields[2])
+        castle_rights = CastleRights("K" in fields[2], "k" in fields[2], "Q" in fields[2], "q" in fields[2])
+        if fields[3] == "-":
+            enpassant_possible = ()
+        elif len(fields[3]) == 2 and fields[3][0] in Move.files_to_cols and \
+                fields[3][1] == ("6" if fields[1] == "w" else "3"):  # the square behind the pawn that just moved
+            enpassant_possible = (Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]])
+        else:
+            raise ValueError("invalid FEN en-passant square: " + fields[3])
+        halfmove_clock = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+        fullmove_number = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+        self.setPosition(board, fields[1] == "w", castle_rights, enpassant_possible, halfmove_clock, fullmove_number)
+
+    def setPosition(self, board, white_to_move, castle_rights, enpassant_possible, halfmove_clock, fullmove_number):
+        """
+        Replace the current position, the move log and its history are cleared.
+        """
+        self.board = board
+        for row in range(8):
+            for col in range(8):
+                if self.board[row][col] == "wK":
+                    self.white_king_location = (row, col)
+                elif self.board[row][col] == "bK":
+                    self.black_king_location = (row, col)
+        self.white_to_move = white_to_move
+        self.current_castling_rights = castle_rights
+        self.castle_rights_log = [CastleRights(castle_rights.wks, castle_rights.bks, castle_rights.wqs,
+                                               castle_rights.bqs)]
+        self.enpassant_possible = enpassant_possible
+        self.enpassant_possible_log = [self.enpassant_possible]
+        self.halfmove_clock = halfmove_clock
+        self.halfmove_clock_log = [self.halfmove_clock]
+        self.fullmove_number = fullmove_number
+        self.piece_count = sum(piece != "--" for row in self.board for piece in row)
+        self.move_log = []
+        self.checkmate = False
+        self.stalemate = False
+        self.in_check = False
+        self.pins = []
+        self.checks = []
+        self.pawn_hash_key = self.computePawnHashKey()
+
+    def getFen(self):
+        """
+        FEN string of the current position.
+        """
+        fen_rows = []
+        for row in self.board:
+            fen_row = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    fen_row += str(empty)
+                    empty = 0
+                fen_row += piece[1].upper() if piece[0] == "w" else piece[1].lower()
+            fen_rows.append(fen_row + (str(empty) if empty else ""))
+        rights = self.current_castling_rights
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + ("k" if rights.bks else "") + (
+            "q" if rights.bqs else "")
+        enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[
+            self.enpassant_possible[0]] if self.enpassant_possible else "-"
+        return " ".join(["/".join(fen_rows), "w" if self.white_to_move else "b", castling or "-", enpassant,
+                         str(self.halfmove_clock), str(self.fullmove_number)])
+
+    def toBytes(self):
+        """
+        Encode the position in POSITION_SIZE bytes: a 4 bit code per square, side to move and castling bits,
+        the en-passant file and both clocks. The move log is not included.
+        """
+        codes = [piece_codes[piece] for row in self.board for piece in row]
+        squares = bytes([codes[i] << 4 | codes[i + 1] for i in range(0, 64, 2)])
+        rights = self.current_castling_rights
+        flags = self.white_to_move | rights.wks << 1 | rights.wqs << 2 | rights.bks << 3 | rights.bqs << 4
+        enpassant_file = self.enpassant_possible[1] if self.enpassant_possible else NO_ENPASSANT_FILE
+        return position_struct.pack(squares, flags, enpassant_file, min(self.halfmove_clock, 0xFFFF),
+                                    min(self.fullmove_number, 0xFFFF))
+
+    @classmethod
+    def fromBytes(cls, data):
+        """
+        Create a game state from a position encoded with toBytes.
+        """
+        game_state = cls()
+        game_state.loadBytes(data)
+        return game_state
+
+    def loadBytes(self, data):
+        """
+        Set up a position encoded with toBytes.
+        """
+        squares, flags, enpassant_file, halfmove_clock, fullmove_number = position_struct.unpack(data)
+        board = [[None] * 8 for row in range(8)]
+        for i, byte in enumerate(squares):
+            board[i // 4][i % 4 * 2] = code_pieces[byte >> 4]
+            board[i // 4][i % 4 * 2 + 1] = code_pieces[byte & 0xF]
+        white_to_move = bool(flags & 1)
+        castle_rights = CastleRights(bool(flags & 2), bool(flags & 8), bool(flags & 4), bool(flags & 16))
+        enpassant_possible = ()
+        if enpassant_file != NO_ENPASSANT_FILE:  # the pawn that can be captured has just moved two squares
+            enpassant_possible = (2 if white_to_move else 5, enpassant_file)
+        self.setPosition(board, white_to_move, castle_rights, enpassant_possible, halfmove_clock, fullmove_number)
 
     def makeMove(self, move):
         """
@@ -90,6 +283,18 @@ class GameState:
         self.castle_rights_log.append(CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                                    self.current_castling_rights.wqs, self.current_castling_rights.bqs))
 
+        # update the pawn structure hash
+        self.pawn_hash_key ^= self.getPawnHashDelta(move)
+
+        if move.is_capture:
+            self.piece_count -= 1
+
+        # update the clocks
+        self.halfmove_clock = 0 if move.is_capture or move.piece_moved[1] == "p" else self.halfmove_clock + 1
+        self.halfmove_clock_log.append(self.halfmove_clock)
+        if self.white_to_move:  # black just moved
+            self.fullmove_number += 1
+
     def undoMove(self):
         """
         Undo the last move
@@ -114,8 +319,9 @@ class GameState:
 
             # undo castle rights
             self.castle_rights_log.pop()  # get rid of the new castle rights from the move we are undoing
-            self.current_castling_rights = self.castle_rights_log[
-                -1]  # set the current castle rights to the last one in the list
+            # set the current castle rights to a copy of the last one in the list, so the log is not changed by the next move
+            last_rights = self.castle_rights_log[-1]
+            self.current_castling_rights = CastleRights(last_rights.wks, last_rights.bks, last_rights.wqs, last_rights.bqs)
             # undo the castle move
             if move.is_castle_move:
                 if move.end_col - move.start_col == 2:  # king-side
@@ -124,9 +330,44 @@ class GameState:
                 else:  # queen-side
                     self.board[move.end_row][move.end_col - 2] = self.board[move.end_row][move.end_col + 1]
                     self.board[move.end_row][move.end_col + 1] = '--'
+            # the pawn hash delta of a move is its own inverse
+            self.pawn_hash_key ^= self.getPawnHashDelta(move)
+            if move.is_capture:
+                self.piece_count += 1
+            # undo the clocks
+            self.halfmove_clock_log.pop()
+            self.halfmove_clock = self.halfmove_clock_log[-1]
+            if not self.white_to_move:  # undoing a move of black
+                self.fullmove_number -= 1
             self.checkmate = False
             self.stalemate = False
 
+    def computePawnHashKey(self):
+        """
+        Compute the pawn structure hash of the current board from scratch.
+        """
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece[1] == "p":
+                    key ^= pawn_zobrist_keys[piece][row][col]
+        return key
+
+    def getPawnHashDelta(self, move):
+        """
+        The value to xor into the pawn hash when the move is made or undone.
+        """
+        delta = 0
+        if move.piece_moved[1] == "p":
+            delta ^= pawn_zobrist_keys[move.piece_moved][move.start_row][move.start_col]
+            if not move.is_pawn_promotion:  # a promoted pawn leaves the pawn structure
+                delta ^= pawn_zobrist_keys[move.piece_moved][move.end_row][move.end_col]
+        if move.piece_captured[1] == "p":
+            capture_row = move.start_row if move.is_enpassant_move else move.end_row
+            delta ^= pawn_zobrist_keys[move.piece_captured][capture_row][move.end_col]
+        return delta
+
     def updateCastleRights(self, move):
         """
         Update the castle rights given the move
@@ -161,9 +402,57 @@ class GameState:
                 elif move.start_col == 7:  # right rook
                     self.current_castling_rights.bks = False
 
+    def hasInsufficientMaterial(self):
+        """
+        Neither side can mate: only kings, kings and a single bishop or knight, or kings and bishops that all stand
+        on squares of the same color.
+        """
+        pieces = []
+        bishop_square_colors = set()
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--" and piece[1] != "K":
+                    pieces.append(piece[1])
+                    if piece[1] == "B":
+                        bishop_square_colors.add((row + col) % 2)
+        if len(pieces) <= 1:
+            return not pieces or pieces[0] in ("B", "N")
+        return all(piece == "B" for piece in pieces) and len(bishop_square_colors) == 1
+
+    def getPositionKey(self):
+        """
+        Key of everything the legal moves depend on: board, side to move, castling rights and en-passant square.
+        """
+        rights = self.current_castling_rights
+        return ("".join(["".join(row) for row in self.board]), self.white_to_move,
+                rights.wks, rights.bks, rights.wqs, rights.bqs, self.enpassant_possible)
+
     def getValidMoves(self):
         """
         All moves considering checks.
+        Served from the move cache when the position was seen before, the check and mate flags are restored with it.
+        """
+        if not USE_MOVE_CACHE:
+            return self.generateValidMoves()
+        key = self.getPositionKey()
+        entry = valid_moves_cache.get(key)
+        if entry is not None:
+            valid_moves_cache.move_to_end(key)
+            moves, self.in_check, pins, checks, self.checkmate, self.stalemate = entry
+            self.pins = list(pins)
+            self.checks = list(checks)
+            return list(moves)  # callers may reorder or shuffle the list
+        moves = self.generateValidMoves()
+        valid_moves_cache[key] = (tuple(moves), self.in_check, tuple(self.pins), tuple(self.checks),
+                                  self.checkmate, self.stalemate)
+        if len(valid_moves_cache) > MOVE_CACHE_SIZE:
+            valid_moves_cache.popitem(last=False)
+        return moves
+
+    def generateValidMoves(self):
+        """
+        Generate all moves considering checks, without the move cache.
         """
         temp_castle_rights = CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                           self.current_castling_rights.wqs, self.current_castling_rights.bqs)
@@ -225,6 +514,45 @@ class GameState:
         self.current_castling_rights = temp_castle_rights
         return moves
 
+    def getSanNotation(self, move, valid_moves):
+        """
+        Standard algebraic notation of a move in the current position, as used in PGN and EPD files.
+        valid_moves are the legal moves of the current position, they are needed to disambiguate the move.
+        """
+        if move.is_castle_move:
+            san = "O-O" if move.end_col > move.start_col else "O-O-O"
+        else:
+            end_square = move.getRankFile(move.end_row, move.end_col)
+            if move.piece_moved[1] == "p":
+                san = move.cols_to_files[move.start_col] + "x" + end_square if move.is_capture else end_square
+                if move.is_pawn_promotion:
+                    san += "=Q"
+            else:
+                san = move.piece_moved[1]
+                # other pieces of the same type that can reach the same square
+                others = [other for other in valid_moves if other.piece_moved == move.piece_moved and
+                          (other.end_row, other.end_col) == (move.end_row, move.end_col) and
+                          (other.start_row, other.start_col) != (move.start_row, move.start_col)]
+                if others:
+                    if all(other.start_col != move.start_col for other in others):
+                        san += move.cols_to_files[move.start_col]
+                    elif all(other.start_row != move.start_row for other in others):
+                        san += move.rows_to_ranks[move.start_row]
+                    else:
+                        san += move.getRankFile(move.start_row, move.start_col)
+                if move.is_capture:
+                    san += "x"
+                san += end_square
+        self.makeMove(move)
+        self.getValidMoves()
+        if self.checkmate:
+            san += "#"
+        elif self.in_check:
+            san += "+"
+        self.undoMove()
+        self.getValidMoves()  # restore the check and mate flags of the current position
+        return san
+
     def inCheck(self):
         """
         Determine if a current player is in check
@@ -274,53 +602,46 @@ class GameState:
             start_row = self.black_king_location[0]
             start_col = self.black_king_location[1]
         # check outwards from king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            direction = directions[j]
+        rays = square_rays[start_row][start_col]
+        for j in range(8):
+            direction = ray_directions[j]
             possible_pin = ()  # reset possible pins
-            for i in range(1, 8):
-                end_row = start_row + direction[0] * i
-                end_col = start_col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] == ally_color and end_piece[1] != "K":
-                        if possible_pin == ():  # first allied piece could be pinned
-                            possible_pin = (end_row, end_col, direction[0], direction[1])
-                        else:  # 2nd allied piece - no check or pin from this direction
+            i = 0
+            for end_row, end_col in rays[j]:
+                i += 1
+                end_piece = self.board[end_row][end_col]
+                if end_piece[0] == ally_color and end_piece[1] != "K":
+                    if possible_pin == ():  # first allied piece could be pinned
+                        possible_pin = (end_row, end_col, direction[0], direction[1])
+                    else:  # 2nd allied piece - no check or pin from this direction
+                        break
+                elif end_piece[0] == enemy_color:
+                    enemy_type = end_piece[1]
+                    # 5 possibilities in this complex conditional
+                    # 1.) orthogonally away from king and piece is a rook
+                    # 2.) diagonally away from king and piece is a bishop
+                    # 3.) 1 square away diagonally from king and piece is a pawn
+                    # 4.) any direction and piece is a queen
+                    # 5.) any direction 1 square away and piece is a king
+                    if (0 <= j <= 3 and enemy_type == "R") or (4 <= j <= 7 and enemy_type == "B") or (
+                            i == 1 and enemy_type == "p" and (
+                            (enemy_color == "w" and 6 <= j <= 7) or (enemy_color == "b" and 4 <= j <= 5))) or (
+                            enemy_type == "Q") or (i == 1 and enemy_type == "K"):
+                        if possible_pin == ():  # no piece blocking, so check
+                            in_check = True
+                            checks.append((end_row, end_col, direction[0], direction[1]))
                             break
-                    elif end_piece[0] == enemy_color:
-                        enemy_type = end_piece[1]
-                        # 5 possibilities in this complex conditional
-                        # 1.) orthogonally away from king and piece is a rook
-                        # 2.) diagonally away from king and piece is a bishop
-                        # 3.) 1 square away diagonally from king and piece is a pawn
-                        # 4.) any direction and piece is a queen
-                        # 5.) any direction 1 square away and piece is a king
-                        if (0 <= j <= 3 and enemy_type == "R") or (4 <= j <= 7 and enemy_type == "B") or (
-                                i == 1 and enemy_type == "p" and (
-                                (enemy_color == "w" and 6 <= j <= 7) or (enemy_color == "b" and 4 <= j <= 5))) or (
-                                enemy_type == "Q") or (i == 1 and enemy_type == "K"):
-                            if possible_pin == ():  # no piece blocking, so check
-                                in_check = True
-                                checks.append((end_row, end_col, direction[0], direction[1]))
-                                break
-                            else:  # piece blocking so pin
-                                pins.append(possible_pin)
-                                break
-                        else:  # enemy piece not applying checks
+                        else:  # piece blocking so pin
+                            pins.append(possible_pin)
                             break
-                else:
-                    break  # off board
+                    else:  # enemy piece not applying checks
+                        break
         # check for knight checks
-        knight_moves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
-        for move in knight_moves:
-            end_row = start_row + move[0]
-            end_col = start_col + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] == enemy_color and end_piece[1] == "N":  # enemy knight attacking a king
-                    in_check = True
-                    checks.append((end_row, end_col, move[0], move[1]))
+        for end_row, end_col in knight_targets[start_row][start_col]:
+            end_piece = self.board[end_row][end_col]
+            if end_piece[0] == enemy_color and end_piece[1] == "N":  # enemy knight attacking a king
+                in_check = True
+                checks.append((end_row, end_col, end_row - start_row, end_col - start_col))
         return in_check, pins, checks
 
     def getPawnMoves(self, row, col, moves):
@@ -420,24 +741,20 @@ class GameState:
                     self.pins.remove(self.pins[i])
                 break
 
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
         enemy_color = "b" if self.white_to_move else "w"
-        for direction in directions:
-            for i in range(1, 8):
-                end_row = row + direction[0] * i
-                end_col = col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:  # check for possible moves only in boundaries of the board
-                    if not piece_pinned or pin_direction == direction or pin_direction == (
-                            -direction[0], -direction[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":  # empty space is valid
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:  # capture enemy piece
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                            break
-                        else:  # friendly piece
-                            break
-                else:  # off board
+        rays = square_rays[row][col]
+        for j in rook_rays:
+            direction = ray_directions[j]
+            if piece_pinned and pin_direction != direction and pin_direction != (-direction[0], -direction[1]):
+                continue  # a pinned piece can only move along the pin
+            for end_row, end_col in rays[j]:
+                end_piece = self.board[end_row][end_col]
+                if end_piece == "--":  # empty space is valid
+                    moves.append(Move((row, col), (end_row, end_col), self.board))
+                elif end_piece[0] == enemy_color:  # capture enemy piece
+                    moves.append(Move((row, col), (end_row, end_col), self.board))
+                    break
+                else:  # friendly piece
                     break
 
     def getKnightMoves(self, row, col, moves):
@@ -451,17 +768,13 @@ class GameState:
                 self.pins.remove(self.pins[i])
                 break
 
-        knight_moves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2),
-                        (1, -2))  # up/left up/right right/up right/down down/left down/right left/up left/down
+        if piece_pinned:  # a pinned knight can never move
+            return
         ally_color = "w" if self.white_to_move else "b"
-        for move in knight_moves:
-            end_row = row + move[0]
-            end_col = col + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                if not piece_pinned:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] != ally_color:  # so its either enemy piece or empty square
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
+        for end_row, end_col in knight_targets[row][col]:
+            end_piece = self.board[end_row][end_col]
+            if end_piece[0] != ally_color:  # so its either enemy piece or empty square
+                moves.append(Move((row, col), (end_row, end_col), self.board))
 
     def getBishopMoves(self, row, col, moves):
         """
@@ -476,24 +789,20 @@ class GameState:
                 self.pins.remove(self.pins[i])
                 break
 
-        directions = ((-1, -1), (-1, 1), (1, 1), (1, -1))  # diagonals: up/left up/right down/right down/left
         enemy_color = "b" if self.white_to_move else "w"
-        for direction in directions:
-            for i in range(1, 8):
-                end_row = row + direction[0] * i
-                end_col = col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:  # check if the move is on board
-                    if not piece_pinned or pin_direction == direction or pin_direction == (
-                            -direction[0], -direction[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":  # empty space is valid
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:  # capture enemy piece
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                            break
-                        else:  # friendly piece
-                            break
-                else:  # off board
+        rays = square_rays[row][col]
+        for j in bishop_rays:
+            direction = ray_directions[j]
+            if piece_pinned and pin_direction != direction and pin_direction != (-direction[0], -direction[1]):
+                continue  # a pinned piece can only move along the pin
+            for end_row, end_col in rays[j]:
+                end_piece = self.board[end_row][end_col]
+                if end_piece == "--":  # empty space is valid
+                    moves.append(Move((row, col), (end_row, end_col), self.board))
+                elif end_piece[0] == enemy_color:  # capture enemy piece
+                    moves.append(Move((row, col), (end_row, end_col), self.board))
+                    break
+                else:  # friendly piece
                     break
 
     def getQueenMoves(self, row, col, moves):
@@ -507,28 +816,23 @@ class GameState:
         """
         Get all the king moves for the king located at row col and add the moves to the list.
         """
-        row_moves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        col_moves = (-1, 0, 1, -1, 1, -1, 0, 1)
         ally_color = "w" if self.white_to_move else "b"
-        for i in range(8):
-            end_row = row + row_moves[i]
-            end_col = col + col_moves[i]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:  # not an ally piece - empty or enemy
-                    # place king on end square and check for checks
-                    if ally_color == "w":
-                        self.white_king_location = (end_row, end_col)
-                    else:
-                        self.black_king_location = (end_row, end_col)
-                    in_check, pins, checks = self.checkForPinsAndChecks()
-                    if not in_check:
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                    # place king back on original location
-                    if ally_color == "w":
-                        self.white_king_location = (row, col)
-                    else:
-                        self.black_king_location = (row, col)
+        for end_row, end_col in king_targets[row][col]:
+            end_piece = self.board[end_row][end_col]
+            if end_piece[0] != ally_color:  # not an ally piece - empty or enemy
+                # place king on end square and check for checks
+                if ally_color == "w":
+                    self.white_king_location = (end_row, end_col)
+                else:
+                    self.black_king_location = (end_row, end_col)
+                in_check, pins, checks = self.checkForPinsAndChecks()
+                if not in_check:
+                    moves.append(Move((row, col), (end_row, end_col), self.board))
+                # place king back on original location
+                if ally_color == "w":
+                    self.white_king_location = (row, col)
+                else:
+                    self.black_king_location = (row, col)
 
     def getCastleMoves(self, row, col, moves):
         """
@@ -626,6 +930,13 @@ class Move:
 
         # TODO Disambiguating moves
 
+    def getUciNotation(self):
+        """
+        Long algebraic notation used by the UCI protocol, e.g. e2e4 or e7e8q.
+        """
+        notation = self.getRankFile(self.start_row, self.start_col) + self.getRankFile(self.end_row, self.end_col)
+        return notation + "q" if self.is_pawn_promotion else notation
+
     def getRankFile(self, row, col):
         return self.cols_to_files[col] + self.rows_to_ranks[row]
 
@@ -0,0 +1,236 @@
+"""
+Win/draw/loss bitbases for endgames of two kings and one white piece: KQK, KRK and KPK.
+The tables are generated offline by retrograde analysis with the GameState move rules, and stored as packed
+arrays of 2 bit values, four positions per byte. The search opens them lazily with mmap, so loading costs
+nothing until the first probe and a probe is one byte read.
+Positions where black has the extra piece are probed mirrored (ranks flipped, colors swapped).
+
+Example:
+    python bitbases.py            # generate all tables into ./bitbases
+    python bitbases.py KRK
+"""
+import argparse
+import mmap
+import os
+import time
+from array import array
+
+import ChessEngine
+
+# values, always from the point of view of the side to move
+DRAW = 0
+WIN = 1
+LOSS = 2
+ILLEGAL = 3
+UNKNOWN = 4  # only used while generating
+
+ENDGAMES = {"KQK": "Q", "KRK": "R", "KPK": "p"}  # the white piece of each endgame, KPK needs KQK for promotions
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+TABLE_SIZE = 2 * 64 * 64 * 64  # side to move, white king, black king, white piece
+
+loaded_bitbases = {}  # endgame name -> mmap, or None if the file is missing
+
+
+def positionIndex(white_to_move, white_king, black_king, piece):
+    """
+    Index of a position, the squares are row * 8 + col.
+    """
+    return (0 if white_to_move else 1) << 18 | white_king << 12 | black_king << 6 | piece
+
+
+def getBitbasePath(name):
+    return os.path.join(BITBASE_DIR, name + ".bb")
+
+
+def loadBitbase(name):
+    """
+    Return the memory mapped table of the endgame, or None if it has not been generated.
+    """
+    if name not in loaded_bitbases:
+        try:
+            with open(getBitbasePath(name), "rb") as bitbase_file:
+                table = mmap.mmap(bitbase_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(table) != TABLE_SIZE // 4:
+                table.close()
+                table = None
+        except (OSError, ValueError):
+            table = None
+        loaded_bitbases[name] = table
+    return loaded_bitbases[name]
+
+
+def probeTable(table, index):
+    return (table[index >> 2] >> ((index & 3) << 1)) & 3
+
+
+def probe(game_state):
+    """
+    Return WIN, DRAW or LOSS for the side to move, or None if the position is not covered by a generated bitbase.
+    """
+    if game_state.piece_count != 3:
+        return None
+    for row in range(8):
+        for col in range(8):
+            piece = game_state.board[row][col]
+            if piece != "--" and piece[1] != "K":
+                break
+        else:
+            continue
+        break
+    name = "K" + piece[1].upper() + "K"
+    if name not in ENDGAMES:
+        return None
+    table = loadBitbase(name)
+    if table is None:
+        return None
+    white_king = game_state.white_king_location
+    black_king = game_state.black_king_location
+    if piece[0] == "w":
+        index = positionIndex(game_state.white_to_move, white_king[0] * 8 + white_king[1],
+                              black_king[0] * 8 + black_king[1], row * 8 + col)
+    else:  # mirror the ranks and swap the colors
+        index = positionIndex(not game_state.white_to_move, (7 - black_king[0]) * 8 + black_king[1],
+                              (7 - white_king[0]) * 8 + white_king[1], (7 - row) * 8 + col)
+    value = probeTable(table, index)
+    return value if value != ILLEGAL else None
+
+
+def generateBitbase(name, verbose=False):
+    """
+    Solve the endgame by retrograde analysis and return a bytearray with one value per position index.
+    Every legal position gets its moves from GameState, positions without moves are mate (LOSS) or stalemate
+    (DRAW). From the mates the values are propagated backwards: a position is a WIN if a move reaches a LOSS,
+    and a LOSS once all its moves reach a WIN. Whatever is left unresolved is a DRAW.
+    """
+    piece = ENDGAMES[name]
+    promotion_table = None
+    if piece == "p":
+        promotion_table = loadBitbase("KQK")
+        if promotion_table is None:
+            raise RuntimeError("KPK needs the KQK bitbase, generate it first")
+    ChessEngine.USE_MOVE_CACHE = False  # every position is visited once, caching would only cost memory
+    no_castling = ChessEngine.CastleRights(False, False, False, False)
+    game_state = ChessEngine.GameState()
+
+    values = bytearray([ILLEGAL]) * TABLE_SIZE
+    unresolved_moves = bytearray(TABLE_SIZE)  # moves inside the table that do not reach a WIN yet
+    has_escape = bytearray(TABLE_SIZE)  # a move leaves the table without losing (capture or drawn promotion)
+    successor_start = array("l", [0]) * (TABLE_SIZE + 1)
+    successors = array("l")
+    solved = []  # positions with a known WIN or LOSS whose predecessors still have to be updated
+
+    start = time.time()
+    for index in range(TABLE_SIZE):
+        successor_start[index] = len(successors)
+        white_to_move = index >> 18 == 0
+        white_king, black_king, piece_square = index >> 12 & 63, index >> 6 & 63, index & 63
+        if len({white_king, black_king, piece_square}) < 3 or \
+                max(abs(white_king // 8 - black_king // 8), abs(white_king % 8 - black_king % 8)) <= 1 or \
+                (piece == "p" and piece_square // 8 in (0, 7)):
+            continue
+        board = [["--"] * 8 for row in range(8)]
+        board[white_king // 8][white_king % 8] = "wK"
+        board[black_king // 8][black_king % 8] = "bK"
+        board[piece_square // 8][piece_square % 8] = "w" + piece
+        game_state.setPosition(board, not white_to_move, no_castling, (), 0, 1)
+        if game_state.checkForPinsAndChecks()[0]:  # the side that just moved is in check
+            continue
+        game_state.white_to_move = white_to_move
+        moves = game_state.generateValidMoves()
+        if not moves:
+            values[index] = LOSS if game_state.checkmate else DRAW
+            if game_state.checkmate:
+                solved.append(index)
+            continue
+
+        values[index] = UNKNOWN
+        for move in moves:
+            end_square = move.end_row * 8 + move.end_col
+            if move.is_capture:  # the black king took the piece, a dead draw
+                has_escape[index] = 1
+                continue
+            new_white_king = end_square if move.piece_moved == "wK" else white_king
+            new_black_king = end_square if move.piece_moved == "bK" else black_king
+            new_piece_square = end_square if move.piece_moved[1] == piece else piece_square
+            successor = positionIndex(not white_to_move, new_white_king, new_black_king, new_piece_square)
+            if move.is_pawn_promotion:  # always a queen, look the result up in KQK
+                result = probeTable(promotion_table, successor)
+                if result == LOSS:
+                    values[index] = WIN
+                elif result != WIN:
+                    has_escape[index] = 1
+                continue
+            successors.append(successor)
+            unresolved_moves[index] += 1
+        if values[index] == WIN:
+            solved.append(index)
+    successor_start[TABLE_SIZE] = len(successors)
+    if verbose:
+        print("%s: %d moves generated in %.1fs" % (name, len(successors), time.time() - start))
+
+    # invert the successor lists into predecessor lists
+    predecessor_start = array("l", [0]) * (TABLE_SIZE + 1)
+    for successor in successors:
+        predecessor_start[successor + 1] += 1
+    for index in range(TABLE_SIZE):
+        predecessor_start[index + 1] += predecessor_start[index]
+    fill = array("l", predecessor_start)
+    predecessors = array("l", [0]) * len(successors)
+    for index in range(TABLE_SIZE):
+        for i in range(successor_start[index], successor_start[index + 1]):
+            successor = successors[i]
+            predecessors[fill[successor]] = index
+            fill[successor] += 1
+
+    while solved:
+        index = solved.pop()
+        won = values[index] == WIN
+        for i in range(predecessor_start[index], predecessor_start[index + 1]):
+            predecessor = predecessors[i]
+            if values[predecessor] != UNKNOWN:
+                continue
+            if not won:
+                values[predecessor] = WIN
+                solved.append(predecessor)
+            else:
+                unresolved_moves[predecessor] -= 1
+                if unresolved_moves[predecessor] == 0 and not has_escape[predecessor]:
+                    values[predecessor] = LOSS
+                    solved.append(predecessor)
+
+    for index in range(TABLE_SIZE):
+        if values[index] == UNKNOWN:
+            values[index] = DRAW
+    if verbose:
+        print("%s: %d wins, %d draws, %d losses in %.1fs" % (name, values.count(WIN), values.count(DRAW),
+                                                             values.count(LOSS), time.time() - start))
+    return values
+
+
+def saveBitbase(name, values):
+    """
+    Pack the values four to a byte and write them atomically, so a running engine never maps a partial file.
+    """
+    packed = bytearray(TABLE_SIZE // 4)
+    for index in range(0, TABLE_SIZE, 4):
+        packed[index >> 2] = values[index] | values[index + 1] << 2 | values[index + 2] << 4 | values[index + 3] << 6
+    os.makedirs(BITBASE_DIR, exist_ok=True)
+    path = getBitbasePath(name)
+    with open(path + ".tmp", "wb") as bitbase_file:
+        bitbase_file.write(packed)
+    os.replace(path + ".tmp", path)
+    loaded_bitbases.pop(name, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the endgame bitbases probed by the search.")
+    parser.add_argument("endgames", nargs="*", choices=list(ENDGAMES), help="endgames to generate (default: all)")
+    args = parser.parse_args()
+    for name in ENDGAMES:  # in dependency order
+        if not args.endgames or name in args.endgames:
+            saveBitbase(name, generateBitbase(name, verbose=True))
+            print("wrote " + getBitbasePath(name))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Headless arena for engine-vs-engine matches.
+Plays games between two engine configurations in parallel worker processes, writes every game as PGN and
+reports the result as an Elo difference with its error bar.
+
+Example:
+    python chess_arena.py --games 40 --engine-a depth=3 --engine-b depth=2,USE_PAWN_STRUCTURE=0 --workers 4
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ChessEngine, ChessAI
+
+MAX_PLIES = 300  # games still running after this many half moves are adjudicated as draws
+DEFAULT_OPENINGS = [
+    "e2e4 e7e5 g1f3 b8c6 f1b5",  # Ruy Lopez
+    "e2e4 e7e5 g1f3 b8c6 f1c4",  # Italian Game
+    "e2e4 c7c5 g1f3 d7d6",  # Sicilian Defence
+    "e2e4 e7e6 d2d4 d7d5",  # French Defence
+    "e2e4 c7c6 d2d4 d7d5",  # Caro-Kann Defence
+    "d2d4 d7d5 c2c4 e7e6",  # Queen's Gambit Declined
+    "d2d4 g8f6 c2c4 g7g6",  # King's Indian Defence
+    "c2c4 e7e5",  # English Opening
+]
+
+
+def parseEngineConfig(text, default_name):
+    """
+    Parse an engine configuration like "depth=3,time=0.5,USE_PAWN_STRUCTURE=0".
+    depth and time set the search limits, name sets the name used in the PGN files,
+    USE_* keys set the boolean feature flags of the ChessAI or ChessEngine modules to 0 or 1.
+    Raises ValueError for any other key.
+    """
+    config = {"name": default_name, "depth": ChessAI.DEPTH, "time_limit": None, "flags": {}}
+    for item in filter(None, text.split(",")):
+        if "=" not in item:
+            raise ValueError("engine option without a value: " + item)
+        key, value = item.split("=", 1)
+        if key == "depth":
+            config["depth"] = int(value)
+        elif key == "time":
+            config["time_limit"] = float(value)
+        elif key == "name":
+            config["name"] = value
+        elif key.startswith("USE_") and isinstance(getattr(flagModule(key), key, None), bool):
+            if value not in ("0", "1"):
+                raise ValueError("engine flag %s must be 0 or 1, not %s" % (key, value))
+            config["flags"][key] = value == "1"
+        else:
+            raise ValueError("unknown engine option: " + key)
+    return config
+
+
+def flagModule(key):
+    return ChessAI if hasattr(ChessAI, key) else ChessEngine
+
+
+flag_defaults = {}  # module default of every flag the arena has touched in this process
+
+
+def applyEngineFlags(flags, keys):
+    """
+    Reset every flag in keys (all the flags either engine sets) to its module default, then apply flags,
+    so a flag of one engine never stays active while the other engine moves in the same worker process.
+    """
+    for key in keys:
+        module = flagModule(key)
+        flag_defaults.setdefault(key, getattr(module, key))
+        setattr(module, key, flags.get(key, flag_defaults[key]))
+
+
+def loadOpenings(path):
+    """
+    Read opening lines, one line of UCI moves per opening. Empty lines and lines starting with # are skipped.
+    """
+    with open(path) as openings_file:
+        return [line.split("#")[0].strip() for line in openings_file if line.split("#")[0].strip()]
+
+
+def findMove(valid_moves, uci_move):
+    for move in valid_moves:
+        if move.getUciNotation() == uci_move:
+            return move
+    raise ValueError("illegal move in opening: " + uci_move)
+
+
+def playGame(game_number, opening, white_config, black_config, seed):
+    """
+    Play one game from the opening and return its result, statistics and the SAN moves.
+    Runs inside a worker process. The game starts from the initial position and the opening comes as UCI moves,
+    not as a position encoded with GameState.toBytes: the PGN and the repetition count need the moves.
+    """
+    random.seed(seed)
+    flag_keys = set(white_config["flags"]) | set(black_config["flags"])
+    game_state = ChessEngine.GameState()
+    san_moves = []
+    cpu_seconds = {"white": 0.0, "black": 0.0}
+    valid_moves = game_state.getValidMoves()
+    positions = {game_state.getPositionKey(): 1}
+    for uci_move in opening.split():
+        move = findMove(valid_moves, uci_move)
+        san_moves.append(game_state.getSanNotation(move, valid_moves))
+        game_state.makeMove(move)
+        valid_moves = game_state.getValidMoves()
+        positions[game_state.getPositionKey()] = positions.get(game_state.getPositionKey(), 0) + 1
+
+    result, termination = None, None
+    while result is None:
+        if game_state.checkmate:
+            result, termination = ("0-1" if game_state.white_to_move else "1-0"), "checkmate"
+        elif game_state.stalemate:
+            result, termination = "1/2-1/2", "stalemate"
+        elif positions[game_state.getPositionKey()] >= 3:
+            result, termination = "1/2-1/2", "threefold repetition"
+        elif game_state.halfmove_clock >= 100:
+            result, termination = "1/2-1/2", "fifty-move rule"
+        elif game_state.hasInsufficientMaterial():
+            result, termination = "1/2-1/2", "insufficient material"
+        elif len(game_state.move_log) >= MAX_PLIES:
+            result, termination = "1/2-1/2", "adjudication"
+        else:
+            side = "white" if game_state.white_to_move else "black"
+            config = white_config if game_state.white_to_move else black_config
+            applyEngineFlags(config["flags"], flag_keys)
+            start = time.process_time()
+            move = ChessAI.searchBestMove(game_state, list(valid_moves), config["depth"], config["time_limit"])
+            cpu_seconds[side] += time.process_time() - start
+            if move is None:
+                move = ChessAI.findRandomMove(valid_moves)
+            san_moves.append(game_state.getSanNotation(move, valid_moves))
+            game_state.makeMove(move)
+            valid_moves = game_state.getValidMoves()
+            positions[game_state.getPositionKey()] = positions.get(game_state.getPositionKey(), 0) + 1
+
+    return {"game": game_number, "white": white_config["name"], "black": black_config["name"],
+            "opening": opening, "result": result, "termination": termination, "plies": len(san_moves),
+            "cpu_seconds": cpu_seconds, "moves": san_moves}
+
+
+def writePgn(path, game, event):
+    headers = [("Event", event), ("Site", "chess_arena"), ("Date", datetime.date.today().strftime("%Y.%m.%d")),
+               ("Round", str(game["game"])), ("White", game["white"]), ("Black", game["black"]),
+               ("Result", game["result"]), ("Termination", game["termination"])]
+    lines = ['[%s "%s"]' % header for header in headers]
+    move_text = []
+    for i, san in enumerate(game["moves"]):
+        move_text.append(str(i // 2 + 1) + ". " + san if i % 2 == 0 else san)
+    move_text.append(game["result"])
+    # wrap the move text at 80 characters like most PGN writers
+    line = ""
+    body = []
+    for token in move_text:
+        if line and len(line) + len(token) + 1 > 80:
+            body.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    body.append(line)
+    with open(path, "w") as pgn_file:
+        pgn_file.write("\n".join(lines) + "\n\n" + "\n".join(body) + "\n")
+
+
+def eloDifference(wins, draws, losses):
+    """
+    Elo difference of engine A against engine B and the half width of its 95% confidence interval.
+    The half width is None when every game had the same result (all wins, all draws or all losses):
+    the sample variance is zero then, which says nothing about the real uncertainty.
+    """
+    games = wins + draws + losses
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+
+    def toElo(s):
+        s = min(max(s, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / s - 1)
+
+    if variance == 0:
+        return toElo(score), None
+    margin = 1.96 * math.sqrt(variance / games)
+    return toElo(score), (toElo(score + margin) - toElo(score - margin)) / 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play engine-vs-engine matches without the UI.")
+    parser.add_argument("--games", type=int, default=20, help="number of games, colors alternate every game")
+    parser.add_argument("--engine-a", default="", help="configuration of engine A, e.g. depth=3,time=1.0")
+    parser.add_argument("--engine-b", default="", help="configuration of engine B")
+    parser.add_argument("--openings", help="file with opening lines in UCI moves, one per line")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--out", default="arena_results", help="directory for the PGN files and results.json")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    engine_a = parseEngineConfig(args.engine_a, "A")
+    engine_b = parseEngineConfig(args.engine_b, "B")
+    openings = loadOpenings(args.openings) if args.openings else DEFAULT_OPENINGS
+    os.makedirs(args.out, exist_ok=True)
+    event = engine_a["name"] + " vs " + engine_b["name"]
+
+    start = time.time()
+    games = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {}  # future -> whether engine A plays white, the names of both engines may be the same
+        for i in range(args.games):
+            # every opening is played twice, once with each engine as white
+            opening = openings[(i // 2) % len(openings)]
+            white, black = (engine_a, engine_b) if i % 2 == 0 else (engine_b, engine_a)
+            futures[executor.submit(playGame, i + 1, opening, white, black, args.seed + i)] = i % 2 == 0
+        for future in as_completed(futures):
+            game = future.result()
+            game["a_is_white"] = futures[future]
+            games.append(game)
+            writePgn(os.path.join(args.out, "game_%04d.pgn" % game["game"]), game, event)
+            print("game %d: %s - %s %s (%s, %d plies)" % (game["game"], game["white"], game["black"],
+                                                         game["result"], game["termination"], game["plies"]))
+    elapsed = time.time() - start
+
+    wins = draws = losses = 0
+    cpu_a = cpu_b = 0.0
+    for game in games:
+        a_is_white = game["a_is_white"]
+        cpu_a += game["cpu_seconds"]["white" if a_is_white else "black"]
+        cpu_b += game["cpu_seconds"]["black" if a_is_white else "white"]
+        if game["result"] == "1/2-1/2":
+            draws += 1
+        elif (game["result"] == "1-0") == a_is_white:
+            wins += 1
+        else:
+            losses += 1
+    elo, margin = eloDifference(wins, draws, losses)
+    summary = {"engine_a": engine_a, "engine_b": engine_b, "games": len(games), "wins": wins, "draws": draws,
+               "losses": losses, "elo": elo, "elo_margin": margin, "wall_seconds": elapsed,
+               "games_per_hour": len(games) * 3600 / elapsed, "cpu_seconds_a": cpu_a, "cpu_seconds_b": cpu_b,
+               "results": [{key: value for key, value in game.items() if key != "moves"}
+                           for game in sorted(games, key=lambda g: g["game"])]}
+    with open(os.path.join(args.out, "results.json"), "w") as results_file:
+        json.dump(summary, results_file, indent=2)
+
+    print("%s: +%d =%d -%d" % (event, wins, draws, losses))
+    if margin is None:
+        print("Elo difference: %.1f, error bar undefined (every game had the same result)" % elo)
+    else:
+        print("Elo difference: %.1f +/- %.1f (95%%)" % (elo, margin))
+    print("%.1f games/hour, CPU seconds A: %.1f, B: %.1f" % (summary["games_per_hour"], cpu_a, cpu_b))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Benchmark of the engine hot paths under real search load.
+Searches a fixed set of positions with fixed seeds, once plain to time the search and once with timing wrappers
+around the hot functions to count their calls and cost. Optionally captures a cProfile or tracemalloc report.
+The results can be written as JSON and compared against a stored baseline, the run fails (exit code 1) when the
+search or a hot function got slower than the baseline by more than the threshold.
+
+Example:
+    python chess_bench.py --json baseline.json
+    python chess_bench.py --baseline baseline.json --threshold 0.1
+"""
+import argparse
+import cProfile
+import functools
+import json
+import platform
+import pstats
+import random
+import sys
+import time
+import tracemalloc
+
+import ChessEngine, ChessAI
+
+POSITIONS = [
+    ChessEngine.STARTING_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",  # "Kiwipete", many pieces and pins
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP2BPPP/R2QKB1R w KQ - 0 8",  # quiet middlegame
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",  # endgame with checks
+]
+
+# (owner, attribute name, reported name)
+HOT_FUNCTIONS = [
+    (ChessEngine.GameState, "getValidMoves", "getValidMoves"),
+    (ChessEngine.GameState, "checkForPinsAndChecks", "checkForPinsAndChecks"),
+    (ChessEngine.GameState, "makeMove", "makeMove"),
+    (ChessEngine.GameState, "undoMove", "undoMove"),
+    (ChessEngine.Move, "__init__", "Move.__init__"),
+    (ChessAI, "scoreBoard", "scoreBoard"),
+]
+
+
+def runSearches(positions, depth, seed):
+    """
+    Search every position from a cold start (empty caches, fixed seed).
+    Returns the number of searched nodes and the pawn hash table hits and probes summed over the positions.
+    """
+    nodes = hits = probes = 0
+    for i, fen in enumerate(positions):
+        random.seed(seed + i)
+        ChessEngine.clearMoveCache()
+        ChessAI.pawn_hash_table.clear()
+        game_state = ChessEngine.GameState(fen)
+        ChessAI.searchBestMove(game_state, game_state.getValidMoves(), depth)
+        nodes += ChessAI.nodes_searched
+        hits += ChessAI.pawn_hash_table.hits
+        probes += ChessAI.pawn_hash_table.hits + ChessAI.pawn_hash_table.misses
+    return nodes, hits, probes
+
+
+def timeSearches(positions, depth, seed, repeat):
+    """
+    Best wall time of repeat runs, the minimum is the least noisy estimate of the real cost.
+    """
+    best = None
+    nodes = hits = probes = 0
+    for i in range(repeat):
+        start = time.perf_counter()
+        nodes, hits, probes = runSearches(positions, depth, seed)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return {"nodes": nodes, "seconds": best, "nodes_per_second": nodes / best,
+            "pawn_hash_hit_rate": hits / probes if probes else 0.0}
+
+
+def measureFunctions(positions, depth, seed):
+    """
+    Count the calls and the inclusive time of the hot functions during one run.
+    The wrappers add their own overhead, so the times are only comparable between runs of this harness.
+    """
+    stats = {name: {"calls": 0, "seconds": 0.0} for owner, attribute, name in HOT_FUNCTIONS}
+    originals = []
+
+    def wrap(function, stat):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stat["seconds"] += time.perf_counter() - start
+                stat["calls"] += 1
+        return wrapper
+
+    for owner, attribute, name in HOT_FUNCTIONS:
+        function = getattr(owner, attribute)
+        originals.append((owner, attribute, function))
+        setattr(owner, attribute, wrap(function, stats[name]))
+    try:
+        runSearches(positions, depth, seed)
+    finally:
+        for owner, attribute, function in originals:
+            setattr(owner, attribute, function)
+    for stat in stats.values():
+        stat["per_call_us"] = stat["seconds"] / stat["calls"] * 1e6 if stat["calls"] else 0.0
+    return stats
+
+
+def profileSearches(positions, depth, seed, path):
+    profiler = cProfile.Profile()
+    profiler.runcall(runSearches, positions, depth, seed)
+    profiler.dump_stats(path)
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+
+def traceAllocations(positions, depth, seed):
+    """
+    Peak traced memory of one run and the source lines that allocated the most.
+    """
+    tracemalloc.start()
+    runSearches(positions, depth, seed)
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    top = snapshot.statistics("lineno")[:10]
+    return {"peak_bytes": peak, "current_bytes": current,
+            "top": [{"line": str(stat.traceback), "bytes": stat.size, "count": stat.count} for stat in top]}
+
+
+def compareWithBaseline(result, baseline, threshold):
+    """
+    Return the regressions against the baseline: search time and per call cost of the hot functions.
+    """
+    regressions = []
+    checks = [("search seconds", result["search"]["seconds"], baseline["search"]["seconds"])]
+    for name, stat in result["functions"].items():
+        if name in baseline.get("functions", {}):
+            checks.append((name + " us/call", stat["per_call_us"], baseline["functions"][name]["per_call_us"]))
+    for name, value, base in checks:
+        change = value / base - 1 if base else 0.0
+        print("%-32s %12.3f %12.3f %+7.1f%%" % (name, base, value, change * 100))
+        if change > threshold:
+            regressions.append(name)
+    if "pawn_hash_hit_rate" in baseline["search"]:
+        print("%-32s %11.1f%% %11.1f%%" % ("pawn hash hit rate", baseline["search"]["pawn_hash_hit_rate"] * 100,
+                                           result["search"]["pawn_hash_hit_rate"] * 100))
+    if result["search"]["nodes"] != baseline["search"]["nodes"]:
+        print("note: the search visited %d nodes, the baseline %d" % (result["search"]["nodes"],
+                                                                       baseline["search"]["nodes"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the engine hot paths and check for regressions.")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs, the fastest one counts")
+    parser.add_argument("--fen", action="append", help="position to search, can be repeated (default: built-in set)")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown against the baseline")
+    parser.add_argument("--profile", help="write cProfile stats to this file and print the top functions")
+    parser.add_argument("--tracemalloc", action="store_true", help="measure the memory allocated by a search")
+    args = parser.parse_args()
+    positions = args.fen or POSITIONS
+
+    result = {"depth": args.depth, "seed": args.seed, "positions": positions,
+              "python": platform.python_version(), "machine": platform.machine(),
+              "search": timeSearches(positions, args.depth, args.seed, args.repeat),
+              "functions": measureFunctions(positions, args.depth, args.seed)}
+    print("%d nodes in %.3fs, %.0f nodes/sec" % (result["search"]["nodes"], result["search"]["seconds"],
+                                                   result["search"]["nodes_per_second"]))
+    print("pawn hash table hit rate: %.1f%%" % (result["search"]["pawn_hash_hit_rate"] * 100))
+    print("%-24s %10s %10s %10s" % ("function", "calls", "seconds", "us/call"))
+    for name, stat in result["functions"].items():
+        print("%-24s %10d %10.3f %10.2f" % (name, stat["calls"], stat["seconds"], stat["per_call_us"]))
+
+    if args.tracemalloc:
+        result["memory"] = traceAllocations(positions, args.depth, args.seed)
+        print("peak traced memory: %.1f KiB" % (result["memory"]["peak_bytes"] / 1024))
+        for stat in result["memory"]["top"]:
+            print("%10.1f KiB %8d blocks  %s" % (stat["bytes"] / 1024, stat["count"], stat["line"]))
+    if args.profile:
+        profileSearches(positions, args.depth, args.seed, args.profile)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(result, json_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if (baseline["depth"], baseline["seed"], baseline["positions"]) != (args.depth, args.seed, positions):
+            print("the baseline was run with other settings, not comparable")
+            sys.exit(2)
+        print("%-32s %12s %12s %8s" % ("", "baseline", "now", "change"))
+        regressions = compareWithBaseline(result, baseline, args.threshold)
+        if regressions:
+            print("regressions over %.0f%%: %s" % (args.threshold * 100, ", ".join(regressions)))
+            sys.exit(1)
+        print("no regressions over %.0f%%" % (args.threshold * 100))
+
+
+if __name__ == "__main__":
+    main()
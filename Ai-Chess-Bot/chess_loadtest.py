@@ -0,0 +1,84 @@
+"""
+Load test for chess_service.py.
+Plays N concurrent games against the service, answering every engine move with a random legal move,
+and reports the move latency percentiles seen by the clients.
+
+Example:
+    python chess_loadtest.py --games 32 --plies 20 --movetime 200
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import ChessEngine
+
+
+async def readUntil(reader, prefix):
+    while True:
+        line = (await reader.readline()).decode()
+        if not line:
+            raise ConnectionError("service closed the connection")
+        if line.startswith(prefix):
+            return line.split()
+
+
+async def playGame(host, port, plies, movetime, latencies, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"uci\nucinewgame\nisready\n")
+    await readUntil(reader, "readyok")
+    game_state = ChessEngine.GameState()
+    moves = []
+    engine_turn = seed % 2 == 0  # half of the games start with an engine move
+    for ply in range(plies):
+        valid_moves = game_state.getValidMoves()
+        if not valid_moves:
+            break
+        if engine_turn:
+            writer.write(("position startpos moves %s\ngo movetime %d\n" % (" ".join(moves), movetime)).encode())
+            start = time.perf_counter()
+            uci_move = (await readUntil(reader, "bestmove"))[1]
+            latencies.append(time.perf_counter() - start)
+            move = next(move for move in valid_moves if move.getUciNotation() == uci_move)
+        else:
+            move = rng.choice(valid_moves)
+        game_state.makeMove(move)
+        moves.append(move.getUciNotation())
+        engine_turn = not engine_turn
+    writer.write(b"quit\n")
+    await writer.drain()
+    writer.close()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def run(args):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[playGame(args.host, args.port, args.plies, args.movetime, latencies, args.seed + i)
+                           for i in range(args.games)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print("%d games, %d engine moves in %.1fs (%.1f moves/sec)" % (args.games, len(latencies), elapsed,
+                                                                   len(latencies) / elapsed))
+    print("move latency: p50 %.0f ms, p99 %.0f ms, max %.0f ms" % (percentile(latencies, 0.5) * 1000,
+                                                                    percentile(latencies, 0.99) * 1000,
+                                                                    latencies[-1] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure move latency of chess_service.py under concurrent games.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--games", type=int, default=16, help="number of concurrent games")
+    parser.add_argument("--plies", type=int, default=20, help="half moves per game")
+    parser.add_argument("--movetime", type=int, default=200, help="time budget per engine move in ms")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
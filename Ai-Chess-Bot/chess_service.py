@@ -0,0 +1,207 @@
+"""
+Headless engine service for many simultaneous games.
+An asyncio server speaks a line based, UCI compatible protocol over a local socket, one game per connection,
+and hands the searches to a bounded process pool. Requests are served first come, first served across games,
+and every search gets a time budget that counts from the moment its "go" command arrived.
+
+Supported commands: uci, isready, ucinewgame, position [startpos | fen <fen>] [moves ...],
+go [movetime <ms>] [wtime <ms> btime <ms> winc <ms> binc <ms>] [depth <n>], quit.
+
+Example:
+    python chess_service.py --port 5055 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ChessEngine, ChessAI
+
+DEFAULT_MOVETIME = 1000  # ms, used when the go command does not limit the time
+MAX_MOVETIME = 10000  # ms, upper bound of any time budget
+MIN_SEARCH_TIME = 0.01  # s, searches that waited too long in the queue still get this long
+MAX_QUEUED_REQUESTS = 1024
+
+
+def searchPosition(position, depth, time_limit):
+    """
+    Search a position encoded with GameState.toBytes. Runs inside a worker process.
+    Returns the best move in UCI notation ("0000" if there is none) and the number of searched nodes.
+    """
+    game_state = ChessEngine.GameState.fromBytes(position)
+    valid_moves = game_state.getValidMoves()
+    if not valid_moves:
+        return "0000", 0
+    move = ChessAI.searchBestMove(game_state, list(valid_moves), depth, time_limit)
+    if move is None:  # not even the first iteration finished in time
+        move = ChessAI.findRandomMove(valid_moves)
+    return move.getUciNotation(), ChessAI.nodes_searched
+
+
+class Game:
+    """
+    State of one game (one client connection).
+    """
+
+    def __init__(self):
+        self.game_state = ChessEngine.GameState()
+        self.start_fen = ChessEngine.STARTING_FEN
+        self.moves = []  # UCI moves played from the start position
+
+    def setPosition(self, start_fen, moves):
+        """
+        Set the position of a "position" command, when it only extends the current game just play the new moves.
+        """
+        if start_fen != self.start_fen or moves[:len(self.moves)] != self.moves:
+            self.game_state = ChessEngine.GameState(start_fen)
+            self.start_fen = start_fen
+            self.moves = []
+        for uci_move in moves[len(self.moves):]:
+            valid_moves = self.game_state.getValidMoves()
+            move = next((move for move in valid_moves if move.getUciNotation() == uci_move), None)
+            if move is None:
+                raise ValueError("illegal move " + uci_move)
+            self.game_state.makeMove(move)
+            self.moves.append(uci_move)
+
+
+class EngineService:
+    def __init__(self, workers, depth, max_movetime):
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.workers = workers
+        self.depth = depth
+        self.max_movetime = max_movetime
+        self.requests = None  # created inside the event loop
+
+    async def serve(self, host, port):
+        self.requests = asyncio.Queue(MAX_QUEUED_REQUESTS)
+        # one dispatcher per worker process, so at most that many searches run and the rest wait in order
+        dispatchers = [asyncio.create_task(self.dispatch()) for i in range(self.workers)]
+        server = await asyncio.start_server(self.handleClient, host, port)
+        print("engine service listening on %s:%d with %d workers" % (host, port, self.workers))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for dispatcher in dispatchers:
+                dispatcher.cancel()
+            self.executor.shutdown(cancel_futures=True)
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            position, depth, deadline, result = await self.requests.get()
+            time_limit = max(deadline - time.time(), MIN_SEARCH_TIME)
+            try:
+                result.set_result(await loop.run_in_executor(self.executor, searchPosition, position, depth,
+                                                             time_limit))
+            except Exception as e:
+                result.set_exception(e)
+
+    def getTimeBudget(self, options, white_to_move):
+        """
+        Time budget of a go command in seconds.
+        """
+        if "movetime" in options:
+            movetime = options["movetime"]
+        elif ("wtime" if white_to_move else "btime") in options:
+            remaining = options["wtime" if white_to_move else "btime"]
+            increment = options.get("winc" if white_to_move else "binc", 0)
+            movetime = remaining / 30 + increment
+        else:
+            movetime = DEFAULT_MOVETIME
+        return min(movetime, self.max_movetime) / 1000
+
+    async def handleClient(self, reader, writer):
+        game = Game()
+        pending_search = None
+
+        def send(line):
+            writer.write((line + "\n").encode())
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                tokens = line.decode(errors="replace").split()  # a garbled line is answered, not fatal
+                if not tokens:
+                    continue
+                command = tokens[0]
+                if command == "uci":
+                    send("id name ChessAI")
+                    send("id author AI-ML-Projects")
+                    send("uciok")
+                elif command == "isready":
+                    if pending_search is not None:  # answer once the running search is reported
+                        await pending_search
+                    send("readyok")
+                elif command == "ucinewgame":
+                    game = Game()
+                elif command == "position":
+                    if pending_search is not None:
+                        await pending_search
+                    moves = tokens[tokens.index("moves") + 1:] if "moves" in tokens else []
+                    fen_tokens = tokens[2:tokens.index("moves")] if "moves" in tokens else tokens[2:]
+                    start_fen = " ".join(fen_tokens) if len(tokens) > 1 and tokens[1] == "fen" else \
+                        ChessEngine.STARTING_FEN
+                    try:
+                        game.setPosition(start_fen, moves)
+                    except ValueError as e:
+                        send("info string " + str(e))
+                elif command == "go":
+                    if pending_search is not None:
+                        await pending_search
+                    options = {}
+                    for i in range(1, len(tokens) - 1):
+                        if tokens[i] in ("movetime", "wtime", "btime", "winc", "binc", "depth") and \
+                                tokens[i + 1].isdecimal():  # "²".isdigit() is true, but int() rejects it
+                            options[tokens[i]] = int(tokens[i + 1])
+                    deadline = time.time() + self.getTimeBudget(options, game.game_state.white_to_move)
+                    pending_search = asyncio.create_task(
+                        self.search(game.game_state.toBytes(), options.get("depth", self.depth), deadline, send))
+                elif command == "stop":
+                    pass  # searches always end within their time budget
+                elif command == "quit":
+                    break
+                else:
+                    send("info string unknown command " + command)
+                await writer.drain()
+            if pending_search is not None:
+                await pending_search
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def search(self, position, depth, deadline, send):
+        start = time.time()
+        result = asyncio.get_running_loop().create_future()
+        await self.requests.put((position, depth, deadline, result))
+        try:
+            best_move, nodes = await result
+        except Exception as e:
+            send("info string search failed: " + str(e))
+            best_move, nodes = "0000", 0
+        send("info nodes %d time %d" % (nodes, (time.time() - start) * 1000))
+        send("bestmove " + best_move)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the chess engine to many games over a local socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of search processes")
+    parser.add_argument("--depth", type=int, default=ChessAI.DEPTH, help="default maximum search depth")
+    parser.add_argument("--max-movetime", type=int, default=MAX_MOVETIME, help="upper bound of a search in ms")
+    args = parser.parse_args()
+    service = EngineService(args.workers, args.depth, args.max_movetime)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
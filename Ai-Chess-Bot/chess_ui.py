@@ -6,6 +6,7 @@ Displaying current GameStatus object.
 import pygame as p
 import ChessEngine, ChessAI
 import sys
+import queue
 from multiprocessing import Process, Queue
 
 BOARD_WIDTH = BOARD_HEIGHT = 512
@@ -14,7 +15,16 @@ MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
 DIMENSION = 8
 SQUARE_SIZE = BOARD_HEIGHT // DIMENSION
 MAX_FPS = 15
+ANIMATION_FPS = 60
+FRAMES_PER_SQUARE = 10  # animation frames to move a piece one square
+ANIMATE_MOVES = True  # with two engines and no animations the game runs as fast as the engines can move
 IMAGES = {}
+HIGHLIGHT_SURFACES = {}  # translucent squares used to highlight moves
+MOVE_LOG_LINE_CACHE_SIZE = 256
+move_log_line_cache = {}  # rendered move log lines by their text
+board_surface = None  # the empty board, rendered once
+drawn_squares = {}  # what is on the screen for every square: (piece, highlight colors)
+drawn_move_log = None  # the move log lines on the screen
 
 
 def loadImages():
@@ -27,6 +37,34 @@ def loadImages():
         IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQUARE_SIZE, SQUARE_SIZE))
 
 
+def createBoardSurfaces():
+    """
+    Pre-render the empty board and the highlight squares.
+    This will be called exactly once in the main, frames copy squares from these surfaces.
+    """
+    global board_surface
+    colors = [p.Color("white"), p.Color("gray")]
+    board_surface = p.Surface((BOARD_WIDTH, BOARD_HEIGHT))
+    for row in range(DIMENSION):
+        for column in range(DIMENSION):
+            color = colors[((row + column) % 2)]
+            p.draw.rect(board_surface, color, p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+    for color in ('green', 'blue', 'yellow'):
+        s = p.Surface((SQUARE_SIZE, SQUARE_SIZE))
+        s.set_alpha(100)  # transparency value 0 -> transparent, 255 -> opaque
+        s.fill(p.Color(color))
+        HIGHLIGHT_SURFACES[color] = s
+
+
+def invalidateScreen():
+    """
+    Forget what is on the screen, so the next frame redraws everything.
+    """
+    global drawn_move_log
+    drawn_squares.clear()
+    drawn_move_log = None
+
+
 def main():
     """
     The main driver for our code.
@@ -40,7 +78,11 @@ def main():
     valid_moves = game_state.getValidMoves()
     move_made = False  # flag variable for when a move is made
     animate = False  # flag variable for when we should animate a move
+    animation = None  # the move being animated and its current frame
     loadImages()  # do this only once before while loop
+    createBoardSurfaces()
+    screen_ready = False  # nothing has been drawn yet
+    end_text_drawn = False
     running = True
     square_selected = ()  # no square is selected initially, this will keep track of the last click of the user (tuple(row,col))
     player_clicks = []  # this will keep track of player clicks (two tuples)
@@ -54,10 +96,16 @@ def main():
 
     while running:
         human_turn = (game_state.white_to_move and player_one) or (not game_state.white_to_move and player_two)
-        for e in p.event.get():
+        if screen_ready and (human_turn or game_over) and animation is None:
+            events = [p.event.wait()] + p.event.get()  # nothing changes until the user acts, so sleep until then
+        else:
+            events = p.event.get()
+        for e in events:
             if e.type == p.QUIT:
                 p.quit()
                 sys.exit()
+            elif e.type in (p.VIDEOEXPOSE, p.WINDOWEXPOSED):
+                invalidateScreen()
             # mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
                 if not game_over:
@@ -88,6 +136,7 @@ def main():
                     game_state.undoMove()
                     move_made = True
                     animate = False
+                    animation = None
                     game_over = False
                     if ai_thinking:
                         move_finder_process.terminate()
@@ -100,6 +149,7 @@ def main():
                     player_clicks = []
                     move_made = False
                     animate = False
+                    animation = None
                     game_over = False
                     if ai_thinking:
                         move_finder_process.terminate()
@@ -111,113 +161,135 @@ def main():
             if not ai_thinking:
                 ai_thinking = True
                 return_queue = Queue()  # used to pass data between threads
-                move_finder_process = Process(target=ChessAI.findBestMove, args=(game_state, valid_moves, return_queue))
+                move_finder_process = Process(target=ChessAI.findBestMove, args=(game_state.toBytes(), return_queue))
                 move_finder_process.start()
 
-            if not move_finder_process.is_alive():
-                ai_move = return_queue.get()
+            try:
+                if player_one or player_two or animation is not None:
+                    ai_move_id = return_queue.get_nowait()
+                else:  # engine vs engine: wait for the reply itself instead of polling at the frame rate
+                    ai_move_id = return_queue.get(timeout=1 / MAX_FPS)
+            except queue.Empty:
+                pass
+            else:
+                ai_move = next((move for move in valid_moves if move.moveID == ai_move_id), None)
                 if ai_move is None:
                     ai_move = ChessAI.findRandomMove(valid_moves)
                 game_state.makeMove(ai_move)
                 move_made = True
-                animate = True
+                animate = ANIMATE_MOVES
                 ai_thinking = False
 
         if move_made:
-            if animate:
-                animateMove(game_state.move_log[-1], screen, game_state.board, clock)
+            if animate:  # a running animation is skipped, the new move is animated instead
+                animation = startAnimation(game_state.move_log[-1])
             valid_moves = game_state.getValidMoves()
             move_made = False
             animate = False
             move_undone = False
 
-        drawGameState(screen, game_state, valid_moves, square_selected)
+        if end_text_drawn and not (game_state.checkmate or game_state.stalemate):  # the game went on after an undo
+            invalidateScreen()
+            end_text_drawn = False
 
-        if not game_over:
-            drawMoveLog(screen, game_state, move_log_font)
+        if animation is not None and animation["frame"] > animation["frame_count"]:
+            animation = None  # the piece arrived, this frame draws the final position
+        dirty_rects = drawGameState(screen, game_state, valid_moves, square_selected, animation)
+        if animation is not None:
+            animation["frame"] += 1
 
-        if game_state.checkmate:
-            game_over = True
-            if game_state.white_to_move:
-                drawEndGameText(screen, "Black wins by checkmate")
-            else:
-                drawEndGameText(screen, "White wins by checkmate")
+        if not game_over:
+            dirty_rects += drawMoveLog(screen, game_state, move_log_font)
 
-        elif game_state.stalemate:
+        if game_state.checkmate or game_state.stalemate:
             game_over = True
-            drawEndGameText(screen, "Stalemate")
-
-        clock.tick(MAX_FPS)
-        p.display.flip()
-
-
-def drawGameState(screen, game_state, valid_moves, square_selected):
+            if not end_text_drawn and animation is None:
+                if game_state.stalemate:
+                    drawEndGameText(screen, "Stalemate")
+                elif game_state.white_to_move:
+                    drawEndGameText(screen, "Black wins by checkmate")
+                else:
+                    drawEndGameText(screen, "White wins by checkmate")
+                end_text_drawn = True
+                dirty_rects.append(p.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT))
+
+        if animation is not None:
+            clock.tick(ANIMATION_FPS)
+        elif player_one or player_two:
+            clock.tick(MAX_FPS)
+        if dirty_rects:
+            p.display.update(dirty_rects)  # only push the changed parts of the screen
+        screen_ready = True
+
+
+def drawGameState(screen, game_state, valid_moves, square_selected, animation=None):
     """
     Responsible for all the graphics within current game state.
+    Only squares whose piece or highlight changed since the last frame are redrawn, their rectangles are returned.
     """
-    drawBoard(screen)  # draw squares on the board
-    highlightSquares(screen, game_state, valid_moves, square_selected)
-    drawPieces(screen, game_state.board)  # draw pieces on top of those squares
-
-
-def drawBoard(screen):
-    """
-    Draw the squares on the board.
-    The top left square is always light.
-    """
-    global colors
-    colors = [p.Color("white"), p.Color("gray")]
+    highlights = getSquareHighlights(game_state, valid_moves, square_selected)
+    # while a move is animated its end square still shows the captured piece
+    animated_squares = {}
+    if animation is not None:
+        move = animation["move"]
+        if move.is_enpassant_move:
+            animated_squares[(move.end_row, move.end_col)] = "--"
+            animated_squares[(move.start_row, move.end_col)] = move.piece_captured
+        else:
+            animated_squares[(move.end_row, move.end_col)] = move.piece_captured
+    dirty_rects = []
     for row in range(DIMENSION):
         for column in range(DIMENSION):
-            color = colors[((row + column) % 2)]
-            p.draw.rect(screen, color, p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-
-
-def highlightSquares(screen, game_state, valid_moves, square_selected):
+            piece = animated_squares.get((row, column), game_state.board[row][column])
+            square = (piece, highlights.get((row, column), ()))
+            if drawn_squares.get((row, column)) != square:
+                rect = p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+                screen.blit(board_surface, rect, rect)  # draw square on the board
+                for color in square[1]:
+                    screen.blit(HIGHLIGHT_SURFACES[color], rect)
+                if square[0] != "--":  # draw piece on top of the square
+                    screen.blit(IMAGES[square[0]], rect)
+                drawn_squares[(row, column)] = square
+                dirty_rects.append(rect)
+    if animation is not None:
+        dirty_rects.append(drawAnimationFrame(screen, animation))
+    return dirty_rects
+
+
+def getSquareHighlights(game_state, valid_moves, square_selected):
     """
-    Highlight square selected and moves for piece selected.
+    Highlight colors of the squares, in drawing order: the last move, the square selected and moves for piece selected.
     """
+    highlights = {}
     if (len(game_state.move_log)) > 0:
         last_move = game_state.move_log[-1]
-        s = p.Surface((SQUARE_SIZE, SQUARE_SIZE))
-        s.set_alpha(100)
-        s.fill(p.Color('green'))
-        screen.blit(s, (last_move.end_col * SQUARE_SIZE, last_move.end_row * SQUARE_SIZE))
+        highlights[(last_move.end_row, last_move.end_col)] = ('green',)
     if square_selected != ():
         row, col = square_selected
         if game_state.board[row][col][0] == (
                 'w' if game_state.white_to_move else 'b'):  # square_selected is a piece that can be moved
-            # highlight selected square
-            s = p.Surface((SQUARE_SIZE, SQUARE_SIZE))
-            s.set_alpha(100)  # transparency value 0 -> transparent, 255 -> opaque
-            s.fill(p.Color('blue'))
-            screen.blit(s, (col * SQUARE_SIZE, row * SQUARE_SIZE))
-            # highlight moves from that square
-            s.fill(p.Color('yellow'))
+            highlights[(row, col)] = highlights.get((row, col), ()) + ('blue',)
             for move in valid_moves:
                 if move.start_row == row and move.start_col == col:
-                    screen.blit(s, (move.end_col * SQUARE_SIZE, move.end_row * SQUARE_SIZE))
-
-
-def drawPieces(screen, board):
-    """
-    Draw the pieces on the board using the current game_state.board
-    """
-    for row in range(DIMENSION):
-        for column in range(DIMENSION):
-            piece = board[row][column]
-            if piece != "--":
-                screen.blit(IMAGES[piece], p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+                    end_square = (move.end_row, move.end_col)
+                    highlights[end_square] = highlights.get(end_square, ()) + ('yellow',)
+    return highlights
 
 
 def drawMoveLog(screen, game_state, font):
     """
     Draws the move log.
-
+    The panel is only redrawn when the log changed, and every line is rendered once.
     """
+    global drawn_move_log
+    move_log = game_state.move_log
+    if drawn_move_log is not None and drawn_move_log[0] == len(move_log) and (
+            not move_log or drawn_move_log[1] is move_log[-1]):
+        return []
+    drawn_move_log = (len(move_log), move_log[-1] if move_log else None)
+
     move_log_rect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
     p.draw.rect(screen, p.Color('black'), move_log_rect)
-    move_log = game_state.move_log
     move_texts = []
     for i in range(0, len(move_log), 2):
         move_string = str(i // 2 + 1) + '. ' + str(move_log[i]) + " "
@@ -235,10 +307,16 @@ def drawMoveLog(screen, game_state, font):
             if i + j < len(move_texts):
                 text += move_texts[i + j]
 
-        text_object = font.render(text, True, p.Color('white'))
+        text_object = move_log_line_cache.get(text)
+        if text_object is None:
+            if len(move_log_line_cache) >= MOVE_LOG_LINE_CACHE_SIZE:
+                move_log_line_cache.clear()
+            text_object = font.render(text, True, p.Color('white'))
+            move_log_line_cache[text] = text_object
         text_location = move_log_rect.move(padding, text_y)
         screen.blit(text_object, text_location)
         text_y += text_object.get_height() + line_spacing
+    return [move_log_rect]
 
 
 def drawEndGameText(screen, text):
@@ -251,33 +329,29 @@ def drawEndGameText(screen, text):
     screen.blit(text_object, text_location.move(2, 2))
 
 
-def animateMove(move, screen, board, clock):
+def startAnimation(move):
+    """
+    Animation state of a move, the main loop draws one frame of it per iteration.
+    """
+    frame_count = (abs(move.end_row - move.start_row) + abs(move.end_col - move.start_col)) * FRAMES_PER_SQUARE
+    return {"move": move, "frame": 0, "frame_count": frame_count}
+
+
+def drawAnimationFrame(screen, animation):
     """
-    Animating a move
+    Draw the moving piece of the current animation frame and return its rectangle.
     """
-    global colors
-    d_row = move.end_row - move.start_row
-    d_col = move.end_col - move.start_col
-    frames_per_square = 10  # frames to move one square
-    frame_count = (abs(d_row) + abs(d_col)) * frames_per_square
-    for frame in range(frame_count + 1):
-        row, col = (move.start_row + d_row * frame / frame_count, move.start_col + d_col * frame / frame_count)
-        drawBoard(screen)
-        drawPieces(screen, board)
-        # erase the piece moved from its ending square
-        color = colors[(move.end_row + move.end_col) % 2]
-        end_square = p.Rect(move.end_col * SQUARE_SIZE, move.end_row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-        p.draw.rect(screen, color, end_square)
-        # draw captured piece onto rectangle
-        if move.piece_captured != '--':
-            if move.is_enpassant_move:
-                enpassant_row = move.end_row + 1 if move.piece_captured[0] == 'b' else move.end_row - 1
-                end_square = p.Rect(move.end_col * SQUARE_SIZE, enpassant_row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-            screen.blit(IMAGES[move.piece_captured], end_square)
-        # draw moving piece
-        screen.blit(IMAGES[move.piece_moved], p.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-        p.display.flip()
-        clock.tick(60)
+    move = animation["move"]
+    progress = animation["frame"] / animation["frame_count"]
+    row = move.start_row + (move.end_row - move.start_row) * progress
+    col = move.start_col + (move.end_col - move.start_col) * progress
+    piece_rect = p.Rect(int(col * SQUARE_SIZE), int(row * SQUARE_SIZE), SQUARE_SIZE, SQUARE_SIZE)
+    screen.blit(IMAGES[move.piece_moved], piece_rect)
+    # the squares under the piece have to be redrawn in the next frame
+    for square_row in range(int(row), min(int(row) + 2, DIMENSION)):
+        for square_col in range(int(col), min(int(col) + 2, DIMENSION)):
+            drawn_squares.pop((square_row, square_col), None)
+    return piece_rect
 
 
 if __name__ == "__main__":
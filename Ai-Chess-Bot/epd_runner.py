@@ -0,0 +1,156 @@
+"""
+Run the engine over EPD test suites.
+Every position is searched under a fixed time or depth in a pool of worker processes, and the runner reports
+how many best move (bm) and avoid move (am) tests were solved, the time to solution and the search speed.
+Plain FEN files work as well, their positions are searched and reported without a solution check.
+
+Example:
+    python epd_runner.py tactics.epd --time 5 --depth 6 --workers 4
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ChessEngine, ChessAI
+
+
+def parseEpdLine(line):
+    """
+    Split an EPD line into its FEN and its operations, e.g. {"bm": ["Qxf7+"], "id": ["WAC.001"]}.
+    Full FEN lines (with clocks) are accepted too.
+    """
+    fields = line.split(None, 4)
+    fen = " ".join(fields[:4])
+    rest = fields[4] if len(fields) > 4 else ""
+    clocks = rest.split(None, 2)
+    if len(clocks) >= 2 and clocks[0].isdigit() and clocks[1].isdigit():  # FEN clocks instead of operations
+        fen += " " + clocks[0] + " " + clocks[1]
+        rest = clocks[2] if len(clocks) > 2 else ""
+    operations = {}
+    for operation in rest.split(";"):
+        parts = operation.strip().split(None, 1)
+        if parts:
+            operands = parts[1].strip().strip('"') if len(parts) > 1 else ""
+            operations[parts[0]] = operands.split() if parts[0] in ("bm", "am") else [operands]
+    return fen, operations
+
+
+def loadPositions(path):
+    """
+    Read the positions of an EPD/FEN file as (FEN, position encoded with GameState.toBytes, operations),
+    lines with an invalid FEN are reported and skipped.
+    """
+    positions = []
+    with open(path) as epd_file:
+        for line_number, line in enumerate(epd_file, 1):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                fen, operations = parseEpdLine(line)
+                try:
+                    position = ChessEngine.GameState(fen).toBytes()
+                except ValueError as e:
+                    print("%s:%d skipped: %s" % (path, line_number, e))
+                    continue
+                positions.append((fen, position, operations))
+    return positions
+
+
+def normalizeSan(san):
+    """
+    Strip the annotations that EPD files write in different ways: check and mate signs, !? marks and "=".
+    """
+    return san.replace("0-0-0", "O-O-O").replace("0-0", "O-O").rstrip("+#!?").replace("=", "")
+
+
+def analysePosition(index, position, operations, depth, time_limit):
+    """
+    Search one position, encoded with GameState.toBytes, and check the result against its bm/am operations.
+    Runs inside a worker process.
+    """
+    game_state = ChessEngine.GameState.fromBytes(position)
+    valid_moves = game_state.getValidMoves()
+    san_by_move = {move.moveID: normalizeSan(game_state.getSanNotation(move, valid_moves)) for move in valid_moves}
+    best_moves = [normalizeSan(san) for san in operations.get("bm", [])]
+    avoid_moves = [normalizeSan(san) for san in operations.get("am", [])]
+
+    def isSolution(move):
+        if move is None or not (best_moves or avoid_moves):
+            return False
+        san = san_by_move[move.moveID]
+        return (not best_moves or san in best_moves) and san not in avoid_moves
+
+    start = time.time()
+    solved_at = [None]  # time when the search settled on a solution, reset when it changes its mind
+    reached_depth = [0]
+
+    def onIteration(iteration_depth, move):
+        reached_depth[0] = iteration_depth
+        if isSolution(move):
+            if solved_at[0] is None:
+                solved_at[0] = time.time() - start
+        else:
+            solved_at[0] = None
+
+    move = ChessAI.searchBestMove(game_state, valid_moves, depth, time_limit, on_iteration=onIteration)
+    elapsed = time.time() - start
+    return {"index": index, "id": operations.get("id", [str(index + 1)])[0],
+            "move": san_by_move[move.moveID] if move is not None else None,
+            "bm": best_moves, "am": avoid_moves, "solved": isSolution(move),
+            "time_to_solution": solved_at[0] if isSolution(move) else None, "depth": reached_depth[0],
+            "nodes": ChessAI.nodes_searched, "pawn_hash_hits": ChessAI.pawn_hash_hits,
+            "pawn_hash_probes": ChessAI.pawn_hash_probes, "seconds": elapsed}
+
+
+def hitRate(hits, probes):
+    return hits / probes if probes else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the positions of EPD/FEN files and score the results.")
+    parser.add_argument("files", nargs="+", help="EPD or FEN files, one position per line")
+    parser.add_argument("--depth", type=int, default=ChessAI.DEPTH, help="maximum search depth")
+    parser.add_argument("--time", type=float, help="time limit per position in seconds")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--json", help="write the per position results to this file")
+    args = parser.parse_args()
+
+    positions = []
+    for path in args.files:
+        positions.extend(loadPositions(path))
+
+    start = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(analysePosition, i, position, operations, args.depth, args.time)
+                   for i, (fen, position, operations) in enumerate(positions)]
+        for (fen, position, operations), future in zip(positions, futures):
+            result = future.result()
+            result["fen"] = fen
+            results.append(result)
+            status = "solved" if result["solved"] else ("-" if not (result["bm"] or result["am"]) else "failed")
+            print("%-12s %-8s %-7s depth %d, %d nodes, pawn hash hit rate %.1f%%, %.2fs" % (
+                result["id"], result["move"], status, result["depth"], result["nodes"],
+                hitRate(result["pawn_hash_hits"], result["pawn_hash_probes"]) * 100, result["seconds"]))
+    elapsed = time.time() - start
+
+    tests = [result for result in results if result["bm"] or result["am"]]
+    solved = [result for result in tests if result["solved"]]
+    nodes = sum(result["nodes"] for result in results)
+    search_seconds = sum(result["seconds"] for result in results)
+    print("solved %d of %d" % (len(solved), len(tests)))
+    if solved:
+        times = sorted(result["time_to_solution"] for result in solved)
+        print("time to solution: mean %.2fs, median %.2fs" % (sum(times) / len(times), times[len(times) // 2]))
+    print("%d nodes, %.0f nodes/sec per worker, %.1fs wall time" % (nodes, nodes / max(search_seconds, 1e-9),
+                                                                    elapsed))
+    print("pawn hash table hit rate: %.1f%%" % (hitRate(sum(result["pawn_hash_hits"] for result in results),
+                                                        sum(result["pawn_hash_probes"] for result in results)) * 100))
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Perft: count the leaf nodes of the move generation tree to a fixed depth.
+Checks the move generator (the counts must not change when it is optimized) and measures its speed.
+The engine always promotes to a queen, so positions with promotions count fewer nodes than other engines report.
+
+Example:
+    python perft.py --depth 3
+"""
+import argparse
+import time
+
+import ChessEngine
+
+POSITIONS = [
+    ChessEngine.STARTING_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",  # "Kiwipete", castling and pins
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",  # en passant and checks in an endgame
+]
+
+
+def perft(game_state, depth):
+    if depth == 0:
+        return 1
+    moves = game_state.getValidMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game_state.makeMove(move)
+        nodes += perft(game_state, depth - 1)
+        game_state.undoMove()
+    return nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count and time the move generation tree.")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fen", action="append", help="position to count, can be repeated (default: built-in set)")
+    parser.add_argument("--move-cache", action="store_true", help="use the legal move cache of getValidMoves")
+    args = parser.parse_args()
+    ChessEngine.USE_MOVE_CACHE = args.move_cache
+
+    total_nodes = 0
+    total_seconds = 0.0
+    for fen in args.fen or POSITIONS:
+        start = time.perf_counter()
+        nodes = perft(ChessEngine.GameState(fen), args.depth)
+        seconds = time.perf_counter() - start
+        total_nodes += nodes
+        total_seconds += seconds
+        print("%10d nodes %8.2fs %9.0f nodes/sec  %s" % (nodes, seconds, nodes / seconds, fen))
+    print("%10d nodes %8.2fs %9.0f nodes/sec  total" % (total_nodes, total_seconds, total_nodes / total_seconds))
+
+
+if __name__ == "__main__":
+    main()
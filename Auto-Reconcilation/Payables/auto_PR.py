@@ -1,10 +1,12 @@
 import pandas as pd
-from fuzzywuzzy import fuzz
 import matplotlib.pyplot as plt
 import os
+import sys
 
 # Set up the path to the script's directory (e.g., Payables folder)
 script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(script_dir))
+from matching import match_invoices
 
 # Input file paths (in same folder as script)
 vendor_path = os.path.join(script_dir, 'vendor_invoices.csv')
@@ -14,51 +16,9 @@ payments_path = os.path.join(script_dir, 'outgoing_payments.csv')
 vendor_invoices = pd.read_csv(vendor_path)
 outgoing_payments = pd.read_csv(payments_path)
 
-# Result containers
-matched = []
-unmatched = []
-
-# Match each vendor invoice with appropriate outgoing payments
-for _, invoice in vendor_invoices.iterrows():
-    remaining_amount = invoice['Amount']
-    invoice_matches = []
-
-    for _, payment in outgoing_payments.iterrows():
-        desc_score = fuzz.token_set_ratio(invoice['Description'], payment['Description'])
-        name_score = fuzz.token_set_ratio(invoice['VendorName'], payment['PaidTo'])
-        combined_score = (0.6 * desc_score) + (0.4 * name_score)
-
-        if (
-            combined_score > 60 and
-            payment['Amount'] <= remaining_amount and
-            payment['PaymentID'] not in [m['MatchedWithPaymentID'] for m in matched]
-        ):
-            invoice_matches.append({
-                'InvoiceNo': invoice['InvoiceNo'],
-                'MatchedWithPaymentID': payment['PaymentID'],
-                'VendorName': invoice['VendorName'],
-                'MatchedAmount': payment['Amount'],
-                'MatchScore': round(combined_score, 3)
-            })
-            remaining_amount -= payment['Amount']
-
-            if remaining_amount == 0:
-                break
-
-    if invoice_matches:
-        matched.extend(invoice_matches)
-        if remaining_amount > 0:
-            unmatched.append({
-                'InvoiceNo': invoice['InvoiceNo'],
-                'VendorName': invoice['VendorName'],
-                'RemainingAmount': remaining_amount
-            })
-    else:
-        unmatched.append({
-            'InvoiceNo': invoice['InvoiceNo'],
-            'VendorName': invoice['VendorName'],
-            'RemainingAmount': invoice['Amount']
-        })
+# Match each vendor invoice with appropriate outgoing payments, scoring only the payments that could still cover it
+# (see matching.py)
+matched, unmatched = match_invoices(vendor_invoices, outgoing_payments, 'VendorName', 'PaidTo', score_digits=3)
 
 # Convert matches and unmatched results to DataFrames
 matched_df = pd.DataFrame(matched)
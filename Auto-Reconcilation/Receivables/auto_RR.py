@@ -1,62 +1,17 @@
 import pandas as pd
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
 import matplotlib.pyplot as plt
+import os
+import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from matching import match_invoices
 
 # Load CSVs
 invoices = pd.read_csv('invoices.csv')
 payments = pd.read_csv('payments.csv')
 
-# Result lists
-matched = []
-unmatched = []
-
-# Match each invoice
-for _, invoice in invoices.iterrows():
-    remaining_amount = invoice['Amount']
-    invoice_matches = []
-    
-    for _, payment in payments.iterrows():
-        desc_score = fuzz.token_set_ratio(invoice['Description'], payment['Description'])
-        name_score = fuzz.token_set_ratio(invoice['ClientName'], payment['Payer'])
-
-        # Weighted average (you can tweak the weights)
-        combined_score = (0.6 * desc_score) + (0.4 * name_score)
-
-
-        
-        if (
-            combined_score > 60 and
-            payment['Amount'] <= remaining_amount and
-            payment['PaymentID'] not in [m['MatchedWithPaymentID'] for m in matched]
-        ):
-            invoice_matches.append({
-                'InvoiceNo': invoice['InvoiceNo'],
-                'MatchedWithPaymentID': payment['PaymentID'],
-                'ClientName': invoice['ClientName'],
-                'MatchedAmount': payment['Amount'],
-                'MatchScore': combined_score
-            })
-            remaining_amount -= payment['Amount']
-
-            if remaining_amount == 0:
-                break
-
-    if invoice_matches:
-        matched.extend(invoice_matches)
-        if remaining_amount > 0:
-            unmatched.append({
-                'InvoiceNo': invoice['InvoiceNo'],
-                'ClientName': invoice['ClientName'],
-                'RemainingAmount': remaining_amount
-            })
-    else:
-        unmatched.append({
-            'InvoiceNo': invoice['InvoiceNo'],
-            'ClientName': invoice['ClientName'],
-            'RemainingAmount': invoice['Amount']
-        })
+# Match each invoice, scoring only the payments that could still cover it
+matched, unmatched = match_invoices(invoices, payments, 'ClientName', 'Payer')
 
 # Convert to DataFrames
 matched_df = pd.DataFrame(matched)
@@ -0,0 +1,157 @@
+# Benchmark of invoice <-> payment matching against the scripts' exhaustive loop, on synthetic month-end files:
+# vendors with a few recurring descriptions, payments with abbreviated or misspelled names, shortened descriptions,
+# reference numbers and split payments, plus payments of no invoice.
+# Scoring every pair takes long at these sizes, so the first --sample invoices are scored against every payment (with
+# the same ScoringEngine) and the exhaustive time is extrapolated from that. As invoices are matched in order,
+# replaying the loop's rules on those scores gives exactly what a full exhaustive run matches for them. Reported:
+#   agreement    share of the exhaustive run's matches on the sample that match_invoices makes too (should be 100%),
+#                and whether it makes no other
+#   true         share of the generated invoice/payment pairs matched on the sample
+#
+#   python bench_matching.py --rows 1000,10000 --sample 20
+import json, time, random, argparse
+import numpy as np
+import pandas as pd
+
+from matching import ScoringEngine, match_invoices
+
+SYLLABLES = ['al', 'be', 'ta', 'gam', 'ma', 'del', 'ko', 'ri', 'an', 'tor', 'vin', 'sa', 'lu', 'mer', 'no', 'pex',
+             'dra', 'qui', 'zen', 'ol', 'fi', 'stra', 'mon', 'ca', 'ro', 'te', 'nix', 'vo', 'len', 'har']
+SUFFIXES = ['Ltd', 'Inc', 'Corp', 'LLC', 'GmbH', 'Solutions', 'Group', 'Partners', 'Services', '']
+WORDS = ['cloud', 'software', 'license', 'renewal', 'maintenance', 'equipment', 'consulting', 'design', 'development',
+         'support', 'hosting', 'training', 'audit', 'logistics', 'freight', 'catering', 'cleaning', 'security',
+         'marketing', 'legal', 'insurance', 'rent', 'utilities', 'printing', 'repairs', 'subscription', 'web', 'mobile',
+         'app', 'project', 'annual', 'monthly', 'quarterly', 'hardware', 'network', 'data', 'backup', 'office',
+         'supplies', 'courier', 'recruitment', 'translation', 'storage', 'fleet', 'fuel', 'telecom', 'payroll',
+         'advisory', 'analytics', 'installation']
+
+
+def make_name(rng):
+    words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+             for _ in range(rng.randint(1, 2))]
+    return ' '.join(words + [rng.choice(SUFFIXES)]).strip()
+
+
+def vary_name(rng, name):
+    """the name as a bank statement shows it: as is, abbreviated ("Alpha L."), without its suffix or misspelled"""
+    words, kind = name.split(), rng.random()
+    if kind < 0.2 and len(words) > 1:
+        return ' '.join(words[:-1] + [words[-1][0] + '.'])
+    if kind < 0.35 and len(words) > 1:
+        return ' '.join(words[:-1])
+    if kind < 0.5:
+        i = rng.randrange(len(words))
+        j = rng.randrange(1, len(words[i])) if len(words[i]) > 1 else 0
+        words[i] = words[i][:j] + rng.choice('aeiou') + words[i][j + 1:]
+        return ' '.join(words)
+    return name
+
+
+def vary_description(rng, description):
+    """shortened, with "payment" or a reference appended, or as is"""
+    words, kind = description.split(), rng.random()
+    if kind < 0.25:
+        i = rng.randrange(len(words))
+        words[i] = words[i][:3]
+    elif kind < 0.4 and len(words) > 2:
+        del words[rng.randrange(len(words))]
+    if rng.random() < 0.4:
+        words.append('payment')
+    if rng.random() < 0.3:
+        words += ['ref', str(rng.randint(10000, 99999))]
+    return ' '.join(words)
+
+
+def make_files(rows, seed=0):
+    """invoices and payments DataFrames of about rows rows, and the (InvoiceNo, PaymentID) pairs that belong together"""
+    rng = random.Random(seed)
+    vendors = [make_name(rng) for _ in range(max(rows // 10, 1))]
+    vendor_descriptions = [[' '.join(rng.sample(WORDS, rng.randint(2, 4))).capitalize() for _ in range(3)]
+                           for _ in vendors]
+    invoices, payments = [], []
+    for i in range(rows):
+        v = rng.randrange(len(vendors))
+        description = rng.choice(vendor_descriptions[v])
+        amount = round(rng.lognormvariate(7.5, 1.2), 2)
+        invoices.append({'InvoiceNo': f'VINV{i:06d}', 'VendorName': vendors[v], 'Amount': amount,
+                         'Description': description})
+        kind = rng.random()
+        parts = [] if kind < 0.1 else [amount] if kind < 0.8 else [round(amount * 0.4, 2), round(amount * 0.6, 2)]
+        for part in parts:
+            payments.append({'InvoiceNo': f'VINV{i:06d}', 'PaidTo': vary_name(rng, vendors[v]), 'Amount': part,
+                             'Description': vary_description(rng, description)})
+    for _ in range(rows // 10):  # payments of no invoice in the file
+        v = rng.randrange(len(vendors))
+        payments.append({'InvoiceNo': None, 'PaidTo': vary_name(rng, vendors[v]),
+                         'Amount': round(rng.lognormvariate(7.5, 1.2), 2),
+                         'Description': vary_description(rng, rng.choice(vendor_descriptions[v]))})
+    rng.shuffle(payments)
+    for i, payment in enumerate(payments):
+        payment['PaymentID'] = f'POUT{i:06d}'
+    truth = {(p['InvoiceNo'], p['PaymentID']) for p in payments if p['InvoiceNo']}
+    return pd.DataFrame(invoices), pd.DataFrame(payments)[['PaymentID', 'PaidTo', 'Amount', 'Description']], truth
+
+
+def eligible_scores(engine, row, amounts, amount):
+    """scores of the payments the exhaustive loop could match with invoice row, by position"""
+    scores = engine.score_matrix(np.array([row]), np.arange(len(amounts)))[0]
+    eligible = np.flatnonzero((scores > 60) & (amounts <= amount))
+    return dict(zip(eligible.tolist(), scores[eligible].tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed and agreement of match_invoices against exhaustive matching")
+    parser.add_argument('--rows', default='1000,10000', help='comma separated invoice counts')
+    parser.add_argument('--sample', type=int, default=20, help='invoices scored against every payment')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'rows':>7} {'payments':>8} {'matching s':>10} {'exhaustive s':>13} {'speedup':>8} {'agreement':>9} "
+          f"{'same':>5} {'true':>6}")
+    for rows in map(int, args.rows.split(',')):
+        invoices, payments, truth = make_files(rows)
+        start = time.perf_counter()
+        matched, _ = match_invoices(invoices, payments, 'VendorName', 'PaidTo')
+        matching_seconds = time.perf_counter() - start
+
+        records = payments.to_dict('records')
+        amounts = payments['Amount'].to_numpy(dtype=float)
+        sample = invoices.iloc[:args.sample].to_dict('records')
+        exhaustive, used = set(), set()
+        start = time.perf_counter()
+        engine = ScoringEngine(invoices['VendorName'], invoices['Description'], payments['PaidTo'],
+                               payments['Description'])
+        engine_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for row, invoice in enumerate(sample):
+            scores = eligible_scores(engine, row, amounts, invoice['Amount'])
+            remaining_amount = invoice['Amount']
+            for i in sorted(scores):  # the match rules, in file order
+                if records[i]['Amount'] <= remaining_amount and records[i]['PaymentID'] not in used:
+                    exhaustive.add((invoice['InvoiceNo'], records[i]['PaymentID']))
+                    remaining_amount -= records[i]['Amount']
+                    if remaining_amount == 0:
+                        break
+            used.update(payment for number, payment in exhaustive if number == invoice['InvoiceNo'])
+        exhaustive_seconds = engine_seconds + (time.perf_counter() - start) * len(invoices) / len(sample)
+        numbers = {invoice['InvoiceNo'] for invoice in sample}
+        found = {(m['InvoiceNo'], m['MatchedWithPaymentID']) for m in matched if m['InvoiceNo'] in numbers}
+        sample_truth = {pair for pair in truth if pair[0] in numbers}
+
+        result = {'rows': rows, 'payments': len(payments), 'matching_seconds': matching_seconds,
+                  'exhaustive_seconds': exhaustive_seconds, 'speedup': exhaustive_seconds / matching_seconds,
+                  'sample': len(sample), 'exhaustive_matches': len(exhaustive),
+                  'agreement': len(exhaustive & found) / max(len(exhaustive), 1), 'same': found == exhaustive,
+                  'true': len(found & sample_truth) / len(sample_truth)}
+        results.append(result)
+        print(f"{rows:7d} {len(payments):8d} {matching_seconds:10.1f} {exhaustive_seconds:13.0f} "
+              f"{result['speedup']:7.1f}x {result['agreement']:9.1%} {str(found == exhaustive):>5} "
+              f"{result['true']:6.1%}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# Microbenchmark of pair scoring: a fuzz.token_set_ratio call per name and description, as the matching loop did,
+# against ScoringEngine (each distinct string tokenized once, each distinct pair of a batch scored once in a batched
+# rapidfuzz call), on the pairs match_invoices scores first for each invoice (the first CHUNK payments not above its
+# amount) in the synthetic files of bench_matching.py, plus how many of the timed pairs get a different combined
+# score from the two (there should be none).
+#
+#   python bench_scoring.py --rows 10000,100000 --invoices 2000
+import json, time, argparse
+import numpy as np
+from rapidfuzz import fuzz
+
+from bench_matching import make_files
+from matching import CHUNK, ScoringEngine, full_process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-pair token_set_ratio calls vs the batched scoring engine")
+    parser.add_argument('--rows', default='10000,100000', help='comma separated invoice counts')
+    parser.add_argument('--invoices', type=int, default=2000, help='invoices whose pairs are scored')
+    parser.add_argument('--pairs', type=int, default=20000, help='pairs timed with the per-pair loop')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'rows':>7} {'pairs':>8} {'distinct pairs':>14} {'engine build s':>14} {'per-pair/s':>11} "
+          f"{'engine/s':>10} {'speedup':>8} {'mismatches':>10}")
+    for rows in map(int, args.rows.split(',')):
+        invoices, payments, _ = make_files(rows)
+        first = payments['Amount'].to_numpy(dtype=float)[:CHUNK]
+        candidates = [np.flatnonzero(first <= amount) for amount in invoices['Amount'].iloc[:args.invoices]]
+        invoice_rows = np.repeat(np.arange(len(candidates)), [len(c) for c in candidates])
+        payment_rows = np.concatenate(candidates)
+
+        start = time.perf_counter()
+        engine = ScoringEngine(invoices['VendorName'], invoices['Description'], payments['PaidTo'],
+                               payments['Description'])
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        scores = []
+        for row, positions in enumerate(candidates):  # a call per invoice, as match_invoices makes
+            scores.append(engine.score_pairs(np.full(len(positions), row), positions))
+        scores = np.concatenate(scores)
+        engine_rate = len(scores) / (time.perf_counter() - start)
+        distinct = len({(engine.description_codes[i], engine.payment_description_codes[j],
+                         engine.name_codes[i], engine.payment_name_codes[j])
+                        for i, j in zip(invoice_rows.tolist(), payment_rows.tolist())})
+
+        timed = np.linspace(0, len(scores) - 1, min(args.pairs, len(scores))).astype(int)
+        names, descriptions = invoices['VendorName'].tolist(), invoices['Description'].tolist()
+        payers, payment_descriptions = payments['PaidTo'].tolist(), payments['Description'].tolist()
+        start = time.perf_counter()
+        loop_scores = []
+        for k in timed:
+            i, j = invoice_rows[k], payment_rows[k]
+            desc_score = round(fuzz.token_set_ratio(descriptions[i], payment_descriptions[j], processor=full_process))
+            name_score = round(fuzz.token_set_ratio(names[i], payers[j], processor=full_process))
+            loop_scores.append((0.6 * desc_score) + (0.4 * name_score))
+        loop_rate = len(timed) / (time.perf_counter() - start)
+        mismatches = int(np.sum(np.array(loop_scores) != scores[timed]))
+
+        result = {'rows': rows, 'pairs': len(scores), 'distinct_pairs': distinct, 'build_seconds': build_seconds,
+                  'per_pair_rate': loop_rate, 'engine_rate': engine_rate, 'speedup': engine_rate / loop_rate,
+                  'mismatches': mismatches}
+        results.append(result)
+        print(f"{rows:7d} {len(scores):8d} {distinct:14d} {build_seconds:14.2f} {loop_rate:11.0f} "
+              f"{engine_rate:10.0f} {result['speedup']:7.0f}x {mismatches:10d}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
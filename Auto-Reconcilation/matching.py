@@ -0,0 +1,142 @@
+# Invoice <-> payment matching shared by Payables/auto_PR.py and Receivables/auto_RR.py.
+# The scripts' loop scored every invoice against every payment, O(invoices x payments) fuzzy comparisons. A payment
+# only matches an invoice if its amount is not above the invoice's remaining amount and its PaymentID is not used yet,
+# whatever its score, so each invoice scores just those payments, in file order and CHUNK at a time, and stops once
+# its amount is covered: the matches are exactly the loop's. On month-end files the remaining amount drops quickly
+# (the > 60 rule accepts about 1% of all pairs), so only a few percent of the pairs get scored. A token index over
+# names and descriptions (tried before) cannot give the same matches: most pairs the > 60 rule accepts share no token.
+#
+# Scores come from a ScoringEngine rather than a fuzz.token_set_ratio call per pair: every distinct name and
+# description is normalized and tokenized once (token_set_ratio only looks at the set of normalized tokens, so it is
+# kept as its sorted tokens), each distinct pair of strings in a chunk of payments is scored once, in one batched
+# rapidfuzz call, and the match rules run on the resulting arrays. Strings are processed exactly as the scripts'
+# fuzzywuzzy calls did (full_process with force_ascii: a missing cell is the text "nan", the characters 128-255 are
+# dropped, "_" is kept), and rapidfuzz's token_set_ratio, rounded to an integer, is the ratio fuzzywuzzy computes with
+# python-Levenshtein. rapidfuzz is a requirement (requirements.txt), there is no fallback scorer.
+import re
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+CHUNK = 2048  # payments filtered and scored at a time for an invoice
+NON_ASCII = dict.fromkeys(range(128, 256))  # the characters fuzzywuzzy's force_ascii drops
+NON_WORD = re.compile(r'(?ui)\W')
+
+
+def full_process(value):
+    """fuzzywuzzy's full_process(value, force_ascii=True): value as text, non-word characters as spaces, lower case"""
+    return NON_WORD.sub(' ', str(value).translate(NON_ASCII)).lower().strip()
+
+
+def tokens(value):
+    """the normalized tokens of a cell, as fuzz.token_set_ratio splits it"""
+    return full_process(value).split()
+
+
+def encode(values):
+    """(code per value, distinct token sets as sorted-token strings); each distinct value is tokenized once"""
+    # NaN is scored as "nan", like fuzzywuzzy does; None scores 0 there, as no tokens do
+    values = pd.Series(['' if value is None else value for value in values], dtype=object)
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    token_sets = np.array([' '.join(sorted(set(tokens(value)))) for value in uniques], dtype=object)
+    token_codes, distinct = pd.factorize(token_sets)  # "Alpha Ltd" and "ALPHA, LTD" are one string
+    return token_codes[codes], np.asarray(distinct, dtype=object)
+
+
+def token_set_ratios(left, right, matrix=False):
+    """
+    fuzz.token_set_ratio of left[k] and right[k] (of every left and right string with matrix=True), for strings that
+    are already sorted token sets; rounded to integers
+    """
+    batched = process.cdist if matrix else process.cpdist
+    return np.rint(batched(left, right, scorer=fuzz.token_set_ratio, processor=None, dtype=np.float64, workers=-1))
+
+
+class ScoringEngine:
+    def __init__(self, names, descriptions, payment_names, payment_descriptions):
+        """for invoices with names and descriptions against payments with payment_names and payment_descriptions"""
+        self.name_codes, self.names = encode(names)
+        self.description_codes, self.descriptions = encode(descriptions)
+        self.payment_name_codes, self.payment_names = encode(payment_names)
+        self.payment_description_codes, self.payment_descriptions = encode(payment_descriptions)
+
+    @staticmethod
+    def _pair_scores(left, right, left_codes, right_codes):
+        """token_set_ratio of left[left_codes[k]] and right[right_codes[k]], each distinct pair scored once"""
+        pairs, inverse = np.unique(left_codes.astype(np.int64) * len(right) + right_codes, return_inverse=True)
+        return token_set_ratios(left[pairs // len(right)], right[pairs % len(right)])[inverse.ravel()]
+
+    @staticmethod
+    def _matrix_scores(left, right, left_codes, right_codes):
+        """token_set_ratio of every left[left_codes[i]] and right[right_codes[j]], each distinct pair scored once"""
+        rows, row_inverse = np.unique(left_codes, return_inverse=True)
+        columns, column_inverse = np.unique(right_codes, return_inverse=True)
+        return token_set_ratios(left[rows], right[columns], matrix=True)[row_inverse.ravel()][:, column_inverse.ravel()]
+
+    def score_pairs(self, invoices, payments):
+        """combined score (0.6 description + 0.4 name) of invoice row invoices[k] and payment row payments[k]"""
+        desc_scores = self._pair_scores(self.descriptions, self.payment_descriptions,
+                                        self.description_codes[invoices], self.payment_description_codes[payments])
+        name_scores = self._pair_scores(self.names, self.payment_names, self.name_codes[invoices],
+                                        self.payment_name_codes[payments])
+        return (0.6 * desc_scores) + (0.4 * name_scores)  # weighted average (you can tweak the weights)
+
+    def score_matrix(self, invoices, payments):
+        """(len(invoices), len(payments)) matrix of the combined scores of invoice rows and payment rows"""
+        desc_scores = self._matrix_scores(self.descriptions, self.payment_descriptions,
+                                          self.description_codes[invoices], self.payment_description_codes[payments])
+        name_scores = self._matrix_scores(self.names, self.payment_names, self.name_codes[invoices],
+                                          self.payment_name_codes[payments])
+        return (0.6 * desc_scores) + (0.4 * name_scores)
+
+
+def match_invoices(invoices, payments, name_column, payer_column, score_digits=None):
+    """
+    Match each invoice, in order, with the payments whose combined description/name score is above 60 until its
+    amount is covered; a payment is used once. Returns the matched and unmatched rows of the scripts' output.
+    """
+    engine = ScoringEngine(invoices[name_column], invoices['Description'], payments[payer_column],
+                           payments['Description'])
+    payment_ids = payments['PaymentID'].tolist()
+    amounts = payments['Amount'].tolist()  # the original values for the output and the remaining amounts
+    amount_array = np.asarray(amounts, dtype=float)
+    id_codes, distinct_ids = pd.factorize(payments['PaymentID'])
+    used = np.zeros(len(distinct_ids) + 1, dtype=bool)  # by PaymentID, like the scripts (missing ids: -1)
+    matched, unmatched = [], []
+    for r, invoice in enumerate(invoices.to_dict('records')):
+        remaining_amount = invoice['Amount']
+        invoice_matches, taken = [], []
+        for start in range(0, len(payments), CHUNK):
+            if remaining_amount == 0:
+                break
+            chunk = np.arange(start, min(start + CHUNK, len(payments)))
+            positions = chunk[(amount_array[chunk] <= remaining_amount) & ~used[id_codes[chunk]]]
+            if len(positions) == 0:
+                continue
+            scores = engine.score_pairs(np.full(len(positions), r), positions)
+            for j in np.flatnonzero(scores > 60):  # in file order: take each payment that still fits
+                i = positions[j]
+                if amounts[i] <= remaining_amount:
+                    combined_score = float(scores[j])
+                    invoice_matches.append({
+                        'InvoiceNo': invoice['InvoiceNo'],
+                        'MatchedWithPaymentID': payment_ids[i],
+                        name_column: invoice[name_column],
+                        'MatchedAmount': amounts[i],
+                        'MatchScore': combined_score if score_digits is None else round(combined_score, score_digits)
+                    })
+                    remaining_amount -= amounts[i]
+                    taken.append(id_codes[i])
+
+                    if remaining_amount == 0:
+                        break
+
+        matched.extend(invoice_matches)
+        used[taken] = True
+        if not invoice_matches or remaining_amount > 0:
+            unmatched.append({
+                'InvoiceNo': invoice['InvoiceNo'],
+                name_column: invoice[name_column],
+                'RemainingAmount': remaining_amount
+            })
+    return matched, unmatched
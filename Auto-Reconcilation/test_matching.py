@@ -0,0 +1,121 @@
+# Tests of matching.py: ScoringEngine against fuzzywuzzy's processing and token_set_ratio, match_invoices against the
+# scripts' exhaustive loop.
+#
+#   python -m pytest test_matching.py
+import os
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from fuzzywuzzy import fuzz as fuzzywuzzy_fuzz, utils as fuzzywuzzy_utils
+from rapidfuzz import fuzz
+
+from bench_matching import make_files
+import matching
+from matching import ScoringEngine, full_process, match_invoices
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+# pairs of cells whose scores depend on how missing and non-ASCII text is processed; close enough that fuzzywuzzy's
+# difflib fallback (without python-Levenshtein) finds the exact ratio too
+PAIRS = [('Müller GmbH', 'Muller GmbH'), ('Müller GmbH', 'Mller GmbH'), ('Łódź Logistics', 'Lodz Logistics'),
+         ('Café du Nord', 'Cafe du Nord'), ('São Paulo Imports', 'Sao Paulo Imports'), ('Straße Bau', 'Strasse Bau'),
+         ('naïve_design Ltd', 'naive design ltd'), ('東京 Trading', 'Tokyo Trading'), ('Ærø Shipping', 'Aero Shipping'),
+         (np.nan, np.nan), (np.nan, 'nan'), (np.nan, 'Nan Corp'), (np.nan, 'NaN'), (np.nan, ''), (None, 'Alpha'),
+         ('', ''), ('  ', 'x'), ('Alpha Ltd', 'ALPHA, LTD.')]
+
+
+def token_set_ratio(a, b):
+    """fuzzywuzzy's token_set_ratio of two cells, with the exact ratio fuzzywuzzy computes with python-Levenshtein"""
+    if a is None or b is None:
+        return 0
+    return round(fuzz.token_set_ratio(str(a), str(b),
+                                      processor=lambda text: fuzzywuzzy_utils.full_process(text, force_ascii=True)))
+
+
+def test_full_process_matches_fuzzywuzzy():
+    values = [cell for pair in PAIRS for cell in pair if cell is not None] + [12.5, 7, 'a_b-c', 'İstanbul', 'x\ty']
+    for value in values:
+        assert full_process(value) == fuzzywuzzy_utils.full_process(value, force_ascii=True)
+
+
+def test_scores_match_fuzzywuzzy_on_missing_and_accented_cells():
+    names, payers = [a for a, _ in PAIRS], [b for _, b in PAIRS]
+    descriptions, payment_descriptions = names[::-1], payers[::-1]
+    engine = ScoringEngine(names, descriptions, payers, payment_descriptions)
+    expected = [0.6 * fuzzywuzzy_fuzz.token_set_ratio(d, e) + 0.4 * fuzzywuzzy_fuzz.token_set_ratio(a, b)
+                for a, b, d, e in zip(names, payers, descriptions, payment_descriptions)]
+    assert engine.score_pairs(np.arange(len(PAIRS)), np.arange(len(PAIRS))).tolist() == expected
+
+
+def test_score_pairs_matches_token_set_ratio():
+    invoices, payments, _ = make_files(200)
+    edge_cases = [('Alpha Ltd', 'ALPHA, LTD.'), ('Web design', 'design web web'), ('', 'Beta Inc'), (None, 'Beta'),
+                  ('Müller GmbH', 'Muller GmbH'), ('Renewal #4512', 'renewal-4512'), ('  ', 'x'), ('a b c', 'c'),
+                  (np.nan, 'nan'), (np.nan, np.nan), ('web_design', 'web design')]
+    invoices = pd.concat([invoices, pd.DataFrame({'VendorName': [b for _, b in edge_cases],
+                                                  'Description': [a for a, _ in edge_cases]})], ignore_index=True)
+    payments = pd.concat([payments, pd.DataFrame({'PaidTo': [a for a, _ in edge_cases],
+                                                  'Description': [b for _, b in edge_cases]})], ignore_index=True)
+    rng = random.Random(0)
+    pairs = [(rng.randrange(len(invoices)), rng.randrange(len(payments))) for _ in range(2000)]
+    first_invoice, first_payment = len(invoices) - len(edge_cases), len(payments) - len(edge_cases)
+    pairs += [(first_invoice + k, first_payment + k) for k in range(len(edge_cases))]  # each edge case with itself
+    rows, positions = (np.array(column) for column in zip(*pairs))
+
+    engine = ScoringEngine(invoices['VendorName'], invoices['Description'], payments['PaidTo'], payments['Description'])
+    expected = [0.6 * token_set_ratio(invoices['Description'][i], payments['Description'][j])
+                + 0.4 * token_set_ratio(invoices['VendorName'][i], payments['PaidTo'][j]) for i, j in pairs]
+    assert engine.score_pairs(rows, positions).tolist() == expected
+    assert engine.score_matrix(rows[:50], positions[:50]).tolist() == [
+        [0.6 * token_set_ratio(invoices['Description'][i], payments['Description'][j])
+         + 0.4 * token_set_ratio(invoices['VendorName'][i], payments['PaidTo'][j]) for j in positions[:50]]
+        for i in rows[:50]]
+
+
+def exhaustive_match(invoices, payments, name_column, payer_column):
+    """the scripts' loop: every invoice scored against every payment"""
+    engine = ScoringEngine(invoices[name_column], invoices['Description'], payments[payer_column],
+                           payments['Description'])
+    scores = engine.score_matrix(np.arange(len(invoices)), np.arange(len(payments)))
+    records = payments.to_dict('records')
+    matched, unmatched, used = [], [], set()  # used: the PaymentIDs of the earlier invoices' matches
+    for invoice, row_scores in zip(invoices.to_dict('records'), scores):
+        remaining_amount = invoice['Amount']
+        invoice_matches = []
+        for payment, combined_score in zip(records, row_scores.tolist()):
+            if (combined_score > 60 and payment['Amount'] <= remaining_amount
+                    and payment['PaymentID'] not in used):
+                invoice_matches.append({'InvoiceNo': invoice['InvoiceNo'], 'MatchedWithPaymentID': payment['PaymentID'],
+                                        name_column: invoice[name_column], 'MatchedAmount': payment['Amount'],
+                                        'MatchScore': combined_score})
+                remaining_amount -= payment['Amount']
+                if remaining_amount == 0:
+                    break
+        matched.extend(invoice_matches)
+        used.update(m['MatchedWithPaymentID'] for m in invoice_matches)
+        if not invoice_matches or remaining_amount > 0:
+            unmatched.append({'InvoiceNo': invoice['InvoiceNo'], name_column: invoice[name_column],
+                              'RemainingAmount': remaining_amount})
+    return matched, unmatched
+
+
+@pytest.mark.parametrize('folder, invoice_file, payment_file, name_column, payer_column', [
+    ('Payables', 'vendor_invoices.csv', 'outgoing_payments.csv', 'VendorName', 'PaidTo'),
+    ('Receivables', 'invoices.csv', 'payments.csv', 'ClientName', 'Payer'),
+])
+def test_match_invoices_matches_exhaustive_on_shipped_files(folder, invoice_file, payment_file, name_column,
+                                                             payer_column):
+    invoices = pd.read_csv(os.path.join(here, folder, invoice_file))
+    payments = pd.read_csv(os.path.join(here, folder, payment_file))
+    assert (match_invoices(invoices, payments, name_column, payer_column)
+            == exhaustive_match(invoices, payments, name_column, payer_column))
+
+
+@pytest.mark.parametrize('chunk', [matching.CHUNK, 100])
+def test_match_invoices_matches_exhaustive_on_bench_data(monkeypatch, chunk):
+    monkeypatch.setattr(matching, 'CHUNK', chunk)  # 100: the payments are filtered and scored in 12 chunks
+    invoices, payments, _ = make_files(1000)
+    assert (match_invoices(invoices, payments, 'VendorName', 'PaidTo')
+            == exhaustive_match(invoices, payments, 'VendorName', 'PaidTo'))
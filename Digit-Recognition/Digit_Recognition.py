@@ -10,36 +10,70 @@ import base64
 from io import BytesIO
 from PIL import Image
 import json
+import os
+# helper modules from this folder; a notebook run without them falls back to the original inline code
+try:
+    import model_cache
+except ImportError:  # no model cache: train on every start
+    model_cache = None
+try:
+    import streaming_dataset
+except ImportError:  # train from in-memory arrays
+    streaming_dataset = None
+try:
+    from compiled_predict import CompiledPredictor
+except ImportError:  # plain model.predict
+    class CompiledPredictor:
+        def __init__(self, model):
+            self.model = model
+
+        def predict(self, x):
+            return self.model.predict(x, verbose=0)
+try:
+    from prediction_cache import PredictionCache
+except ImportError:  # every submission runs the model
+    class PredictionCache:
+        def get_or_predict(self, submission, preprocess, predict):
+            return predict(preprocess(submission))
+try:
+    from stage_timing import StageTimer
+except ImportError:  # nothing is timed
+    from contextlib import nullcontext
+
+    class StageTimer:
+        def stage(self, name):
+            return nullcontext()
+
+        def stats(self):
+            return {}
+
+# everything besides the architecture that determines the trained weights, part of the model cache key
+TRAINING_CONFIG = {
+    'optimizer': 'adam',
+    'loss': 'sparse_categorical_crossentropy',
+    'epochs': 3,
+    'batch_size': 128,
+    'validation_split': 0.1
+}
+
+# pre-trained models that are used when the cache is empty and their architecture matches
+SHIPPED_MODEL_PATHS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'digit_model.h5') if '__file__' in globals() else None,
+    '/content/digit_model.h5'
+]
 
 class ColabDigitRecognizer:
     def __init__(self):
         """Initialize the digit recognizer"""
         self.model = None
         self.load_or_create_model()
+        self.predictor = CompiledPredictor(self.model)  # traced + warmed up, used instead of model.predict
+        self.cache = PredictionCache()  # repeated Predict clicks on the same drawing skip inference
+        self.timings = StageTimer()  # per-stage latency histograms if DIGIT_STAGE_TIMING=1, see timings.stats()
         
-    def load_or_create_model(self):
-        """Load or create a digit recognition model"""
-        print("🚀 Setting up digit recognition model...")
-        
-        # Load MNIST dataset
-        print("📚 Loading MNIST dataset...")
-        (x_train, y_train), (x_test, y_test) = keras.datasets.mnist.load_data()
-        
-        # Normalize the data
-        x_train = x_train.astype('float32') / 255.0
-        x_test = x_test.astype('float32') / 255.0
-        
-        # Reshape data
-        x_train = x_train.reshape(-1, 28, 28, 1)
-        x_test = x_test.reshape(-1, 28, 28, 1)
-        
-        # Convert labels to categorical
-        y_train = keras.utils.to_categorical(y_train, 10)
-        y_test = keras.utils.to_categorical(y_test, 10)
-        
-        print("🔧 Building neural network...")
-        # Create optimized CNN model
-        self.model = keras.Sequential([
+    def build_model(self):
+        """Create the (untrained) CNN"""
+        return keras.Sequential([
             keras.layers.Conv2D(32, (3, 3), activation='relu', input_shape=(28, 28, 1)),
             keras.layers.MaxPooling2D((2, 2)),
             keras.layers.Conv2D(64, (3, 3), activation='relu'),
@@ -51,40 +85,95 @@ class ColabDigitRecognizer:
             keras.layers.Dense(10, activation='softmax')
         ])
         
+    def load_or_create_model(self):
+        """Load the cached or shipped model, or train a new one and cache it"""
+        print("🚀 Setting up digit recognition model...")
+        
+        self.model = self.build_model()
+        if model_cache is not None:
+            key = model_cache.model_key(self.model, TRAINING_CONFIG, model_cache.dataset_version())
+            cached_model = model_cache.load_cached_model(key)
+            if cached_model is not None:
+                self.model = cached_model
+                print(f"✅ Loaded cached model {model_cache.cache_path(key)}")
+                return
+            shipped_model = model_cache.load_shipped_model(SHIPPED_MODEL_PATHS, self.model)
+            if shipped_model is not None:
+                self.model = shipped_model
+                print("✅ Loaded the pre-trained digit_model.h5")
+                return
+        
+        print("📚 Loading MNIST dataset...")
+        if streaming_dataset is not None:
+            # Stream MNIST from memory-mapped uint8 arrays, normalized per batch, with sparse labels
+            (x_train, y_train), (x_test, y_test) = streaming_dataset.mnist_memmap()
+            train_data, validation_data = streaming_dataset.training_datasets(
+                x_train, y_train, TRAINING_CONFIG['batch_size'], TRAINING_CONFIG['validation_split'])
+            test_data = streaming_dataset.make_dataset(x_test, y_test, TRAINING_CONFIG['batch_size'])
+        else:
+            # Normalize and reshape the whole dataset in memory, the validation set is the tail of the training set
+            (x_train, y_train), (x_test, y_test) = keras.datasets.mnist.load_data()
+            x_train = (x_train.astype('float32') / 255.0).reshape(-1, 28, 28, 1)
+            x_test = (x_test.astype('float32') / 255.0).reshape(-1, 28, 28, 1)
+            split = len(x_train) - int(len(x_train) * TRAINING_CONFIG['validation_split'])
+            train_data = tf.data.Dataset.from_tensor_slices((x_train[:split], y_train[:split])).shuffle(split)
+            validation_data = tf.data.Dataset.from_tensor_slices((x_train[split:], y_train[split:]))
+            test_data = tf.data.Dataset.from_tensor_slices((x_test, y_test))
+            train_data, validation_data, test_data = (data.batch(TRAINING_CONFIG['batch_size'])
+                                                      for data in (train_data, validation_data, test_data))
+        
         # Compile model
-        self.model.compile(optimizer='adam',
-                          loss='categorical_crossentropy',
+        self.model.compile(optimizer=TRAINING_CONFIG['optimizer'],
+                          loss=TRAINING_CONFIG['loss'],
                           metrics=['accuracy'])
         
         print("🎯 Training model (this will take a few minutes)...")
         # Train model
-        history = self.model.fit(x_train, y_train, 
-                               epochs=3,  # Reduced for faster training in Colab
-                               batch_size=128, 
-                               validation_split=0.1,
+        history = self.model.fit(train_data,
+                               epochs=TRAINING_CONFIG['epochs'],  # Reduced for faster training in Colab
+                               validation_data=validation_data,
                                verbose=1)
         
         # Evaluate
-        test_loss, test_acc = self.model.evaluate(x_test, y_test, verbose=0)
+        test_loss, test_acc = self.model.evaluate(test_data, verbose=0)
         print(f"✅ Model ready! Test accuracy: {test_acc:.4f}")
         
+        # Cache the trained model so the next start skips training
+        if model_cache is not None:
+            print(f"💾 Saved model to {model_cache.save_cached_model(self.model, key)}")
+        
     def predict_from_canvas(self, image_data):
         """Predict digit from canvas image data"""
         try:
-            # Decode base64 image
+            # Repeated (or pixel-equivalent) drawings are answered from the cache
+            with self.timings.stage('total'):
+                return self.cache.get_or_predict(image_data, self._canvas_array, self._predict_array)
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def _canvas_array(self, image_data):
+        """Decode a canvas data URI to the downsampled 28x28 uint8 array"""
+        # Decode base64 image
+        with self.timings.stage('base64_decode'):
             image_data = image_data.split(',')[1]  # Remove data:image/png;base64,
             image_bytes = base64.b64decode(image_data)
-            
-            # Convert to PIL Image
+        
+        # Convert to PIL Image and grayscale
+        with self.timings.stage('image_decode'):
             image = Image.open(BytesIO(image_bytes))
-            
-            # Convert to grayscale and resize
             image = image.convert('L')
+        
+        # Resize
+        with self.timings.stage('resize'):
             image = image.resize((28, 28), Image.Resampling.LANCZOS)
-            
-            # Convert to numpy array
-            img_array = np.array(image)
-            
+        
+        # Convert to numpy array
+        with self.timings.stage('to_array'):
+            return np.array(image)
+    
+    def _predict_array(self, img_array):
+        """Predict from the downsampled 28x28 uint8 canvas array"""
+        with self.timings.stage('normalize'):
             # Invert colors (canvas is black on white, MNIST is white on black)
             img_array = 255 - img_array
             
@@ -93,24 +182,23 @@ class ColabDigitRecognizer:
             
             # Reshape for model
             img_array = img_array.reshape(1, 28, 28, 1)
-            
-            # Make prediction
-            prediction = self.model.predict(img_array, verbose=0)
-            predicted_digit = np.argmax(prediction)
-            confidence = np.max(prediction)
-            
-            return {
-                'digit': int(predicted_digit),
-                'confidence': float(confidence),
-                'all_predictions': prediction[0].tolist()
-            }
-            
-        except Exception as e:
-            return {'error': str(e)}
+        
+        # Make prediction
+        with self.timings.stage('predict'):
+            prediction = self.predictor.predict(img_array)
+        predicted_digit = np.argmax(prediction)
+        confidence = np.max(prediction)
+        
+        return {
+            'digit': int(predicted_digit),
+            'confidence': float(confidence),
+            'all_predictions': prediction[0].tolist()
+        }
 
-# Initialize the recognizer
-print("Initializing Handwritten Digit Recognition for Google Colab...")
-recognizer = ColabDigitRecognizer()
+# Initialize the recognizer (importing the module only defines ColabDigitRecognizer)
+if __name__ == "__main__":
+    print("Initializing Handwritten Digit Recognition for Google Colab...")
+    recognizer = ColabDigitRecognizer()
 
 # JavaScript function to handle predictions
 prediction_js = """
@@ -453,20 +541,21 @@ def predict_digit(image_data):
     
     display(HTML(f"<script>{js_code}</script>"))
 
-# Register the callback
-try:
-    from google.colab import output
-    output.register_callback('predict_digit', predict_digit)
-    print("✅ Callback registered successfully!")
-except ImportError:
-    print("⚠️ Running outside Google Colab - callback registration skipped")
+if __name__ == "__main__":
+    # Register the callback
+    try:
+        from google.colab import output
+        output.register_callback('predict_digit', predict_digit)
+        print("✅ Callback registered successfully!")
+    except ImportError:
+        print("⚠️ Running outside Google Colab - callback registration skipped")
 
-# Display the interface
-print("\n" + "="*60)
-print("🎨 INTERACTIVE DIGIT RECOGNITION INTERFACE")
-print("="*60)
-print("The web interface is loading below...")
-print("Draw digits with your mouse or finger and click 'Predict'!")
-print("="*60 + "\n")
+    # Display the interface
+    print("\n" + "="*60)
+    print("🎨 INTERACTIVE DIGIT RECOGNITION INTERFACE")
+    print("="*60)
+    print("The web interface is loading below...")
+    print("Draw digits with your mouse or finger and click 'Predict'!")
+    print("="*60 + "\n")
 
-display(HTML(html_interface))
+    display(HTML(html_interface))
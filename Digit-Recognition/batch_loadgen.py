@@ -0,0 +1,138 @@
+# Load generator for batch_server.py: concurrent clients POST canvas drawings and the latencies are measured.
+# By default it starts the server in-process once per batch setting and sweeps them; with --url it loads a
+# running server instead.
+#
+#   python batch_loadgen.py --clients 32 --duration 10 --settings 1:0,8:2,32:2,64:5
+#   python batch_loadgen.py --raw      (send raw RGBA canvas pixels to /predict_raw instead of PNG data URIs)
+import io, json, time, base64, random, argparse, threading, http.client
+from urllib.parse import urlparse
+import numpy as np
+from PIL import Image, ImageDraw
+
+import batch_server
+from prediction_cache import PredictionCache
+
+
+def make_canvas(rng, size=400):
+    """a random 'drawing' like the JS canvas: black strokes on white (grayscale PIL image)"""
+    img = Image.new("L", (size, size), 255)
+    draw = ImageDraw.Draw(img)
+    points = [(rng.randint(80, size - 80), rng.randint(60, size - 60)) for _ in range(rng.randint(3, 6))]
+    draw.line(points, fill=0, width=15, joint="curve")
+    return img
+
+
+def make_canvas_uri(rng, size=400):
+    """a random drawing as the PNG data URI the JS canvas sends"""
+    buf = io.BytesIO()
+    make_canvas(rng, size).save(buf, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode()
+
+
+def make_canvas_rgba(rng, size=400):
+    """a random drawing as raw RGBA bytes, like ctx.getImageData().data"""
+    return np.array(make_canvas(rng, size).convert("RGBA")).tobytes()
+
+
+def run_client(host, port, path, payloads, stop_at, latencies, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    content_type = "application/octet-stream" if path == "/predict_raw" else "application/json"
+    i = 0
+    while time.perf_counter() < stop_at:
+        body = payloads[i % len(payloads)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("POST", path, body, {"Content-Type": content_type})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except Exception as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)] if sorted_values else float("nan")
+
+
+def run_load(host, port, path, payloads, clients, duration):
+    latencies, errors = [], []
+    stop_at = time.perf_counter() + duration
+    threads = [threading.Thread(target=run_client, args=(host, port, path, payloads, stop_at, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {"requests": len(latencies), "errors": len(errors), "throughput": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 0.50) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": (latencies[-1] if latencies else float("nan")) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and tail latency of the micro-batching server")
+    parser.add_argument("--url", help="load a running server (e.g. http://127.0.0.1:8500) instead of sweeping")
+    parser.add_argument("--model", default=batch_server.SHIPPED_MODEL_PATH)
+    parser.add_argument("--settings", default="1:0,8:2,32:2,64:5",
+                        help="comma separated max_batch_size:max_wait_ms pairs to sweep")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per setting")
+    parser.add_argument("--images", type=int, default=64, help="distinct drawings to send")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--raw", action="store_true", help="send raw RGBA pixels to /predict_raw")
+    parser.add_argument("--cache", action="store_true",
+                        help="keep the prediction cache; off by default as the drawings repeat and would all hit it")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    path = "/predict_raw" if args.raw else "/predict"
+    payloads = [make_canvas_rgba(rng) if args.raw else json.dumps({"image": make_canvas_uri(rng)})
+                for _ in range(args.images)]
+    results = []
+    print(f"{'batch':>6} {'wait ms':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'mean batch':>10}")
+    if args.url:
+        url = urlparse(args.url)
+        result = run_load(url.hostname, url.port or 80, path, payloads, args.clients, args.duration)
+        results.append(result)
+        print(f"{'-':>6} {'-':>8} {result['throughput']:9.1f} {result['p50_ms']:8.1f} {result['p99_ms']:8.1f} "
+              f"{result['max_ms']:8.1f} {'-':>10}")
+    else:
+        from minst_nn import Recognizer
+        recognizer = Recognizer(args.model, urls=[])
+        if not args.cache:
+            recognizer.cache = PredictionCache(max_entries=0)
+        recognizer.predict_batch([np.zeros((28, 28), "float32")])  # warm up
+        for setting in args.settings.split(","):
+            max_batch_size, max_wait_ms = int(setting.split(":")[0]), float(setting.split(":")[1])
+            server, batcher = batch_server.make_server(recognizer, "127.0.0.1", 0, max_batch_size, max_wait_ms)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                result = run_load("127.0.0.1", server.server_address[1], path, payloads, args.clients,
+                                  args.duration)
+            finally:
+                server.shutdown()
+                server.server_close()
+                batcher.close()
+            result.update(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                          mean_batch_size=batcher.stats()["mean_batch_size"])
+            results.append(result)
+            print(f"{max_batch_size:6d} {max_wait_ms:8.1f} {result['throughput']:9.1f} {result['p50_ms']:8.1f} "
+                  f"{result['p99_ms']:8.1f} {result['max_ms']:8.1f} {result['mean_batch_size']:10.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# Micro-batching HTTP inference server around Recognizer.
+# Request threads decode and preprocess their canvas image, then queue it; one worker thread takes up to
+# max_batch_size queued images (waiting at most max_wait_ms for the batch to fill) and runs a single forward pass.
+#
+#   python batch_server.py --port 8500 --max-batch-size 32 --max-wait-ms 2
+#   curl -X POST localhost:8500/predict -d '{"image": "data:image/png;base64,..."}'
+#   curl -X POST localhost:8500/predict_raw --data-binary @canvas.rgba    (400x400 RGBA, 400x400 gray or 28x28 bytes)
+#   python batch_server.py --workers 4     (preprocess and classify in a pool of NumPy engine processes instead)
+# Results are looked up in the recognizer's prediction cache first, so resubmitted drawings are not queued.
+# With DIGIT_STAGE_TIMING=1, GET /metrics returns latency percentiles of the recognizer's preprocessing and
+# inference stages and of the server's queue wait and whole requests.
+import os, json, time, queue, argparse, threading
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+
+from fast_preprocess import CanvasPreprocessor
+from stage_timing import StageTimer
+
+SHIPPED_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "digit_model.h5")
+
+
+class MicroBatcher:
+    def __init__(self, predict_batch, max_batch_size=32, max_wait_ms=2.0, max_queue=4096, timings=None):
+        """predict_batch(list of inputs) -> list of results, called from the worker thread only"""
+        self.predict_batch = predict_batch
+        self.timings = timings or StageTimer()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue(max_queue)
+        self.batches = 0
+        self.items = 0
+        self.worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.worker.start()
+
+    def submit(self, item):
+        """queue one input, returns a Future with its result"""
+        future = Future()
+        self.requests.put((item, future, time.perf_counter()))
+        return future
+
+    def predict(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def close(self):
+        self.requests.put(None)
+        self.worker.join()
+
+    def _next_batch(self):
+        """block for the first request, then collect more until the batch is full or max_wait has passed"""
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:  # closing: serve this batch, stop on the next call
+                self.requests.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if self.timings.enabled:
+                start = time.perf_counter()
+                for item, future, submitted in batch:
+                    self.timings.record("queue_wait", start - submitted)
+            try:
+                results = self.predict_batch([item for item, future, submitted in batch])
+            except Exception as e:
+                for item, future, submitted in batch:
+                    future.set_exception(e)
+                continue
+            for (item, future, submitted), result in zip(batch, results):
+                future.set_result(result)
+            self.batches += 1
+            self.items += len(batch)
+
+    def stats(self):
+        return {"batches": self.batches, "requests": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "queued": self.requests.qsize()}
+
+
+def make_handler(recognizer, batcher):
+    """with recognizer None, batcher is a worker_pool.WorkerPool that preprocesses the submissions itself"""
+    local = threading.local()  # one canvas preprocessor (with its buffers) per request thread
+
+    def preprocess_raw(body):
+        """raw pixel bytes (400x400 RGBA or gray, or 28x28 gray) -> 28x28 array"""
+        if not hasattr(local, "canvas"):
+            local.canvas = CanvasPreprocessor(400, 400, max_batch=1)
+        with recognizer.timings.stage("fast_preprocess"):
+            return local.canvas.from_bytes(body)[0, :, :, 0].copy()  # copy out of the reused buffer before queueing
+
+    class PredictHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, clients reuse their connection
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path not in ("/predict", "/predict_raw"):
+                return self._send_json(404, {"error": "not found"})
+            with batcher.timings.stage("request"):
+                self._predict()
+
+        def _predict(self):
+            try:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path == "/predict_raw":
+                    submission = body
+                else:
+                    submission = json.loads(body)["image"] if body.startswith(b"{") else body.decode()
+            except Exception as e:
+                return self._send_json(400, {"error": str(e)})
+            if recognizer is None:
+                try:
+                    result = batcher.predict(submission, timeout=30)
+                except Exception as e:
+                    return self._send_json(500, {"error": str(e)})
+                return self._send_json(400 if "error" in result else 200, result)
+            preprocess = preprocess_raw if self.path == "/predict_raw" else recognizer.preprocess_b64
+            preprocessed = []  # stays empty if the error is a bad image (the client's) rather than the server's
+
+            def preprocess_and_keep(submission):
+                preprocessed.append(preprocess(submission))
+                return preprocessed[-1]
+
+            try:
+                result = recognizer.cache.get_or_predict(submission, preprocess_and_keep,
+                                                         lambda arr: batcher.predict(arr, timeout=30))
+            except Exception as e:
+                return self._send_json(500 if preprocessed else 400, {"error": str(e)})
+            self._send_json(200, result)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/stats":
+                self._send_json(200, dict(batcher.stats(), **({"cache": recognizer.cache.stats()} if recognizer else {})))
+            elif self.path == "/metrics":
+                self._send_json(200, {"enabled": batcher.timings.enabled,
+                                      "recognizer": recognizer.timings.stats() if recognizer else {},
+                                      "server": batcher.timings.stats()})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def log_message(self, format, *args):  # no per-request logging on the hot path
+            pass
+
+    return PredictHandler
+
+
+def make_server(recognizer, host="127.0.0.1", port=8500, max_batch_size=32, max_wait_ms=2.0):
+    """HTTP server plus its batcher; serve with server.serve_forever(), stop with shutdown() and batcher.close()"""
+    batcher = MicroBatcher(recognizer.predict_batch, max_batch_size, max_wait_ms)
+    server = ThreadingHTTPServer((host, port), make_handler(recognizer, batcher))
+    server.daemon_threads = True
+    return server, batcher
+
+
+def make_pool_server(pool, host="127.0.0.1", port=8500):
+    """HTTP server in front of a worker_pool.WorkerPool; stop with shutdown() and pool.close()"""
+    server = ThreadingHTTPServer((host, port), make_handler(None, pool))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching digit recognition server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8500)
+    parser.add_argument("--model", default=SHIPPED_MODEL_PATH)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="serve from this many NumPy engine worker processes sharing the weights (worker_pool.py)")
+    args = parser.parse_args()
+
+    if args.workers:
+        from worker_pool import WorkerPool, prepare_shared_weights
+        weights = prepare_shared_weights(args.model, os.path.splitext(args.model)[0] + ".weights")
+        batcher = WorkerPool(weights, args.workers, args.max_batch_size)
+        server = make_pool_server(batcher, args.host, args.port)
+        print(f"serving on http://{args.host}:{args.port} ({args.workers} worker processes)")
+    else:
+        from minst_nn import Recognizer
+        recognizer = Recognizer(args.model, urls=[])
+        server, batcher = make_server(recognizer, args.host, args.port, args.max_batch_size, args.max_wait_ms)
+        print(f"serving on http://{args.host}:{args.port} (batch <= {args.max_batch_size}, wait <= {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Deployment report for the int8 digit model against the float one, both on the NumPy engine: MNIST test
+# accuracy, file size, weight memory, cold start peak RSS and per-batch latency.
+#
+#   python numpy_cnn.py digit_model.h5 digit_model.npz
+#   python int8_cnn.py digit_model.npz digit_model_int8.npz
+#   python bench_int8.py --json int8_report.json
+import os, json, argparse
+import numpy as np
+
+import mnist_data
+from bench_numpy_cnn import cold_start, latency_ms
+from int8_cnn import Int8DigitModel
+from numpy_cnn import NumpyDigitModel
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def weight_bytes(model):
+    return sum(layer[key].nbytes for layer in model.layers for key in ("weights", "bias") if key in layer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy, size, memory and latency of the int8 vs float model")
+    parser.add_argument("--float-npz", default=os.path.join(HERE, "digit_model.npz"))
+    parser.add_argument("--int8-npz", default=os.path.join(HERE, "digit_model_int8.npz"))
+    parser.add_argument("--mnist", help="local mnist.npz instead of keras.datasets (or set MNIST_NPZ)")
+    parser.add_argument("--batch-sizes", default="1,8,64,256")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    models = {"float32": NumpyDigitModel(args.float_npz), "int8": Int8DigitModel(args.int8_npz)}
+    paths = {"float32": args.float_npz, "int8": args.int8_npz}
+    _, (x_test, y_test) = mnist_data.load_mnist(args.mnist)
+    x_test = mnist_data.normalize(x_test)
+    predictions = {name: model.predict(x_test).argmax(axis=1) for name, model in models.items()}
+
+    results = {}
+    for name, model in models.items():
+        cold = cold_start("numpy" if name == "float32" else "int8", paths[name], args.cold_runs)
+        results[name] = {"accuracy": float((predictions[name] == y_test).mean()),
+                         "file_bytes": os.path.getsize(paths[name]), "weight_bytes": weight_bytes(model),
+                         "cold_start_seconds": cold["seconds"], "peak_rss_mb": cold["peak_rss_mb"]}
+    results["agreement"] = float((predictions["float32"] == predictions["int8"]).mean())
+    print(f"{'':<8} {'accuracy':>9} {'file KB':>8} {'weights KB':>11} {'cold start s':>13} {'peak RSS MB':>12}")
+    for name in models:
+        r = results[name]
+        print(f"{name:<8} {r['accuracy']:9.2%} {r['file_bytes'] / 1024:8.1f} {r['weight_bytes'] / 1024:11.1f} "
+              f"{r['cold_start_seconds']:13.2f} {r['peak_rss_mb']:12.1f}")
+    print(f"same digit on {results['agreement']:.2%} of the {len(y_test)} test images")
+
+    results["latency_ms"] = {}
+    print(f"\n{'batch':>6} {'float32 ms':>11} {'int8 ms':>9}")
+    for batch_size in map(int, args.batch_sizes.split(",")):
+        x = x_test[:batch_size]
+        row = {name: latency_ms(model.predict, x, args.repeats) for name, model in models.items()}
+        results["latency_ms"][batch_size] = row
+        print(f"{batch_size:6d} {row['float32']:11.2f} {row['int8']:9.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
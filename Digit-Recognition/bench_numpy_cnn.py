@@ -0,0 +1,93 @@
+# Benchmark of the NumPy inference engine against Keras: cold start (process start to first prediction),
+# peak memory of that process, per-batch latency and agreement of the predictions.
+#
+#   python numpy_cnn.py digit_model.h5 digit_model.npz
+#   python bench_numpy_cnn.py --keras-model digit_model.h5 --npz digit_model.npz
+import os, sys, json, time, argparse, subprocess
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# run in a fresh interpreter; prints seconds to the first prediction and the peak RSS in MB
+COLD_START = {
+    "numpy": "import numpy_cnn; m = numpy_cnn.NumpyDigitModel({path!r}); m.predict(np.zeros((1, 28, 28, 1), 'float32'))",
+    "int8": "import int8_cnn; m = int8_cnn.Int8DigitModel({path!r}); m.predict(np.zeros((1, 28, 28, 1), 'float32'))",
+    "keras": "from tensorflow import keras; m = keras.models.load_model({path!r}, compile=False); "
+             "m.predict(np.zeros((1, 28, 28, 1), 'float32'), verbose=0)",
+}
+COLD_START_WRAPPER = """
+import time; start = time.perf_counter()
+import json, resource, sys, numpy as np
+{code}
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+print(json.dumps({{"seconds": time.perf_counter() - start, "peak_rss_mb": rss}}))
+"""
+
+
+def cold_start(engine, path, runs):
+    """best of runs: seconds from interpreter start to first prediction, and peak RSS of that process"""
+    results = []
+    for _ in range(runs):
+        script = COLD_START_WRAPPER.format(code=COLD_START[engine].format(path=path))
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", script], cwd=HERE, capture_output=True, text=True, check=True,
+                             env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3"))
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result["wall_seconds"] = time.perf_counter() - start  # includes the interpreter start
+        results.append(result)
+    return min(results, key=lambda r: r["wall_seconds"])
+
+
+def latency_ms(predict, x, repeats):
+    predict(x)  # warm up
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(x)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start, memory and latency of NumPy vs Keras inference")
+    parser.add_argument("--keras-model", default=os.path.join(HERE, "digit_model.h5"))
+    parser.add_argument("--npz", default=os.path.join(HERE, "digit_model.npz"))
+    parser.add_argument("--batch-sizes", default="1,8,64,256")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = {"cold_start": {"numpy": cold_start("numpy", args.npz, args.cold_runs),
+                              "keras": cold_start("keras", args.keras_model, args.cold_runs)}}
+    print(f"{'cold start':<12} {'to 1st pred s':>14} {'with python s':>14} {'peak RSS MB':>12}")
+    for engine, r in results["cold_start"].items():
+        print(f"{engine:<12} {r['seconds']:14.2f} {r['wall_seconds']:14.2f} {r['peak_rss_mb']:12.1f}")
+
+    import numpy_cnn
+    from tensorflow import keras
+    numpy_model = numpy_cnn.NumpyDigitModel(args.npz)
+    keras_model = keras.models.load_model(args.keras_model, compile=False)
+    rng = np.random.default_rng(0)
+    results["latency_ms"] = {}
+    print(f"\n{'batch':>6} {'numpy ms':>10} {'keras predict ms':>17} {'keras call ms':>14}")
+    for batch_size in map(int, args.batch_sizes.split(",")):
+        x = rng.random((batch_size, 28, 28, 1), dtype="float32")
+        row = {"numpy": latency_ms(numpy_model.predict, x, args.repeats),
+               "keras_predict": latency_ms(lambda b: keras_model.predict(b, verbose=0), x, args.repeats),
+               "keras_call": latency_ms(lambda b: keras_model(b, training=False), x, args.repeats)}
+        results["latency_ms"][batch_size] = row
+        print(f"{batch_size:6d} {row['numpy']:10.2f} {row['keras_predict']:17.2f} {row['keras_call']:14.2f}")
+
+    x = rng.random((1000, 28, 28, 1), dtype="float32")
+    numpy_probs, keras_probs = numpy_model.predict(x), keras_model.predict(x, verbose=0)
+    results["max_abs_diff"] = float(np.abs(numpy_probs - keras_probs).max())
+    results["argmax_agreement"] = float((numpy_probs.argmax(1) == keras_probs.argmax(1)).mean())
+    print(f"\nmax abs difference {results['max_abs_diff']:.2e}, same digit {results['argmax_agreement']:.2%}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Microbenchmark of per-request latency of both recognizers: model.predict (the old path) vs CompiledPredictor.
+#
+#   python bench_predict.py --requests 200
+import os, json, time, random, argparse
+import numpy as np
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+from batch_loadgen import make_canvas_uri
+from Digit_Recognition import ColabDigitRecognizer
+from minst_nn import Recognizer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class ModelPredict:
+    """the old path: Keras model.predict per call"""
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, x):
+        return self.model.predict(x, verbose=0)
+
+
+def measure(call, inputs):
+    times = []
+    for x in inputs:
+        start = time.perf_counter()
+        call(x)
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1000
+    return {"mean_ms": float(times.mean()), "p50_ms": float(np.percentile(times, 50)),
+            "p99_ms": float(np.percentile(times, 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request latency before/after the compiled predict path")
+    parser.add_argument("--model", default=os.path.join(HERE, "digit_model.h5"))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    uris = [make_canvas_uri(rng) for _ in range(args.requests)]
+    recognizer = Recognizer(args.model, urls=[])
+    colab_recognizer = ColabDigitRecognizer()
+    arrays = [recognizer.preprocess_b64(uri).reshape(1, 28, 28, 1) for uri in uris]
+
+    results = {}
+    for name, predictor in (("before", ModelPredict(recognizer.model)), ("after", recognizer.predictor)):
+        predictor.predict(arrays[0])  # warm up
+        results[f"model only, {name}"] = measure(predictor.predict, arrays)
+    for owner, call in ((recognizer, recognizer.predict_b64), (colab_recognizer, colab_recognizer.predict_from_canvas)):
+        compiled = owner.predictor
+        for name, predictor in (("before", ModelPredict(owner.model)), ("after", compiled)):
+            owner.predictor = predictor
+            call(uris[0])
+            results[f"{call.__qualname__}, {name}"] = measure(call, uris)
+        owner.predictor = compiled
+
+    print(f"{'':<48} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, r in results.items():
+        print(f"{name:<48} {r['mean_ms']:8.2f} {r['p50_ms']:8.2f} {r['p99_ms']:8.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Microbenchmark of canvas preprocessing: the data URI -> PNG -> PIL path vs CanvasPreprocessor on raw pixels,
+# plus how far the fast path's output is from PIL's.
+#
+#   python bench_preprocess.py --images 256
+import io, json, time, base64, random, argparse
+import numpy as np
+from PIL import Image
+
+from batch_loadgen import make_canvas
+from fast_preprocess import CanvasPreprocessor
+
+
+def pil_preprocess(data_uri):
+    """the same steps as Recognizer.preprocess_b64, without loading a model"""
+    img = Image.open(io.BytesIO(base64.b64decode(data_uri.split(",")[1]))).convert("L")
+    img = img.resize((28, 28), Image.Resampling.LANCZOS)
+    return (255 - np.array(img).astype("float32")) / 255.0
+
+
+def per_image_ms(call, inputs, images_per_input=1, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for x in inputs:
+            call(x)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000 / (len(inputs) * images_per_input)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Canvas preprocessing cost, PIL vs vectorized raw pixels")
+    parser.add_argument("--images", type=int, default=256)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    canvases = [make_canvas(rng) for _ in range(args.images)]
+    rgba = [np.array(img.convert("RGBA")) for img in canvases]
+    uris = []
+    for pixels in rgba:  # canvas.toDataURL() sends an RGBA PNG
+        buf = io.BytesIO()
+        Image.fromarray(pixels).save(buf, format="PNG")
+        uris.append("data:image/png;base64," + base64.b64encode(buf.getvalue()).decode())
+    gray = [np.array(img) for img in canvases]
+    batches = [np.stack(rgba[i:i + args.batch]) for i in range(0, len(rgba), args.batch)]
+    small = [np.array(img.resize((28, 28), Image.Resampling.LANCZOS)) for img in canvases]
+    canvas = CanvasPreprocessor(400, 400, max_batch=args.batch)
+
+    results = {
+        "PIL, data URI": per_image_ms(pil_preprocess, uris),
+        "fast, RGBA single": per_image_ms(canvas, rgba),
+        "fast, gray single": per_image_ms(canvas, gray),
+        f"fast, RGBA batch of {args.batch}": per_image_ms(canvas, batches, args.batch),
+        "fast, 28x28 input": per_image_ms(canvas, small),
+    }
+    diff = np.abs(np.stack([pil_preprocess(uri) for uri in uris])
+                  - np.concatenate([canvas(batch)[..., 0].copy() for batch in batches]))
+
+    print(f"{'':<28} {'ms/image':>9} {'speedup':>8}")
+    for name, ms in results.items():
+        print(f"{name:<28} {ms:9.3f} {results['PIL, data URI'] / ms:7.1f}x")
+    print(f"difference to PIL: max {diff.max() * 255:.2f}/255, mean {diff.mean() * 255:.3f}/255")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"ms_per_image": results, "max_diff": float(diff.max()), "mean_diff": float(diff.mean())},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Epoch time and peak RSS of training the digit CNN with the old in-memory input (float32 copies, one-hot labels,
+# everything passed to fit) against the memmap streaming pipeline of streaming_dataset.py.
+# Every run happens in a fresh process so the peak RSS is its own; --repeat-data k trains on k copies of the
+# MNIST training set to show how both scale to larger corpora.
+#
+#   python bench_training.py --epochs 2 --repeat-data 1,4
+import os, sys, json, time, argparse, resource, subprocess
+import numpy as np
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def train(mode, epochs, repeat_data, mnist_path, data_dir):
+    """one training run in this process, returns epoch times and peak RSS"""
+    from tensorflow import keras
+    import mnist_data, streaming_dataset
+    from Digit_Recognition import ColabDigitRecognizer, TRAINING_CONFIG
+
+    class EpochTimer(keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.start = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            epoch_seconds.append(time.perf_counter() - self.start)
+
+    epoch_seconds = []
+    model = ColabDigitRecognizer.build_model(None)  # build_model doesn't use the instance
+    batch_size, validation_split = TRAINING_CONFIG["batch_size"], TRAINING_CONFIG["validation_split"]
+    if mode == "streaming":
+        (x_train, y_train), _ = streaming_dataset.mnist_memmap(data_dir, mnist_path)
+        name = f"mnist_train_x{repeat_data}"
+        if repeat_data > 1 and not os.path.exists(streaming_dataset.memmap_paths(data_dir, name)[0]):
+            streaming_dataset.write_memmap(data_dir, name, [(x_train, y_train)] * repeat_data,
+                                           len(x_train) * repeat_data)
+        if repeat_data > 1:
+            x_train, y_train = streaming_dataset.open_memmap(data_dir, name)
+        rss_before = peak_rss_mb()
+        train_data, validation_data = streaming_dataset.training_datasets(x_train, y_train, batch_size,
+                                                                          validation_split)
+        model.compile(optimizer=TRAINING_CONFIG["optimizer"], loss="sparse_categorical_crossentropy",
+                      metrics=["accuracy"])
+        history = model.fit(train_data, epochs=epochs, validation_data=validation_data, verbose=0,
+                            callbacks=[EpochTimer()])
+    else:
+        rss_before = peak_rss_mb()
+        (x_train, y_train), _ = mnist_data.load_mnist(mnist_path)
+        x_train, y_train = np.concatenate([x_train] * repeat_data), np.concatenate([y_train] * repeat_data)
+        x_train = x_train.astype("float32") / 255.0  # what load_or_create_model used to do
+        x_train = x_train.reshape(-1, 28, 28, 1)
+        y_train = keras.utils.to_categorical(y_train, 10)
+        model.compile(optimizer=TRAINING_CONFIG["optimizer"], loss="categorical_crossentropy", metrics=["accuracy"])
+        history = model.fit(x_train, y_train, epochs=epochs, batch_size=batch_size,
+                            validation_split=validation_split, verbose=0, callbacks=[EpochTimer()])
+    return {"mode": mode, "repeat_data": repeat_data, "examples": len(x_train), "epoch_seconds": epoch_seconds,
+            "val_accuracy": float(history.history["val_accuracy"][-1]),
+            "peak_rss_before_training_mb": rss_before, "peak_rss_mb": peak_rss_mb()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Epoch time and peak RSS, in-memory vs streaming training input")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--repeat-data", default="1", help="comma separated copies of the training set to use")
+    parser.add_argument("--modes", default="in-memory,streaming")
+    parser.add_argument("--mnist", help="local mnist.npz instead of keras.datasets (or set MNIST_NPZ)")
+    parser.add_argument("--data-dir", default=None, help="memmap directory (default streaming_dataset.DATA_DIR)")
+    parser.add_argument("--run", help=argparse.SUPPRESS)  # mode:repeat_data, internal: one run in this process
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    if args.run:
+        import streaming_dataset
+        mode, repeat_data = args.run.split(":")
+        print(json.dumps(train(mode, args.epochs, int(repeat_data), args.mnist,
+                               args.data_dir or streaming_dataset.DATA_DIR)))
+        return
+
+    results = []
+    print(f"{'mode':<10} {'examples':>9} {'1st epoch s':>12} {'later epochs s':>15} {'val acc':>8} "
+          f"{'RSS before MB':>14} {'peak RSS MB':>12}")
+    for repeat_data in map(int, args.repeat_data.split(",")):
+        for mode in args.modes.split(","):
+            command = [sys.executable, __file__, "--run", f"{mode}:{repeat_data}", "--epochs", str(args.epochs)]
+            command += ["--mnist", args.mnist] if args.mnist else []
+            command += ["--data-dir", args.data_dir] if args.data_dir else []
+            out = subprocess.run(command, cwd=HERE, capture_output=True, text=True, check=True)
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            results.append(r)
+            later = np.mean(r["epoch_seconds"][1:]) if len(r["epoch_seconds"]) > 1 else float("nan")
+            print(f"{mode:<10} {r['examples']:9d} {r['epoch_seconds'][0]:12.1f} {later:15.1f} "
+                  f"{r['val_accuracy']:8.4f} {r['peak_rss_before_training_mb']:14.0f} {r['peak_rss_mb']:12.0f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
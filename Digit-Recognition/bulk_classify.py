@@ -0,0 +1,235 @@
+# Offline bulk classification of digit images: a directory (recursively), an .npz of image arrays or a tar of
+# image files. Images are decoded and preprocessed in a thread pool one batch ahead of inference, classified in
+# large batches, and the predictions are streamed to CSV or Parquet as they are made, so an interrupted run can be
+# continued with --resume.
+#
+#   python bulk_classify.py scans/ predictions.csv
+#   python bulk_classify.py scans.tar.gz predictions.parquet --batch-size 2048 --workers 8
+#   python bulk_classify.py mnist.npz predictions.csv --npz-key x_test --engine numpy --model digit_model.npz
+#   python bulk_classify.py scans/ predictions.csv --resume        (after an interruption)
+#
+# Parquet output is a directory with one part file per run; CSV output is one file that is appended to.
+import os, io, sys, csv, time, tarfile, argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".pgm", ".webp")
+COLUMNS = ["key", "digit", "confidence", "error"]
+
+
+def iter_directory(path):
+    """(relative path, file path) of every image below path, in a stable order"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                full_path = os.path.join(root, name)
+                yield os.path.relpath(full_path, path).replace(os.sep, "/"), full_path
+
+
+def iter_tar(path):
+    """(member name, file bytes) of every image in a (compressed) tar, read sequentially"""
+    with tarfile.open(path, "r:*") as tar:
+        for member in tar:
+            if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield member.name, tar.extractfile(member).read()
+
+
+def iter_npz(path, key=None):
+    """(index, uint8 image array) of an image array in an .npz, by default its only or first 3-d array"""
+    with np.load(path) as data:
+        images = data[key] if key else next((a for a in map(data.get, data.files) if a.ndim in (3, 4)), None)
+        if images is None:
+            raise ValueError(f"{path}: no (N, H, W) image array, pass --npz-key")
+        for i in range(len(images)):
+            yield str(i), images[i]
+
+
+def iter_source(path, npz_key=None):
+    if os.path.isdir(path):
+        return iter_directory(path)
+    if path.endswith(".npz"):
+        return iter_npz(path, npz_key)
+    if tarfile.is_tarfile(path):
+        return iter_tar(path)
+    raise ValueError(f"{path}: expected a directory, an .npz file or a tar archive")
+
+
+def preprocess(item, invert="auto"):
+    """file path, file bytes or image array -> normalized 28x28 float32 (white digit on black, like MNIST)"""
+    if isinstance(item, np.ndarray) and item.shape[:2] == (28, 28):
+        arr = np.asarray(item, dtype="float32").reshape(28, 28)
+        arr = arr / 255.0 if item.dtype == np.uint8 or arr.max() > 1.0 else arr
+    else:
+        if isinstance(item, np.ndarray):
+            img = Image.fromarray(np.squeeze(item).astype(np.uint8))
+        else:
+            img = Image.open(io.BytesIO(item) if isinstance(item, bytes) else item)
+        img = img.convert("L").resize((28, 28), Image.Resampling.LANCZOS)
+        arr = np.asarray(img, dtype="float32") / 255.0
+    if invert == "yes" or (invert == "auto" and np.concatenate([arr[0], arr[-1], arr[:, 0], arr[:, -1]]).mean() > 0.5):
+        arr = 1.0 - arr  # dark digit on a light background, like scans and the canvas
+    return arr
+
+
+def prepared_batches(items, batch_size, workers, invert):
+    """(keys, 28x28 arrays or exceptions) per batch; the next batch is decoded while the current one is used"""
+    def decode(item):
+        try:
+            return preprocess(item, invert)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(workers) as pool:
+        pending = deque()
+        keys, futures = [], []
+        for key, item in items:
+            keys.append(key)
+            futures.append(pool.submit(decode, item))
+            if len(keys) == batch_size:
+                pending.append((keys, futures))
+                keys, futures = [], []
+                if len(pending) > 1:
+                    batch_keys, batch_futures = pending.popleft()
+                    yield batch_keys, [f.result() for f in batch_futures]
+        if keys:
+            pending.append((keys, futures))
+        for batch_keys, batch_futures in pending:
+            yield batch_keys, [f.result() for f in batch_futures]
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self.path = path
+
+    def done_keys(self):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, "rb+") as f:  # drop a last line cut off by the interruption
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+        with open(self.path, newline="") as f:
+            return {row["key"] for row in csv.DictReader(f)}
+
+    def open(self):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, "a", newline="")
+        self.writer = csv.writer(self.file)
+        if new:
+            self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(zip(rows["key"], rows["digit"], rows["confidence"], rows["error"]))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        self.path = path  # a directory of part files, one per run
+
+    def parts(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith(".parquet"))
+
+    def done_keys(self):
+        import pyarrow.parquet as pq
+        keys = set()
+        for part in self.parts():
+            try:
+                keys.update(pq.read_table(part, columns=["key"]).column("key").to_pylist())
+            except Exception:  # the run was killed before the file was closed: redo its images
+                print(f"removing unreadable {part}", file=sys.stderr)
+                os.remove(part)
+        return keys
+
+    def open(self):
+        import pyarrow as pa, pyarrow.parquet as pq
+        os.makedirs(self.path, exist_ok=True)
+        self.schema = pa.schema([("key", pa.string()), ("digit", pa.int8()), ("confidence", pa.float32()),
+                                 ("error", pa.string())])
+        part = os.path.join(self.path, f"part-{len(self.parts()):05d}.parquet")
+        self.writer = pq.ParquetWriter(part, self.schema)
+
+    def write(self, rows):
+        import pyarrow as pa
+        self.writer.write_table(pa.table(rows, schema=self.schema))  # one row group per batch
+
+    def close(self):
+        self.writer.close()
+
+
+def load_engine(engine, model_path):
+    """an object with .predict((N, 28, 28, 1) float32) -> (N, 10) probabilities"""
+    if engine == "keras":
+        from minst_nn import Recognizer
+        return Recognizer(model_path or os.path.join(HERE, "digit_model.h5"), urls=[]).predictor
+    if engine == "numpy":
+        from numpy_cnn import NumpyDigitModel
+        return NumpyDigitModel(model_path or os.path.join(HERE, "digit_model.npz"))
+    from int8_cnn import Int8DigitModel
+    return Int8DigitModel(model_path or os.path.join(HERE, "digit_model_int8.npz"))
+
+
+def classify(items, predictor, writer, batch_size=1024, workers=8, invert="auto", report_every=5.0):
+    """classify (key, item) pairs, writing every batch as it is done; returns (images, seconds)"""
+    start = last_report = time.perf_counter()
+    count = 0
+    for keys, arrays in prepared_batches(items, batch_size, workers, invert):
+        ok = [i for i, a in enumerate(arrays) if not isinstance(a, Exception)]
+        digits = np.full(len(keys), -1, np.int8)
+        confidences = np.full(len(keys), np.nan, np.float32)
+        if ok:
+            probabilities = predictor.predict(np.stack([arrays[i] for i in ok]).reshape(-1, 28, 28, 1))
+            digits[ok] = probabilities.argmax(axis=1)
+            confidences[ok] = probabilities.max(axis=1)
+        errors = ["" if not isinstance(a, Exception) else f"{type(a).__name__}: {a}" for a in arrays]
+        writer.write({"key": keys, "digit": digits, "confidence": confidences, "error": errors})
+        count += len(keys)
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            print(f"{count} images, {count / (now - start):.0f} images/s", file=sys.stderr)
+            last_report = now
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify a directory, .npz or tar of digit images in bulk")
+    parser.add_argument("input", help="directory of images, .npz with an (N, H, W) array, or .tar/.tar.gz")
+    parser.add_argument("output", help="predictions .csv file or .parquet directory")
+    parser.add_argument("--engine", choices=("keras", "numpy", "int8"), default="keras")
+    parser.add_argument("--model", help="model file for the engine (default: the shipped model)")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="decoding threads")
+    parser.add_argument("--npz-key", help="array to classify in an .npz input")
+    parser.add_argument("--invert", choices=("auto", "yes", "no"), default="auto",
+                        help="invert dark-on-light images; auto looks at the border brightness")
+    parser.add_argument("--resume", action="store_true", help="skip images already in the output and append")
+    args = parser.parse_args()
+
+    writer = ParquetWriter(args.output) if args.output.endswith(".parquet") else CsvWriter(args.output)
+    if os.path.exists(args.output) and not args.resume:
+        parser.error(f"{args.output} exists, pass --resume to continue it or remove it")
+    done = writer.done_keys() if args.resume else set()
+    items = ((key, item) for key, item in iter_source(args.input, args.npz_key) if key not in done)
+    predictor = load_engine(args.engine, args.model)
+    writer.open()
+    try:
+        count, seconds = classify(items, predictor, writer, args.batch_size, args.workers, args.invert)
+    except KeyboardInterrupt:
+        sys.exit(f"interrupted, the finished batches are in {args.output}; continue with --resume")
+    finally:
+        writer.close()
+    print(f"classified {count} images in {seconds:.1f} s, {count / max(seconds, 1e-9):.0f} images/s"
+          + (f" ({len(done)} already done)" if done else ""))
+
+
+if __name__ == "__main__":
+    main()
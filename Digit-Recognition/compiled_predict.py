@@ -0,0 +1,39 @@
+# Low-overhead inference for the Keras digit models.
+# model.predict() sets up Keras's batching and callback machinery on every call, which dominates the cost of a
+# single 28x28 image. CompiledPredictor traces model(x, training=False) once per batch size bucket with a fixed
+# input signature, warms every bucket up at load, and pads each request up to the nearest bucket, so no call
+# ever retraces.
+import numpy as np
+import tensorflow as tf
+
+DEFAULT_BATCH_SIZES = (1, 8, 32, 128)
+
+
+class CompiledPredictor:
+    def __init__(self, model, batch_sizes=DEFAULT_BATCH_SIZES):
+        self.input_shape = tuple(model.input_shape[1:])
+        self.batch_sizes = sorted(batch_sizes)
+        self.functions = {}
+        for batch_size in self.batch_sizes:
+            function = tf.function(lambda x: model(x, training=False),
+                                   input_signature=[tf.TensorSpec((batch_size,) + self.input_shape, tf.float32)])
+            self.functions[batch_size] = function.get_concrete_function()
+        self.warm_up()
+
+    def warm_up(self):
+        """run every traced batch size once, so the first real request doesn't pay for graph setup"""
+        for batch_size, function in self.functions.items():
+            function(tf.zeros((batch_size,) + self.input_shape, tf.float32))
+
+    def predict(self, x):
+        """(N, 28, 28, 1) float32 array -> (N, 10) numpy probabilities, like model.predict(x, verbose=0)"""
+        x = np.asarray(x, dtype="float32").reshape((-1,) + self.input_shape)
+        largest = self.batch_sizes[-1]
+        outputs = []
+        for start in range(0, len(x), largest):
+            chunk = x[start:start + largest]
+            batch_size = next(b for b in self.batch_sizes if b >= len(chunk))
+            if batch_size != len(chunk):  # pad up to the traced size
+                chunk = np.concatenate([chunk, np.zeros((batch_size - len(chunk),) + self.input_shape, "float32")])
+            outputs.append(self.functions[batch_size](tf.constant(chunk)).numpy()[:len(x) - start])
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs)
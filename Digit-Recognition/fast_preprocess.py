@@ -0,0 +1,99 @@
+# Fast preprocessing of raw canvas pixels, an alternative to the data URI -> PNG -> PIL path.
+# Takes grayscale or RGBA canvas bytes/arrays (single images or batches) or already downsampled 28x28 arrays,
+# and does gray conversion, LANCZOS downsampling, inversion and normalization in one vectorized pass:
+#   out = 1 - R_rows @ pixels @ R_cols.T / 255
+# where R_* are resampling matrices with PIL's Lanczos coefficients. The gray weights are folded into R_cols
+# (so an RGBA canvas is a single (H, W*4) @ (W*4, 28) product), the 1/255 into R_rows, and everything is written
+# into preallocated buffers.
+import numpy as np
+
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype="float32")  # ITU-R 601-2 luma, as PIL's convert("L")
+CHUNK = 4  # canvases cast to float32 at a time for the horizontal pass, keeps the staging buffer in cache
+
+
+def lanczos(x, a=3):
+    return np.where(np.abs(x) < a, np.sinc(x) * np.sinc(x / a), 0.0)
+
+
+def resample_matrix(in_size, out_size, a=3):
+    """(out_size, in_size) matrix of PIL's Lanczos resampling weights, each row sums to 1"""
+    scale = in_size / out_size
+    filter_scale = max(scale, 1.0)
+    support = a * filter_scale
+    centers = (np.arange(out_size) + 0.5) * scale
+    matrix = np.zeros((out_size, in_size))
+    for i, center in enumerate(centers):
+        lo = max(int(center - support + 0.5), 0)
+        hi = min(int(center + support + 0.5), in_size)
+        weights = lanczos((np.arange(lo, hi) - center + 0.5) / filter_scale, a)
+        matrix[i, lo:hi] = weights / weights.sum()
+    return matrix.astype("float32")
+
+
+class CanvasPreprocessor:
+    def __init__(self, height=400, width=400, size=28, max_batch=64):
+        """for canvases of height x width pixels; buffers are allocated once for up to max_batch images"""
+        self.height, self.width, self.size = height, width, size
+        self.row_matrix = resample_matrix(height, size) / 255.0  # (size, height), normalization folded in
+        col_matrix_t = resample_matrix(width, size).T  # (width, size)
+        channel_weights = {1: np.ones(1, "float32"), 3: GRAY_WEIGHTS, 4: np.append(GRAY_WEIGHTS, 0.0)}
+        self.col_matrices = {  # (width * channels, size), alpha is ignored like PIL's convert("L")
+            channels: np.ascontiguousarray((col_matrix_t[:, None, :] * weights[None, :, None])
+                                           .reshape(width * channels, size), dtype="float32")
+            for channels, weights in channel_weights.items()}
+        self._allocate(max_batch)
+
+    def _allocate(self, batch):
+        self.max_batch = batch
+        self.pixels = np.empty(CHUNK * self.height * self.width * 4, "float32")  # room for RGBA
+        self.columns = np.empty((batch, self.height, self.size), "float32")
+        self.out = np.empty((batch, self.size, self.size, 1), "float32")
+
+    def from_bytes(self, data, channels=None):
+        """
+        raw canvas bytes (e.g. ctx.getImageData().data, RGBA) -> normalized (N, 28, 28, 1) array. A batch needs its
+        channels; with channels=None the bytes are one image, RGBA, RGB, gray or already downsampled 28x28 gray
+        told apart by their size.
+        """
+        pixels = np.frombuffer(data, dtype=np.uint8)
+        if channels is None:
+            layouts = {self.height * self.width * 4: (self.height, self.width, 4),
+                       self.height * self.width * 3: (self.height, self.width, 3),
+                       self.height * self.width: (self.height, self.width), self.size * self.size: (self.size, self.size)}
+            if len(pixels) not in layouts:
+                raise ValueError(f"expected {self.height}x{self.width} RGBA, RGB or gray or {self.size}x{self.size} "
+                                 f"gray bytes, got {len(pixels)} bytes")
+            return self(pixels.reshape(layouts[len(pixels)]))
+        return self(pixels.reshape(-1, self.height, self.width, channels) if channels > 1
+                    else pixels.reshape(-1, self.height, self.width))
+
+    def __call__(self, pixels):
+        """
+        pixels: uint8 canvas, black drawing on white: (H, W), (H, W, 4|3), or batches (N, H, W), (N, H, W, 4|3);
+        or already downsampled (28, 28) / (N, 28, 28). Returns (N, 28, 28, 1) float32, white digit on black.
+        The result is a view of an internal buffer, valid until the next call.
+        """
+        pixels = np.asarray(pixels)
+        color = pixels.ndim in (3, 4) and pixels.shape[-1] in (3, 4) and pixels.shape[-2] != self.size
+        if pixels.ndim == (3 if color else 2):
+            pixels = pixels[None]
+        n = len(pixels)
+        if n > self.max_batch:
+            self._allocate(n)
+        out = self.out[:n]
+        if pixels.shape[1:3] == (self.size, self.size):  # already downsampled: only invert and normalize
+            np.multiply(pixels.reshape(n, self.size, self.size, 1), 1 / 255.0, out=out, casting="unsafe")
+            return np.subtract(1.0, out, out=out)
+        if pixels.shape[1:3] != (self.height, self.width):
+            raise ValueError(f"expected {self.height}x{self.width} canvases, got {pixels.shape[1:3]}")
+        col_matrix = self.col_matrices[pixels.shape[3] if color else 1]
+        columns = self.columns[:n]
+        for start in range(0, n, CHUNK):
+            chunk = pixels[start:start + CHUNK].reshape(-1, len(col_matrix))  # (chunk * H, W * channels)
+            flat = self.pixels[:chunk.size].reshape(chunk.shape)
+            np.copyto(flat, chunk, casting="unsafe")
+            np.matmul(flat, col_matrix, out=columns[start:start + CHUNK].reshape(-1, self.size))  # gray too
+        np.clip(columns, 0.0, 255.0, out=columns)  # PIL stores the horizontal pass as 8 bit, clipping the overshoot
+        np.matmul(self.row_matrix, columns, out=out[..., 0])  # (n, 28, 28), already divided by 255
+        np.subtract(1.0, out, out=out)
+        return np.clip(out, 0.0, 1.0, out=out)  # same for the overshoot of the vertical pass
@@ -0,0 +1,121 @@
+# Post-training int8 quantization of the NumPy digit CNN (numpy_cnn.py), and its CPU inference path.
+# quantize_npz() turns a float .npz from numpy_cnn.export_npz() into an int8 one:
+#   - weights: symmetric, one scale per output channel, w ~ w_scale * w_q with w_q in [-127, 127]
+#   - activations: one symmetric scale per conv/dense input, from the activation range on a calibration set
+#     (a held-out MNIST slice, see mnist_data.held_out_slice)
+# Int8DigitModel quantizes the input of every conv/dense layer, multiplies the integers and rescales the
+# accumulator by input_scale * w_scale. The products run through float32 BLAS: with |x_q|, |w_q| <= 127 every
+# partial sum is an integer below 2**24 as long as the reduction is at most MAX_EXACT_DEPTH long (576 at most in
+# this model), so the result is exactly that of int32 accumulation.
+#
+#   python int8_cnn.py digit_model.npz digit_model_int8.npz          (calibration needs MNIST, see mnist_data.py)
+import json, argparse
+import numpy as np
+
+from numpy_cnn import FORMAT_VERSION, ACTIVATIONS, NumpyDigitModel, im2col
+
+QMAX = 127
+MAX_EXACT_DEPTH = 2 ** 24 // QMAX ** 2  # 1040
+
+
+def quantize(x, scale):
+    """float array -> integer valued float32 array in [-QMAX, QMAX]"""
+    q = x / np.float32(scale)
+    np.rint(q, out=q)
+    return np.clip(q, -QMAX, QMAX, out=q)
+
+
+def calibrate(model, x, percentile=100.0, batch_size=500):
+    """{layer index: range of its input} for every conv/dense layer of a NumpyDigitModel, over the batches of x"""
+    ranges = {}
+    for start in range(0, len(x), batch_size):
+        h = np.asarray(x[start:start + batch_size], dtype="float32").reshape((-1,) + model.input_shape)
+        for i, layer in enumerate(model.layers):
+            if layer["type"] in ("conv", "dense"):
+                value = np.abs(h).max() if percentile >= 100 else np.percentile(np.abs(h), percentile)
+                ranges[i] = max(ranges.get(i, 0.0), float(value))
+            h = model.run_layer(layer, h)
+    return ranges
+
+
+def quantize_npz(float_path, calibration_x, path, percentile=100.0):
+    """write the int8 version of the float model at float_path to path, calibrated on calibration_x"""
+    ranges = calibrate(NumpyDigitModel(float_path), calibration_x, percentile)
+    arrays = {}
+    with np.load(float_path) as data:
+        spec = json.loads(str(data["spec"]))
+        for i, layer in enumerate(spec["layers"]):
+            if layer["type"] not in ("conv", "dense"):
+                continue
+            kernel = data[f"{i}_kernel"]  # (kh, kw, cin, cout) or (in, out)
+            w_scale = np.abs(kernel).reshape(-1, kernel.shape[-1]).max(axis=0) / QMAX
+            w_scale[w_scale == 0] = 1.0  # an all-zero channel
+            arrays[f"{i}_kernel"] = np.rint(kernel / w_scale).astype(np.int8)
+            arrays[f"{i}_kernel_scale"] = w_scale.astype("float32")
+            arrays[f"{i}_bias"] = data[f"{i}_bias"]  # float32, added after rescaling the accumulator
+            layer["input_scale"] = (ranges[i] or 1.0) / QMAX
+    spec["dtype"] = "int8"
+    np.savez(path, spec=np.array(json.dumps(spec)), **arrays)
+
+
+class Int8DigitModel(NumpyDigitModel):
+    def __init__(self, path):
+        with np.load(path) as data:
+            spec = json.loads(str(data["spec"]))
+            if spec["version"] != FORMAT_VERSION or spec.get("dtype") != "int8":
+                raise ValueError(f"{path}: not an int8 model of format version {FORMAT_VERSION}")
+            self.input_shape = tuple(spec["input_shape"])
+            self.layers = []
+            for i, layer in enumerate(spec["layers"]):
+                layer = dict(layer)
+                if layer["type"] in ("conv", "dense"):
+                    kernel = data[f"{i}_kernel"]
+                    if layer["type"] == "conv":
+                        kh, kw, cin, cout = kernel.shape
+                        layer["kernel_size"] = (kh, kw)
+                        kernel = kernel.transpose(2, 0, 1, 3).reshape(cin * kh * kw, cout)  # im2col row order
+                    if len(kernel) > MAX_EXACT_DEPTH:
+                        raise ValueError(f"{path}: layer {i} reduces over {len(kernel)} inputs, float32 "
+                                         f"accumulation is only exact up to {MAX_EXACT_DEPTH}")
+                    layer["weights"] = np.ascontiguousarray(kernel, dtype="float32")  # integer valued, for BLAS
+                    layer["output_scale"] = np.float32(layer["input_scale"]) * data[f"{i}_kernel_scale"]
+                    layer["bias"] = data[f"{i}_bias"]
+                self.layers.append(layer)
+
+    def run_layer(self, layer, x):
+        if layer["type"] not in ("conv", "dense"):
+            return super().run_layer(layer, x)  # pooling and flattening commute with quantization
+        q = quantize(x, layer["input_scale"])
+        if layer["type"] == "conv":
+            patches, (oh, ow) = im2col(q, layer["kernel_size"])
+            acc = (patches @ layer["weights"]).reshape(len(q), oh, ow, -1)
+        else:
+            acc = q @ layer["weights"]
+        acc *= layer["output_scale"]
+        acc += layer["bias"]
+        return ACTIVATIONS[layer["activation"]](acc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize a NumPy digit model (.npz) to int8")
+    parser.add_argument("model", help="float .npz written by numpy_cnn.py")
+    parser.add_argument("output", help="output int8 .npz file")
+    parser.add_argument("--mnist", help="local mnist.npz instead of keras.datasets (or set MNIST_NPZ)")
+    parser.add_argument("--calibration-size", type=int, default=1000, help="images of the held-out slice to use")
+    parser.add_argument("--percentile", type=float, default=99.99,
+                        help="activation range percentile, below 100 clips outliers")
+    args = parser.parse_args()
+
+    import mnist_data
+    (x_train, y_train), _ = mnist_data.load_mnist(args.mnist)
+    x_calibration, y_calibration = mnist_data.held_out_slice(x_train, y_train, args.calibration_size)
+    x_calibration = mnist_data.normalize(x_calibration)
+    quantize_npz(args.model, x_calibration, args.output, args.percentile)
+    float_pred = NumpyDigitModel(args.model).predict(x_calibration).argmax(axis=1)
+    int8_pred = Int8DigitModel(args.output).predict(x_calibration).argmax(axis=1)
+    print(f"wrote {args.output}, top-1 agreement with the float model on the calibration slice: "
+          f"{(float_pred == int8_pred).mean():.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,12 +9,43 @@ Original file is located at
 
 # Compressed Colab handwritten digit recognizer — keeps original logic.
 # Put a GitHub raw .h5 URL into MODEL_URLS if you want Colab to fetch it.
-import os, io, base64, json, requests
+import os, io, base64, json, requests, threading
 import numpy as np
 from PIL import Image
 import tensorflow as tf
 from tensorflow import keras
 from IPython.display import HTML, display
+# helper modules from this folder; a notebook run without them falls back to the original inline code
+try:
+    from compiled_predict import CompiledPredictor
+except ImportError:  # plain model.predict
+    class CompiledPredictor:
+        def __init__(self, model):
+            self.model = model
+
+        def predict(self, x):
+            return self.model.predict(x, verbose=0)
+try:
+    from fast_preprocess import CanvasPreprocessor
+except ImportError:  # no raw-pixel fast path, predict_b64 only
+    CanvasPreprocessor = None
+try:
+    from prediction_cache import PredictionCache
+except ImportError:  # every submission runs the model
+    class PredictionCache:
+        def get_or_predict(self, submission, preprocess, predict):
+            return predict(preprocess(submission))
+try:
+    from stage_timing import StageTimer
+except ImportError:  # nothing is timed
+    from contextlib import nullcontext
+
+    class StageTimer:
+        def stage(self, name):
+            return nullcontext()
+
+        def stats(self):
+            return {}
 
 MODEL_PATH = "/content/digit_model.h5"
 MODEL_URLS = [
@@ -45,26 +76,52 @@ class Recognizer:
             raise FileNotFoundError(f"No model at {self.path}. Set MODEL_URLS or upload file.")
         print("loading model...", end=" ")
         self.model = keras.models.load_model(self.path)
+        self.predictor = CompiledPredictor(self.model)  # traced + warmed up, used instead of model.predict
+        self.canvas = CanvasPreprocessor(400, 400) if CanvasPreprocessor else None  # size of the drawing canvas in the UI
+        self.canvas_lock = threading.Lock()  # the preprocessor reuses its buffers
+        self.cache = PredictionCache()  # repeated Predict clicks on the same drawing skip inference
+        self.timings = StageTimer()  # per-stage latency histograms if DIGIT_STAGE_TIMING=1, see timings.stats()
         print("done.")
 
-    def predict_b64(self, data_uri):
-        try:
+    def preprocess_b64(self, data_uri):
+        """canvas PNG data URI -> normalized 28x28 float32 array (white digit on black, like MNIST)"""
+        with self.timings.stage("base64_decode"):
             b = base64.b64decode(data_uri.split(",",1)[1])
+        with self.timings.stage("image_decode"):
             img = Image.open(io.BytesIO(b)).convert("L")
+        with self.timings.stage("resize"):
             resample = getattr(Image, "Resampling", Image).LANCZOS if hasattr(Image, "Resampling") or hasattr(Image, "LANCZOS") else Image.ANTIALIAS
             img = img.resize((28,28), resample)
+        with self.timings.stage("to_array"):
             arr = 255 - np.array(img).astype("float32")  # invert (canvas vs MNIST)
-            arr = arr / 255.0
-            arr = arr.reshape(1,28,28,1)
-            pred = self.model.predict(arr, verbose=0)[0]
-            digit = int(np.argmax(pred))
-            conf = float(np.max(pred))
-            return {"digit": digit, "confidence": conf, "all_predictions": pred.tolist()}
+            return arr / 255.0
+
+    def predict_batch(self, arrs):
+        """one forward pass for a list of preprocessed 28x28 arrays -> list of result dicts"""
+        with self.timings.stage("predict"):
+            preds = self.predictor.predict(np.asarray(arrs, dtype="float32").reshape(-1,28,28,1))
+        return [{"digit": int(np.argmax(p)), "confidence": float(np.max(p)), "all_predictions": p.tolist()} for p in preds]
+
+    def predict_pixels(self, pixels):
+        """fast path without PNG/PIL: raw 400x400 canvas pixels (gray or RGBA), a batch of them, or already
+        downsampled 28x28 arrays -> list of result dicts"""
+        if self.canvas is None:
+            raise RuntimeError("predict_pixels needs fast_preprocess.py next to this notebook")
+        with self.canvas_lock:
+            with self.timings.stage("fast_preprocess"):
+                arrs = self.canvas(pixels)
+            return self.predict_batch(arrs)
+
+    def predict_b64(self, data_uri):
+        try:
+            with self.timings.stage("total"):
+                return self.cache.get_or_predict(data_uri, self.preprocess_b64, lambda arr: self.predict_batch([arr])[0])
         except Exception as e:
             return {"error": str(e)}
 
-# instantiate (will try to download if MODEL_URLS provided)
-recognizer = Recognizer()
+# instantiate (will try to download if MODEL_URLS provided); importing the module only defines Recognizer
+if __name__ == "__main__":
+    recognizer = Recognizer()
 
 # Minimal JS + HTML interface (keeps same behavior)
 js = r"""
@@ -152,11 +209,12 @@ def predict_digit(data_uri):
         code = f"updateResult({r['digit']},{r['confidence']},{json.dumps(r['all_predictions'])});"
     display(HTML(f"<script>{code}</script>"))
 
-# register callback (if in Colab)
-try:
-    from google.colab import output
-    output.register_callback('predict_digit', predict_digit)
-except Exception:
-    print("⚠️ Not in Colab — callback registration skipped.")
+# register callback (if in Colab) and show the UI
+if __name__ == "__main__":
+    try:
+        from google.colab import output
+        output.register_callback('predict_digit', predict_digit)
+    except Exception:
+        print("⚠️ Not in Colab — callback registration skipped.")
 
-display(HTML(html))
\ No newline at end of file
+    display(HTML(html))
\ No newline at end of file
@@ -0,0 +1,39 @@
+# MNIST loading shared by the offline tools (quantization, benchmarks, bulk runs).
+# Uses keras.datasets (downloaded once to ~/.keras/datasets) unless a local mnist.npz is given, either as an
+# argument or in the MNIST_NPZ environment variable, so the tools also work on machines without internet access.
+import os
+import numpy as np
+
+MNIST_URL = "https://storage.googleapis.com/tensorflow/tf-keras-datasets/mnist.npz"  # where keras.datasets gets it
+HOLDOUT_FRACTION = 0.1  # TRAINING_CONFIG['validation_split']: Keras holds out the last 10% of the training set
+
+
+def load_mnist(path=None):
+    """((x_train, y_train), (x_test, y_test)) as uint8 images (N, 28, 28) and uint8 labels, like keras"""
+    path = path or os.environ.get("MNIST_NPZ")
+    if path:
+        with np.load(path) as data:
+            return (data["x_train"], data["y_train"]), (data["x_test"], data["y_test"])
+    from tensorflow import keras
+    return keras.datasets.mnist.load_data()
+
+
+def mnist_path(path=None):
+    """the mnist.npz load_mnist reads: path, MNIST_NPZ or keras.datasets' copy (downloaded if it isn't there yet)"""
+    path = path or os.environ.get("MNIST_NPZ")
+    if path:
+        return path
+    from tensorflow import keras
+    return keras.utils.get_file("mnist.npz", origin=MNIST_URL)
+
+
+def held_out_slice(x_train, y_train, size=None):
+    """the tail of the training set that model.fit(validation_split=0.1) never trained on (optionally its first size)"""
+    start = len(x_train) - int(len(x_train) * HOLDOUT_FRACTION)
+    stop = len(x_train) if size is None else min(start + size, len(x_train))
+    return x_train[start:stop], y_train[start:stop]
+
+
+def normalize(x):
+    """uint8 (N, 28, 28) -> float32 (N, 28, 28, 1) in [0, 1], the model input"""
+    return (x.astype("float32") / 255.0).reshape(-1, 28, 28, 1)
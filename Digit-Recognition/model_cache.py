@@ -0,0 +1,79 @@
+# Trained model artifact cache for the digit recognizers.
+# A trained model is stored under a key hashed from its architecture, training hyperparameters and dataset
+# version, so a later run with the same setup loads it in seconds instead of training again.
+import os, json, hashlib, tempfile
+from tensorflow import keras
+
+import mnist_data
+
+CACHE_DIR = os.environ.get("DIGIT_MODEL_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "digit_recognition"))
+
+
+def architecture_spec(model):
+    """Layer types and configs of a model without the generated layer names, which differ between sessions"""
+    layers = [[layer.__class__.__name__, {k: v for k, v in layer.get_config().items() if k != "name"}]
+              for layer in model.layers]
+    return {"input_shape": list(model.input_shape), "layers": layers}
+
+
+def dataset_version(mnist_path=None):
+    """sha256 of the MNIST file the model is trained from (see mnist_data.mnist_path), read when the key is built"""
+    digest = hashlib.sha256()
+    with open(mnist_data.mnist_path(mnist_path), "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"mnist.npz:{digest.hexdigest()}"
+
+
+def model_key(model, training_config, dataset_version):
+    """Hash of everything that determines the trained weights"""
+    spec = {"architecture": architecture_spec(model), "training": training_config, "dataset": dataset_version}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cache_path(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"digit_cnn_{key[:24]}.keras")
+
+
+def load_cached_model(key, cache_dir=CACHE_DIR):
+    """Return the cached model for the key, or None if there is none (or it can't be read)"""
+    path = cache_path(key, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        return keras.models.load_model(path)
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable cached model {path}: {e}")
+        return None
+
+
+def save_cached_model(model, key, cache_dir=CACHE_DIR):
+    """Write the model atomically: to a temporary file first, then renamed, so readers never see a partial file"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(key, cache_dir)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".keras")
+    os.close(fd)
+    try:
+        model.save(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def load_shipped_model(paths, reference_model):
+    """Load the first existing pre-trained model file (like the repo's digit_model.h5) whose architecture matches"""
+    reference = json.dumps(architecture_spec(reference_model), sort_keys=True, default=str)
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        try:
+            model = keras.models.load_model(path)
+        except Exception as e:
+            print(f"⚠️ Could not read {path}: {e}")
+            continue
+        if json.dumps(architecture_spec(model), sort_keys=True, default=str) == reference:
+            return model
+        print(f"⚠️ {path} has a different architecture, not used")
+    return None
@@ -0,0 +1,144 @@
+# NumPy-only inference for the digit CNN, no TensorFlow import needed to serve predictions.
+# export_npz() extracts the Conv2D / MaxPooling2D / Flatten / Dense weights of the Keras model into a compact .npz
+# (Dropout is a no-op at inference), NumpyDigitModel runs the forward pass with im2col convolutions: every
+# receptive field becomes a row of a patch matrix, so each conv layer is one matrix multiplication.
+#
+#   python numpy_cnn.py digit_model.h5 digit_model.npz     (needs TensorFlow, once)
+import json, argparse
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+FORMAT_VERSION = 1
+
+
+def export_npz(model, path):
+    """write the inference weights of a Keras Sequential model to path (.npz)"""
+    layers, arrays = [], {}
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        config = layer.get_config()
+        if kind == "Conv2D":
+            if tuple(config["strides"]) != (1, 1) or config["padding"] != "valid" or tuple(config["dilation_rate"]) != (1, 1):
+                raise ValueError(f"{layer.name}: only stride 1, valid padding, no dilation is supported")
+            kernel, bias = layer.get_weights()
+            arrays[f"{len(layers)}_kernel"], arrays[f"{len(layers)}_bias"] = kernel, bias
+            layers.append({"type": "conv", "activation": config["activation"]})
+        elif kind == "MaxPooling2D":
+            if tuple(config["pool_size"]) != tuple(config["strides"]) or config["padding"] != "valid":
+                raise ValueError(f"{layer.name}: only non-overlapping valid pooling is supported")
+            layers.append({"type": "maxpool", "pool_size": list(config["pool_size"])})
+        elif kind == "Flatten":
+            layers.append({"type": "flatten"})
+        elif kind == "Dense":
+            kernel, bias = layer.get_weights()
+            arrays[f"{len(layers)}_kernel"], arrays[f"{len(layers)}_bias"] = kernel, bias
+            layers.append({"type": "dense", "activation": config["activation"]})
+        elif kind in ("Dropout", "InputLayer"):
+            continue
+        else:
+            raise ValueError(f"{layer.name}: unsupported layer type {kind}")
+    spec = {"version": FORMAT_VERSION, "input_shape": list(model.input_shape[1:]), "layers": layers}
+    np.savez(path, spec=np.array(json.dumps(spec)), **{k: v.astype("float32") for k, v in arrays.items()})
+
+
+def relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    np.exp(x, out=x)
+    return x / x.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {"relu": relu, "softmax": softmax, "linear": lambda x: x}
+
+
+def im2col(x, kernel_size):
+    """(n, h, w, c) -> (n * oh * ow, c * kh * kw) patch matrix with rows ordered (c, kh, kw), and (oh, ow)"""
+    n, h, w, c = x.shape
+    kh, kw = kernel_size
+    patches = sliding_window_view(x, (kh, kw), axis=(1, 2))  # (n, h-kh+1, w-kw+1, c, kh, kw) view
+    return patches.reshape(n * (h - kh + 1) * (w - kw + 1), c * kh * kw), (h - kh + 1, w - kw + 1)  # the one copy
+
+
+class NumpyDigitModel:
+    def __init__(self, path):
+        with np.load(path) as data:
+            spec = json.loads(str(data["spec"]))
+            if spec["version"] != FORMAT_VERSION:
+                raise ValueError(f"{path}: format version {spec['version']}, expected {FORMAT_VERSION}")
+            if spec.get("dtype", "float32") != "float32":
+                raise ValueError(f"{path}: {spec['dtype']} weights, load it with int8_cnn.Int8DigitModel")
+            self.input_shape = tuple(spec["input_shape"])
+            self.layers = []
+            for i, layer in enumerate(spec["layers"]):
+                layer = dict(layer)
+                if layer["type"] == "conv":
+                    kernel = data[f"{i}_kernel"]  # (kh, kw, cin, cout)
+                    kh, kw, cin, cout = kernel.shape
+                    # rows ordered (cin, kh, kw) like the patches of sliding_window_view, so im2col needs no transpose
+                    layer["weights"] = np.ascontiguousarray(kernel.transpose(2, 0, 1, 3).reshape(cin * kh * kw, cout))
+                    layer["kernel_size"] = (kh, kw)
+                    layer["bias"] = data[f"{i}_bias"]
+                elif layer["type"] == "dense":
+                    layer["weights"] = data[f"{i}_kernel"]
+                    layer["bias"] = data[f"{i}_bias"]
+                self.layers.append(layer)
+
+    @classmethod
+    def from_layers(cls, input_shape, layers):
+        """a model over already prepared layers, e.g. views of a shared memory-mapped file (see worker_pool.py)"""
+        model = cls.__new__(cls)
+        model.input_shape, model.layers = tuple(input_shape), layers
+        return model
+
+    def run_layer(self, layer, x):
+        kind = layer["type"]
+        if kind == "conv":
+            patches, (oh, ow) = im2col(x, layer["kernel_size"])
+            x = (patches @ layer["weights"]).reshape(len(x), oh, ow, -1)
+            x += layer["bias"]
+            x = ACTIVATIONS[layer["activation"]](x)
+        elif kind == "maxpool":
+            n, h, w, c = x.shape
+            ph, pw = layer["pool_size"]
+            x = x[:, :h // ph * ph, :w // pw * pw].reshape(n, h // ph, ph, w // pw, pw, c).max(axis=(2, 4))
+        elif kind == "flatten":
+            x = x.reshape(x.shape[0], -1)
+        elif kind == "dense":
+            x = x @ layer["weights"]
+            x += layer["bias"]
+            x = ACTIVATIONS[layer["activation"]](x)
+        return x
+
+    def forward(self, x):
+        """x: float32 (N, 28, 28, 1) -> class probabilities (N, 10)"""
+        for layer in self.layers:
+            x = self.run_layer(layer, x)
+        return x
+
+    def predict(self, x, batch_size=256):
+        """like keras Model.predict: (N, 28, 28) or (N, 28, 28, 1) array -> (N, 10) probabilities"""
+        x = np.asarray(x, dtype="float32").reshape((-1,) + self.input_shape)
+        if len(x) <= batch_size:
+            return self.forward(x)
+        return np.concatenate([self.forward(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a Keras digit model to the NumPy .npz format")
+    parser.add_argument("model", help="Keras model file, e.g. digit_model.h5")
+    parser.add_argument("output", help="output .npz file")
+    args = parser.parse_args()
+
+    from tensorflow import keras
+    model = keras.models.load_model(args.model, compile=False)
+    export_npz(model, args.output)
+    x = np.random.default_rng(0).random((64,) + tuple(model.input_shape[1:]), dtype="float32")
+    diff = np.abs(model.predict(x, verbose=0) - NumpyDigitModel(args.output).predict(x)).max()
+    print(f"wrote {args.output}, max abs difference to Keras on random inputs: {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Bounded LRU cache of prediction results for repeated canvas submissions.
+# A submission is first looked up by a hash of its raw bytes (the data URI as sent), so clicking Predict again on
+# the same drawing returns without decoding. Otherwise it is preprocessed and looked up by a hash of the
+# downsampled 28x28 array, which catches submissions that differ in encoding but not in the pixels the model sees.
+# Results are stored once per distinct array, so max_entries counts distinct predictions; submission keys are
+# aliases to an array key (a separate LRU of the same size, 16 byte keys). Callers get their own copy of a result.
+import copy, hashlib, threading
+from collections import OrderedDict
+import numpy as np
+
+
+def content_key(data):
+    """16 byte BLAKE2b digest of a str, bytes or array (including its dtype and shape)"""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(data, np.ndarray):
+        data = np.ascontiguousarray(data)
+        h.update(f"array{data.dtype.str}{data.shape}".encode())
+        h.update(data.data)
+    else:
+        h.update(b"raw")
+        h.update(data.encode() if isinstance(data, str) else data)
+    return h.digest()
+
+
+class PredictionCache:
+    def __init__(self, max_entries=1024):
+        """keeps the results of up to max_entries distinct drawings"""
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # array key -> result
+        self.aliases = OrderedDict()  # submission key -> array key
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _lookup(table, key):
+        value = table.get(key)
+        if value is not None:
+            table.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _insert(table, key, value, max_entries):
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > max_entries:
+            table.popitem(last=False)
+
+    def _get(self, array_key):
+        with self.lock:
+            return self._lookup(self.entries, array_key)
+
+    def _get_submission(self, submission_key):
+        with self.lock:
+            array_key = self._lookup(self.aliases, submission_key)
+            return None if array_key is None else self._lookup(self.entries, array_key)
+
+    def _put(self, submission_key, array_key, result=None):
+        with self.lock:
+            if result is not None:
+                self._insert(self.entries, array_key, result, self.max_entries)
+            self._insert(self.aliases, submission_key, array_key, self.max_entries)
+
+    def get_or_predict(self, submission, preprocess, predict):
+        """
+        result for a submission: preprocess(submission) -> 28x28 array and predict(array) only run on a miss.
+        The result is the caller's own copy, changing it does not change the cached one.
+        """
+        submission_key = content_key(submission)
+        result = self._get_submission(submission_key)
+        if result is None:
+            arr = preprocess(submission)
+            array_key = content_key(arr)
+            result = self._get(array_key)
+            if result is None:
+                with self.lock:
+                    self.misses += 1
+                result = predict(arr)
+                self._put(submission_key, array_key, copy.deepcopy(result))
+                return result
+            self._put(submission_key, array_key)
+        with self.lock:
+            self.hits += 1
+        return copy.deepcopy(result)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "entries": len(self.entries), "aliases": len(self.aliases), "max_entries": self.max_entries}
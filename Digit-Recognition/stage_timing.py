@@ -0,0 +1,78 @@
+# Optional per-stage latency histograms for the prediction path (base64 decoding, image decoding, resizing, array
+# conversion, inference, ...). Enabled without code changes by setting DIGIT_STAGE_TIMING=1; when it is off,
+# stage() hands out a shared no-op context manager, so the instrumented code costs next to nothing.
+#
+#   DIGIT_STAGE_TIMING=1 python batch_server.py      then   curl localhost:8500/metrics
+#   recognizer.timings.stats()                       -> {stage: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}
+import os, time, bisect, threading
+from contextlib import nullcontext
+
+ENABLED = os.environ.get("DIGIT_STAGE_TIMING", "").lower() not in ("", "0", "false", "no")
+NO_TIMING = nullcontext()
+
+
+class LatencyHistogram:
+    def __init__(self, smallest=1e-6, growth=1.05, buckets=380):
+        """log-spaced buckets from 1 us to ~110 s, each 5% wider than the last: percentiles are within 5%"""
+        self.bounds = [smallest * growth ** i for i in range(buckets)]
+        self.counts = [0] * (buckets + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """upper bound of the bucket holding the q-quantile (0 < q <= 1), in seconds"""
+        target = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if count and cumulative >= target:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return 0.0
+
+
+class _Stage:
+    def __init__(self, timer, name):
+        self.timer, self.name = timer, name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+
+
+class StageTimer:
+    def __init__(self, enabled=None):
+        """enabled defaults to the DIGIT_STAGE_TIMING environment variable"""
+        self.enabled = ENABLED if enabled is None else enabled
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        """context manager timing one run of the named stage"""
+        return _Stage(self, name) if self.enabled else NO_TIMING
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def stats(self):
+        with self.lock:
+            return {name: {"count": h.count, "mean_ms": h.total / h.count * 1000,
+                           "p50_ms": h.percentile(0.50) * 1000, "p95_ms": h.percentile(0.95) * 1000,
+                           "p99_ms": h.percentile(0.99) * 1000, "max_ms": h.max * 1000}
+                    for name, h in self.histograms.items()}
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
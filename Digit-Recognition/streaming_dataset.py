@@ -0,0 +1,89 @@
+# Streaming training input for the digit CNN.
+# Images live on disk as uint8 .npy files that are memory-mapped, never loaded whole: a tf.data pipeline shuffles
+# only the indices, gathers each batch from the memmap in parallel map calls, converts it to float32 per batch and
+# prefetches, so reading overlaps with training and memory stays at a few batches regardless of the corpus size.
+# Labels stay sparse integers (use sparse_categorical_crossentropy).
+#
+#   (x_train, y_train), (x_test, y_test) = mnist_memmap()      # converts MNIST once, then only maps it
+#   train, validation = training_datasets(x_train, y_train, batch_size=128, validation_split=0.1)
+#   model.fit(train, validation_data=validation, epochs=3)
+import os, tempfile
+import numpy as np
+import tensorflow as tf
+
+import mnist_data
+
+DATA_DIR = os.environ.get("DIGIT_DATA_DIR",
+                          os.path.join(os.path.expanduser("~"), ".cache", "digit_recognition", "data"))
+
+
+def memmap_paths(directory, name):
+    return os.path.join(directory, f"{name}_images.npy"), os.path.join(directory, f"{name}_labels.npy")
+
+
+def write_memmap(directory, name, chunks, count, image_shape=(28, 28)):
+    """write (images, labels) chunks totalling count examples as uint8 .npy files, without holding them all"""
+    os.makedirs(directory, exist_ok=True)
+    outputs = []  # (memmap, temporary path, final path) for images and labels
+    for path, shape in zip(memmap_paths(directory, name), ((count,) + tuple(image_shape), (count,))):
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npy.tmp")
+        os.close(fd)
+        outputs.append((np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=shape), tmp_path, path))
+    (images_out, _, _), (labels_out, _, _) = outputs
+    start = 0
+    for images, labels in chunks:
+        images_out[start:start + len(images)] = images
+        labels_out[start:start + len(images)] = labels
+        start += len(images)
+    if start != count:
+        raise ValueError(f"{name}: got {start} examples, expected {count}")
+    del images_out, labels_out
+    for array, tmp_path, path in outputs:  # complete files only appear under the final names
+        array.flush()
+        os.replace(tmp_path, path)
+
+
+def open_memmap(directory, name):
+    """(images, labels) of a dataset written by write_memmap, read-only memmaps"""
+    images_path, labels_path = memmap_paths(directory, name)
+    return np.load(images_path, mmap_mode="r"), np.load(labels_path, mmap_mode="r")
+
+
+def mnist_memmap(directory=DATA_DIR, mnist_path=None):
+    """((x_train, y_train), (x_test, y_test)) MNIST memmaps, converted from mnist_data.load_mnist on first use"""
+    if not all(os.path.exists(p) for name in ("mnist_train", "mnist_test") for p in memmap_paths(directory, name)):
+        (x_train, y_train), (x_test, y_test) = mnist_data.load_mnist(mnist_path)
+        write_memmap(directory, "mnist_train", [(x_train, y_train)], len(x_train))
+        write_memmap(directory, "mnist_test", [(x_test, y_test)], len(x_test))
+        del x_train, y_train, x_test, y_test
+    return open_memmap(directory, "mnist_train"), open_memmap(directory, "mnist_test")
+
+
+def make_dataset(images, labels, batch_size=128, start=0, stop=None, shuffle=False, seed=None):
+    """tf.data pipeline of (float32 (b, H, W, 1) in [0, 1], int32 (b,)) batches over images[start:stop]"""
+    stop = len(images) if stop is None else stop
+    image_shape = tuple(images.shape[1:])
+
+    def load_batch(indices):
+        indices = np.sort(indices)  # forward reads through the memmap, the order within a batch doesn't matter
+        return images[indices], labels[indices].astype(np.int32)
+
+    def normalize(x, y):
+        x = tf.reshape(tf.cast(x, tf.float32) / 255.0, (-1,) + image_shape + (1,))
+        return x, tf.ensure_shape(y, (None,))
+
+    dataset = tf.data.Dataset.range(start, stop)
+    if shuffle:  # only the indices are shuffled, 8 bytes per example
+        dataset = dataset.shuffle(stop - start, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(lambda indices: tf.numpy_function(load_batch, [indices], (tf.uint8, tf.int32)),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.map(normalize, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def training_datasets(images, labels, batch_size=128, validation_split=0.1, seed=None):
+    """(train, validation) datasets, the validation set is the tail like model.fit(validation_split=...)"""
+    split = len(images) - int(len(images) * validation_split)
+    return (make_dataset(images, labels, batch_size, 0, split, shuffle=True, seed=seed),
+            make_dataset(images, labels, batch_size, split, len(images)))
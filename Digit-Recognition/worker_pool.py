@@ -0,0 +1,308 @@
+# Multi-process inference for the digit CNN on the NumPy engine (numpy_cnn.py / int8_cnn.py).
+# The model weights are exported once, already in the layout the forward pass uses, to one flat file that every
+# worker process maps read-only: the weights live once in the page cache however many workers run, and workers
+# never import TensorFlow. A dispatcher sends each request to the worker with the fewest outstanding requests;
+# a worker preprocesses (canvas data URI or raw pixel bytes) and classifies whatever is queued for it in one batch.
+#
+#   python worker_pool.py --workers 1,2,4 --duration 10      throughput scaling and RSS per worker
+#   python batch_server.py --workers 4                      serve through a pool
+import os, io, json, time, base64, queue, random, argparse, tempfile, threading, itertools, multiprocessing
+from concurrent.futures import Future
+import numpy as np
+
+from stage_timing import StageTimer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ALIGN = 64  # byte alignment of every array in the shared file
+
+
+def _write_atomic(path, data, mode="wb"):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def export_shared_weights(model, path):
+    """write the prepared layer arrays of a NumpyDigitModel / Int8DigitModel to path and their layout to path.json"""
+    layers, chunks, offset = [], [], 0
+    for layer in model.layers:
+        entry = {"config": {}, "arrays": {}}
+        for key, value in layer.items():
+            if isinstance(value, np.ndarray):
+                padding = -offset % ALIGN
+                chunks.append(b"\0" * padding)
+                offset += padding
+                entry["arrays"][key] = {"offset": offset, "shape": list(value.shape), "dtype": value.dtype.str}
+                chunks.append(np.ascontiguousarray(value).tobytes())
+                offset += value.nbytes
+            else:
+                entry["config"][key] = value
+        layers.append(entry)
+    layout = {"engine": type(model).__name__, "input_shape": list(model.input_shape), "layers": layers}
+    _write_atomic(path, b"".join(chunks))
+    _write_atomic(path + ".json", json.dumps(layout), "w")
+
+
+def load_shared_model(path):
+    """the model of export_shared_weights() with every weight a read-only view of the memory-mapped file"""
+    from numpy_cnn import NumpyDigitModel
+    from int8_cnn import Int8DigitModel
+    with open(path + ".json") as f:
+        layout = json.load(f)
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    layers = []
+    for entry in layout["layers"]:
+        layer = dict(entry["config"])
+        for key, a in entry["arrays"].items():
+            dtype = np.dtype(a["dtype"])
+            size = int(np.prod(a["shape"], dtype=np.int64)) * dtype.itemsize
+            layer[key] = data[a["offset"]:a["offset"] + size].view(dtype).reshape(a["shape"])
+        layers.append(layer)
+    model_class = Int8DigitModel if layout["engine"] == "Int8DigitModel" else NumpyDigitModel
+    return model_class.from_layers(layout["input_shape"], layers)
+
+
+def prepare_shared_weights(model_path, path):
+    """export model_path (Keras .h5/.keras, float or int8 .npz) to the shared file at path unless it is up to date"""
+    if os.path.exists(path + ".json") and os.path.getmtime(path + ".json") >= os.path.getmtime(model_path):
+        return path
+    from numpy_cnn import NumpyDigitModel
+    from int8_cnn import Int8DigitModel
+    if model_path.endswith(".npz"):
+        with np.load(model_path) as data:
+            int8 = json.loads(str(data["spec"])).get("dtype") == "int8"
+        model = Int8DigitModel(model_path) if int8 else NumpyDigitModel(model_path)
+    else:
+        from tensorflow import keras
+        from numpy_cnn import export_npz
+        with tempfile.TemporaryDirectory() as tmp:
+            export_npz(keras.models.load_model(model_path, compile=False), os.path.join(tmp, "model.npz"))
+            model = NumpyDigitModel(os.path.join(tmp, "model.npz"))
+    export_shared_weights(model, path)
+    return path
+
+
+def preprocess_submission(submission, canvas):
+    """canvas data URI (str), raw canvas pixel bytes or a 28x28 array -> normalized 28x28 float32 array"""
+    if isinstance(submission, str):  # the same steps as Recognizer.preprocess_b64
+        from PIL import Image
+        img = Image.open(io.BytesIO(base64.b64decode(submission.split(",", 1)[1]))).convert("L")
+        img = img.resize((28, 28), Image.Resampling.LANCZOS)
+        return (255 - np.asarray(img, dtype="float32")) / 255.0
+    if isinstance(submission, bytes):
+        return canvas.from_bytes(submission)[0, :, :, 0].copy()  # out of the reused buffer
+    return np.asarray(submission, dtype="float32").reshape(28, 28)
+
+
+def memory_mb(pid):
+    """RSS and PSS (shared pages split between the processes mapping them) of a process, Linux only"""
+    result = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, value = line.split(":", 1)
+            if name in ("Rss", "Pss"):
+                result[name.lower() + "_mb"] = int(value.split()[0]) / 1024
+    return result
+
+
+def _worker(index, weights_path, requests, results, max_batch_size):
+    try:
+        from fast_preprocess import CanvasPreprocessor
+        model = load_shared_model(weights_path)
+        canvas = CanvasPreprocessor(400, 400, max_batch=1)
+        model.predict(np.zeros((1,) + model.input_shape, "float32"))  # warm up
+    except Exception as e:
+        results.put((index, f"{type(e).__name__}: {e}"))  # startup error
+        return
+    results.put((index, None))  # ready
+    while True:
+        first = requests.get()
+        if first is None:
+            return
+        batch = [first]
+        while len(batch) < max_batch_size:  # whatever else is already queued for this worker
+            try:
+                item = requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                requests.put(None)
+                break
+            batch.append(item)
+        replies, request_ids, arrays = [], [], []
+        for request_id, submission in batch:
+            try:
+                arrays.append(preprocess_submission(submission, canvas))
+                request_ids.append(request_id)
+            except Exception as e:
+                replies.append((request_id, {"error": str(e)}))
+        if arrays:
+            try:
+                probabilities = model.predict(np.stack(arrays).reshape((-1,) + model.input_shape))
+            except Exception as e:  # answer the batch rather than die with its requests outstanding
+                replies += [(request_id, {"error": str(e)}) for request_id in request_ids]
+            else:
+                replies += [(request_id, {"digit": int(p.argmax()), "confidence": float(p.max()),
+                                          "all_predictions": p.tolist()})
+                            for request_id, p in zip(request_ids, probabilities)]
+        results.put((index, replies))
+
+
+class WorkerPool:
+    def __init__(self, weights_path, workers=None, max_batch_size=32, start_timeout=120.0):
+        """
+        start workers processes (default: one per core) on the shared weights file from prepare_shared_weights;
+        raises RuntimeError if a worker fails to load it or is not ready within start_timeout seconds
+        """
+        workers = workers or os.cpu_count() or 1
+        context = multiprocessing.get_context("spawn")  # fresh interpreters, nothing inherited from this process
+        self.results = context.Queue()
+        self.queues = [context.Queue() for _ in range(workers)]
+        self.processes = [context.Process(target=_worker, args=(i, weights_path, q, self.results, max_batch_size),
+                                          name=f"digit-worker-{i}", daemon=True)
+                          for i, q in enumerate(self.queues)]
+        for process in self.processes:
+            process.start()
+        self._wait_ready(weights_path, start_timeout)
+        self.outstanding = [0] * workers
+        self.futures = {}
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.timings = StageTimer()  # for the batch server's request latencies
+        self.collector = threading.Thread(target=self._collect, name="worker-pool-results", daemon=True)
+        self.collector.start()
+
+    def _wait_ready(self, weights_path, timeout):
+        deadline = time.monotonic() + timeout
+        ready = 0
+        while ready < len(self.processes):
+            try:
+                index, error = self.results.get(timeout=min(1.0, max(deadline - time.monotonic(), 0.01)))
+            except queue.Empty:
+                dead = [p for p in self.processes if p.exitcode is not None]
+                if dead or time.monotonic() >= deadline:
+                    self._terminate()
+                    raise RuntimeError(f"{dead[0].name} exited with code {dead[0].exitcode} while loading "
+                                       f"{weights_path}" if dead else
+                                       f"workers not ready after {timeout:.0f} s loading {weights_path}")
+                continue
+            if error is not None:
+                self._terminate()
+                raise RuntimeError(f"digit-worker-{index} could not load {weights_path}: {error}")
+            ready += 1
+
+    def _terminate(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+
+    def submit(self, submission):
+        """send a data URI, raw canvas bytes or 28x28 array to the least loaded worker, returns a Future"""
+        future = Future()
+        with self.lock:
+            worker = min(range(len(self.outstanding)), key=self.outstanding.__getitem__)
+            self.outstanding[worker] += 1
+            request_id = next(self.ids)
+            self.futures[request_id] = future
+        self.queues[worker].put((request_id, submission))
+        return future
+
+    def predict(self, submission, timeout=None):
+        return self.submit(submission).result(timeout)
+
+    def _collect(self):
+        while True:
+            message = self.results.get()
+            if message is None:
+                return
+            worker, replies = message
+            with self.lock:
+                self.outstanding[worker] -= len(replies)
+                futures = [self.futures.pop(request_id) for request_id, result in replies]
+                self.batches += 1
+                self.items += len(replies)
+            for future, (request_id, result) in zip(futures, replies):
+                future.set_result(result)
+
+    def stats(self):
+        with self.lock:
+            return {"workers": len(self.processes), "outstanding": list(self.outstanding), "batches": self.batches,
+                    "requests": self.items, "mean_batch_size": self.items / self.batches if self.batches else 0.0}
+
+    def memory(self):
+        """RSS and PSS per worker process"""
+        return [memory_mb(process.pid) for process in self.processes]
+
+    def close(self):
+        for q in self.queues:
+            q.put(None)
+        for process in self.processes:
+            process.join()
+        self.results.put(None)
+        self.collector.join()
+
+
+def run_load(pool, payloads, clients, duration):
+    """closed loop: clients threads submit back to back for duration seconds, returns requests/s"""
+    done = []
+    stop_at = time.perf_counter() + duration
+
+    def client(offset):
+        count = 0
+        while time.perf_counter() < stop_at:
+            pool.predict(payloads[(offset + count) % len(payloads)], timeout=60)
+            count += 1
+        done.append(count)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(done) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput scaling and memory of the multi-process worker pool")
+    parser.add_argument("--model", default=os.path.join(HERE, "digit_model.h5"), help=".h5/.keras or .npz model")
+    parser.add_argument("--weights", default=os.path.join(HERE, "digit_model.weights"),
+                        help="shared weights file, exported from --model when missing or stale")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="comma separated pool sizes")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--raw", action="store_true", help="send raw RGBA canvas bytes instead of PNG data URIs")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    from batch_loadgen import make_canvas_uri, make_canvas_rgba
+    prepare_shared_weights(args.model, args.weights)
+    rng = random.Random(0)
+    payloads = [make_canvas_rgba(rng) if args.raw else make_canvas_uri(rng) for _ in range(64)]
+    results = []
+    print(f"{args.weights}: {os.path.getsize(args.weights) / 1024:.0f} KB of weights, {os.cpu_count()} cores")
+    print(f"{'workers':>7} {'req/s':>9} {'scaling':>8} {'RSS/worker MB':>14} {'PSS/worker MB':>14} {'mean batch':>10}")
+    for workers in sorted(set(map(int, args.workers.split(",")))):
+        pool = WorkerPool(args.weights, workers)
+        try:
+            throughput = run_load(pool, payloads, args.clients, args.duration)
+            memory = pool.memory()
+            stats = pool.stats()
+        finally:
+            pool.close()
+        result = {"workers": workers, "throughput": throughput, "mean_batch_size": stats["mean_batch_size"],
+                  "rss_mb": [m["rss_mb"] for m in memory], "pss_mb": [m["pss_mb"] for m in memory]}
+        results.append(result)
+        print(f"{workers:7d} {throughput:9.1f} {throughput / results[0]['throughput']:7.2f}x "
+              f"{np.mean(result['rss_mb']):14.1f} {np.mean(result['pss_mb']):14.1f} {stats['mean_batch_size']:10.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()